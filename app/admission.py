@@ -0,0 +1,162 @@
+"""Admission control and backpressure.
+
+`/chat` turns are admitted by an `AdmissionController`: at most
+CHAT_MAX_CONCURRENCY run at once, up to CHAT_MAX_QUEUE more wait for a slot,
+and anything beyond that is rejected right away with a Retry-After hint
+instead of piling onto the model providers. Inside a turn, the model calls
+of the classification and generation stages are limited separately by
+`StageLimiter`s, so a burst of one stage cannot starve the other.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator
+
+from app.config import (
+    CHAT_MAX_CONCURRENCY,
+    CHAT_MAX_QUEUE,
+    CHAT_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER,
+    CLASSIFY_MAX_CONCURRENCY,
+    GENERATE_MAX_CONCURRENCY,
+    STAGE_WAIT_TIMEOUT,
+)
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a request is turned away; carries the HTTP status and Retry-After."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class StageBusyError(RuntimeError):
+    """Raised when a model call waited too long for a slot of its stage; carries Retry-After."""
+
+    def __init__(self, message: str, retry_after: int = ADMISSION_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue for async request handlers."""
+
+    def __init__(
+        self,
+        max_concurrent: int = CHAT_MAX_CONCURRENCY,
+        max_queue: int = CHAT_MAX_QUEUE,
+        queue_timeout: float = CHAT_QUEUE_TIMEOUT,
+        retry_after: int = ADMISSION_RETRY_AFTER
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        # Only touched from the event loop, so plain counters suffice
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @asynccontextmanager
+    async def waiting(self) -> AsyncIterator[None]:
+        """Count a wait outside the controller (e.g. for a session lock) against the queue."""
+        if self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejectedError("Server is busy, retry later", 429, self.retry_after)
+        self.queued += 1
+        try:
+            yield
+        finally:
+            self.queued -= 1
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Wait for a slot; raise AdmissionRejectedError if the queue is full or the wait times out."""
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending, so no other request can claim it first
+            await self._semaphore.acquire()
+        elif self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejectedError("Server is busy, retry later", 429, self.retry_after)
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise AdmissionRejectedError("Timed out waiting for capacity, retry later", 503, self.retry_after)
+            finally:
+                self.queued -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class StageLimiter:
+    """Concurrency limit for the model calls of one workflow stage (called from worker threads)."""
+
+    def __init__(self, name: str, max_concurrent: int, timeout: float = STAGE_WAIT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.timeouts = 0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._lock:
+            self.waiting += 1
+        acquired = self._semaphore.acquire(timeout=self.timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+            else:
+                self.timeouts += 1
+        if not acquired:
+            raise StageBusyError(f"No {self.name} capacity after {self.timeout}s")
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": self.in_flight, "waiting": self.waiting, "timeouts": self.timeouts}
+
+
+chat_admission = AdmissionController()
+classify_stage = StageLimiter("classification", CLASSIFY_MAX_CONCURRENCY)
+generate_stage = StageLimiter("generation", GENERATE_MAX_CONCURRENCY)
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    """Get queue depth, rejections and per-stage usage."""
+    return {
+        "chat": chat_admission.snapshot(),
+        "classification": classify_stage.snapshot(),
+        "generation": generate_stage.snapshot(),
+    }
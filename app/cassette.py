@@ -0,0 +1,167 @@
+"""Record/replay cassettes for language model traffic.
+
+A cassette wraps a chat model and either records every request/response pair
+(including streamed chunks and their timings) or replays previously recorded
+pairs without touching the network. Cassettes are stored as gzip-compressed
+JSON Lines so they stay small enough to commit next to the tests.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class ReplayedResponse:
+    """Response object that mimics the structure of chat model responses."""
+    def __init__(self, content: str):
+        self.content = content
+
+
+def _serialize_messages(messages: Any) -> List[List[str]]:
+    """Convert model input (messages or a plain prompt) into [type, content] pairs."""
+    if isinstance(messages, str):
+        return [["human", messages]]
+    return [[getattr(m, "type", "human"), str(getattr(m, "content", m))] for m in messages]
+
+
+def request_key(messages: Any, params: Optional[Dict[str, Any]] = None) -> str:
+    """Build a stable key for a model request."""
+    payload = json.dumps(
+        {"messages": _serialize_messages(messages), "params": params or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """A file of recorded model interactions, keyed by request."""
+
+    def __init__(self, path: Path, mode: str = REPLAY, simulate_latency: bool = False):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            self._load()
+
+    def _open(self, mode: str):
+        if self.path.suffix == ".gz":
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self):
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, key: str, entry: Dict[str, Any]):
+        """Append an interaction to the cassette file."""
+        entry = {"key": key, **entry}
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._open("a") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def lookup(self, key: str) -> Dict[str, Any]:
+        """Return the next recorded interaction for a key.
+
+        Repeated identical requests replay their recordings in order; once the
+        recordings are exhausted the last one is repeated.
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMissError(f"No recorded interaction for request {key} in {self.path}")
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return entries[min(cursor, len(entries) - 1)]
+
+
+class CassetteModel:
+    """Chat model wrapper that records to or replays from a cassette."""
+
+    def __init__(self, cassette: Cassette, model: Any = None, params: Optional[Dict[str, Any]] = None):
+        if cassette.mode == RECORD and model is None:
+            raise ValueError("A model is required to record a cassette")
+        self.cassette = cassette
+        self.model = model
+        self.params = params or {}
+
+    def invoke(self, input_messages: Any, **kwargs) -> Any:
+        """Invoke the model, recording or replaying the interaction."""
+        key = request_key(input_messages, self.params)
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.lookup(key)
+            if self.cassette.simulate_latency:
+                time.sleep(entry.get("latency", 0.0))
+            return ReplayedResponse(content=entry["content"])
+
+        start = time.perf_counter()
+        response = self.model.invoke(input_messages, **kwargs)
+        self.cassette.record(key, {
+            "kind": "invoke",
+            "content": response.content,
+            "latency": round(time.perf_counter() - start, 6),
+        })
+        return response
+
+    def stream(self, input_messages: Any, **kwargs) -> Iterator[Any]:
+        """Stream the model output, recording or replaying chunk timings."""
+        key = request_key(input_messages, self.params)
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.lookup(key)
+            elapsed = 0.0
+            for offset, content in entry.get("chunks") or [[entry.get("latency", 0.0), entry["content"]]]:
+                if self.cassette.simulate_latency and offset > elapsed:
+                    time.sleep(offset - elapsed)
+                    elapsed = offset
+                yield ReplayedResponse(content=content)
+            return
+
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.model.stream(input_messages, **kwargs):
+            chunks.append([round(time.perf_counter() - start, 6), chunk.content])
+            yield chunk
+        self.cassette.record(key, {
+            "kind": "stream",
+            "content": "".join(content for _, content in chunks),
+            "chunks": chunks,
+            "latency": round(time.perf_counter() - start, 6),
+        })
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: Path, mode: str, simulate_latency: bool = False) -> Cassette:
+    """Get the shared cassette for a path, loading it on first use."""
+    with _cassettes_lock:
+        cassette = _cassettes.get(str(path))
+        if cassette is None or cassette.mode != mode:
+            cassette = Cassette(path, mode=mode, simulate_latency=simulate_latency)
+            _cassettes[str(path)] = cassette
+        cassette.simulate_latency = simulate_latency
+        return cassette
@@ -0,0 +1,173 @@
+"""Chat turn execution shared by the API endpoints and offline tools.
+
+A turn restores the session's checkpoint, runs the workflow and hands the
+channels the turn changed to the checkpoint writer, which stores them before
+or after the turn returns depending on PERSISTENCE_MODE. `run_batch` runs many independent turns through
+`run_turn` with a bounded concurrency.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import HISTORY_WINDOW, BATCH_MAX_CONCURRENCY, TURN_CONFLICT_RETRIES
+from app.state import AgentState
+from app.history import ConversationHistory, Message
+from app.persistence import checkpoint_writer
+from app.database import ConversationConflictError, get_messages
+from app.metrics import CHAT_TURN_SECONDS
+from app.tracing import span, set_session
+from app.workflow import compiled_workflow
+
+
+def prepare_turn(
+    session_id: str,
+    message: str,
+    chat_history: Optional[List[Dict[str, Any]]] = None,
+    structured_results: bool = False
+) -> Tuple[AgentState, Dict[str, Any]]:
+    """Build the initial state for a turn; returns it with the loaded checkpoint."""
+    # Restore the session's persisted state; client-supplied history takes precedence
+    checkpoint = checkpoint_writer.load(session_id)
+    initial_channels = dict(checkpoint)
+    if chat_history and chat_history[-1].get("role") == "user" and chat_history[-1].get("content") == message:
+        # Clients that include the current message in the history would get it
+        # twice; `user_input_processor` appends it
+        chat_history = chat_history[:-1]
+    if chat_history:
+        # The client's history replaces the stored one, so none of it may spill
+        initial_channels["conversation_history"] = ConversationHistory(
+            chat_history,
+            maxlen=len(chat_history) + HISTORY_WINDOW
+        )
+
+    # Nodes return partial updates and never mutate the loaded channels, so the
+    # checkpoint stays intact for change detection
+    return AgentState(user_input=message, structured_results=structured_results, **initial_channels), checkpoint
+
+
+def finish_turn(session_id: str, result: Any, checkpoint: Dict[str, Any]) -> AgentState:
+    """Persist the channels a turn changed and return its final state."""
+    result_state = AgentState.from_result(result)
+    checkpoint_writer.save(session_id, result_state, checkpoint)
+    return result_state
+
+
+def messages_between(session_id: str, history: ConversationHistory, start: int, end: int) -> List[Message]:
+    """Get the messages at positions `start` to `end` of a conversation.
+
+    Reads the database only if some of them have spilled out of the window.
+    """
+    if start >= end:
+        return []
+    if start >= history.offset:
+        return history[start - history.offset:end - history.offset]
+    # The spilled messages may still be queued for writing
+    checkpoint_writer.flush()
+    return [Message.from_dict(m) for m in get_messages(session_id, start, end)]
+
+
+def _invoke(initial_state: AgentState, on_node: Optional[Callable[[str], None]]) -> Any:
+    """Invoke the workflow, reporting each completed node when asked to."""
+    if on_node is None:
+        return compiled_workflow.invoke(initial_state)
+
+    result = None
+    for mode, chunk in compiled_workflow.stream(initial_state, stream_mode=["updates", "values"]):
+        if mode == "updates":
+            for node in chunk:
+                on_node(node)
+        else:
+            result = chunk
+    return result
+
+
+def run_turn(
+    session_id: str,
+    message: str,
+    chat_history: Optional[List[Dict[str, Any]]] = None,
+    on_node: Optional[Callable[[str], None]] = None,
+    structured_results: bool = False
+) -> AgentState:
+    """Run a single chat turn for a session.
+
+    `on_node` is called with the name of each workflow node as it completes.
+    With `structured_results` the client renders search results itself, so
+    the reply summarizes them instead of listing every option.
+    If another turn of the session is saved first, the turn is re-run on top
+    of it (up to TURN_CONFLICT_RETRIES times) instead of overwriting it.
+    """
+    # Every span of this turn carries the session id
+    set_session(session_id)
+    start = time.perf_counter()
+    outcome = "error"
+
+    try:
+        with span("chat") as chat_span:
+            for attempt in range(TURN_CONFLICT_RETRIES + 1):
+                initial_state, checkpoint = prepare_turn(session_id, message, chat_history, structured_results)
+                try:
+                    result_state = finish_turn(session_id, _invoke(initial_state, on_node), checkpoint)
+                    break
+                except ConversationConflictError:
+                    if attempt == TURN_CONFLICT_RETRIES:
+                        raise
+            chat_span.set_attribute("intent", result_state.intent)
+            chat_span.set_attribute("attempts", attempt + 1)
+            outcome = "success"
+            return result_state
+    finally:
+        CHAT_TURN_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - start)
+
+
+@dataclass
+class BatchItem:
+    """One independent turn of a batch."""
+    session_id: str
+    message: str
+
+
+@dataclass
+class BatchResult:
+    """Outcome of a batch item: the final state or the error it failed with."""
+    session_id: str
+    state: Optional[AgentState] = None
+    error: Optional[str] = None
+
+
+def by_session(items: List[BatchItem]) -> Dict[str, List[int]]:
+    """Group item indexes by session, in submission order.
+
+    Turns of one session run one after another, each on top of the previous
+    one, instead of racing for the same checkpoint.
+    """
+    sessions: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        sessions.setdefault(item.session_id, []).append(index)
+    return sessions
+
+
+def run_batch(items: List[BatchItem], max_concurrency: Optional[int] = None) -> List[BatchResult]:
+    """Run many independent turns, returning results in input order.
+
+    Every item is a regular `run_turn`, so it is retried when another turn of
+    its session (e.g. a `/chat` request) saves first and is counted in the
+    turn metrics. Failures are reported per item instead of failing the
+    whole batch.
+    """
+    max_concurrency = min(max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    results: List[Optional[BatchResult]] = [None] * len(items)
+
+    def run_session(indexes: List[int]):
+        for index in indexes:
+            item = items[index]
+            try:
+                results[index] = BatchResult(item.session_id, state=run_turn(item.session_id, item.message))
+            except Exception as e:
+                results[index] = BatchResult(item.session_id, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch") as executor:
+        # Consume the results so unexpected errors are not swallowed
+        list(executor.map(run_session, by_session(items).values()))
+
+    return results
@@ -0,0 +1,193 @@
+"""Per-session checkpoints of the workflow state.
+
+Each `/chat` request used to start from a fresh `AgentState` with only the
+conversation history restored, so the draft package built in earlier turns
+had to be re-derived from the history. The checkpointer keeps every channel
+that outlives a turn in the SQLite database, loads them when a request starts
+and writes back only the channels the turn actually changed.
+
+The history write is conditional on the conversation version the checkpoint
+was loaded at, so a turn that raced with another turn of the same session
+fails with ConversationConflictError instead of overwriting it. Loaded and
+written checkpoints are kept in the session cache, which serves them while
+the stored version is unchanged. A turn's
+writes are collected in a `CheckpointWrite`, which the write-behind writer
+(app/persistence.py) merges with later turns of the same session.
+"""
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from app.state import AgentState
+from app.history import ConversationHistory
+from app.config import HISTORY_WINDOW
+from app.database import (
+    transaction,
+    claim_conversation_version,
+    get_conversation_version,
+    get_recent_messages,
+    save_conversation,
+    append_conversation,
+    get_session_channels,
+    save_session_channels,
+)
+from app.session_cache import session_cache
+
+# Channels that carry over between turns. Everything else in AgentState
+# (user input, intents, search results, ...) only lives for a single turn.
+PERSISTENT_CHANNELS = ("conversation_history", "draft_package")
+
+
+class Checkpoint(dict):
+    """Persisted channels of a session, tagged with the conversation version they were loaded at."""
+
+    def __init__(self, channels: Dict[str, Any], version: Optional[int] = None):
+        super().__init__(channels)
+        self.version = version
+
+    def copy(self) -> "Checkpoint":
+        """A copy a turn can build its state from without changing this one."""
+        checkpoint = Checkpoint(self, self.version)
+        if checkpoint.get("conversation_history") is not None:
+            checkpoint["conversation_history"] = checkpoint["conversation_history"].copy()
+        return checkpoint
+
+
+def load_checkpoint(session_id: str) -> Checkpoint:
+    """Load the persisted channels for a session."""
+    cached = session_cache.get(session_id, get_conversation_version)
+    if cached is not None:
+        return cached.copy()
+    
+    # Only a bounded window of the history is read and kept in memory
+    messages, total, version = get_recent_messages(session_id, HISTORY_WINDOW)
+    checkpoint = Checkpoint({
+        channel: value
+        for channel, value in get_session_channels(session_id).items()
+        if channel in PERSISTENT_CHANNELS
+    }, version)
+    checkpoint["conversation_history"] = ConversationHistory(messages, offset=total - len(messages))
+    session_cache.put(session_id, checkpoint.copy())
+    return checkpoint
+
+
+def next_checkpoint(state: Union[AgentState, Dict[str, Any]], previous: Dict[str, Any], version: int) -> Checkpoint:
+    """The checkpoint a turn leaves behind once its writes are stored at `version`."""
+    values = state if isinstance(state, dict) else vars(state)
+    checkpoint = Checkpoint({
+        **previous,
+        **{channel: values[channel] for channel in PERSISTENT_CHANNELS if channel in values}
+    }, version)
+    history = checkpoint.get("conversation_history")
+    if history is not None:
+        # Keep the usual window, also of client-supplied histories
+        window = history.recent(HISTORY_WINDOW)
+        checkpoint["conversation_history"] = ConversationHistory(window, offset=history.total - len(window))
+    return checkpoint
+
+
+def _history_changed(history: ConversationHistory, previous: ConversationHistory) -> bool:
+    """Check the append-only history for new messages without comparing every entry."""
+    return history.total != previous.total or bool(history) and history[-1] != previous[-1]
+
+
+def _extends(history: ConversationHistory, previous: ConversationHistory) -> bool:
+    """Check that `history` only appended messages to `previous` (as far as both are in memory)."""
+    if history.total < previous.total:
+        return False
+    start = max(history.offset, previous.offset)
+    return all(history[i - history.offset] == previous[i - previous.offset] for i in range(start, previous.total))
+
+
+def changed_channels(state: Union[AgentState, Dict[str, Any]], previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the persistent channels whose value differs from the loaded checkpoint."""
+    values = state if isinstance(state, dict) else vars(state)
+    changed = {}
+    for channel in PERSISTENT_CHANNELS:
+        if channel not in values:
+            continue
+        value = values[channel]
+        if channel not in previous:
+            changed[channel] = value
+        elif channel == "conversation_history":
+            if _history_changed(value, previous[channel]):
+                changed[channel] = value
+        elif json.dumps(value, sort_keys=True) != json.dumps(previous[channel], sort_keys=True):
+            changed[channel] = value
+    return changed
+
+
+class CheckpointWrite:
+    """The writes that bring a stored checkpoint up to date with one or more turns."""
+    __slots__ = ("history", "appended", "channels")
+
+    def __init__(self, history: Optional[List[Any]] = None, appended: Optional[List[Any]] = None, channels: Optional[Dict[str, Any]] = None):
+        # Full history replacing the stored one, messages appended after it
+        # (or to the stored history) and other changed channels
+        self.history = history
+        self.appended = appended or []
+        self.channels = channels or {}
+
+    @classmethod
+    def from_turn(cls, state: Union[AgentState, Dict[str, Any]], previous: Dict[str, Any]) -> "CheckpointWrite":
+        """Collect the channels a turn changed since `previous` was loaded."""
+        changed = changed_channels(state, previous)
+        history = changed.pop("conversation_history", None)
+        write = cls(channels=changed)
+        if history is not None:
+            previous_history = previous.get("conversation_history")
+            if previous_history is not None and (history.offset or _extends(history, previous_history)):
+                # Only the new messages are written
+                write.appended = history.since(previous_history.total)
+            else:
+                # A client-supplied history replaces the stored one
+                write.history = list(history)
+        return write
+
+    @property
+    def changes_history(self) -> bool:
+        return self.history is not None or bool(self.appended)
+
+    @property
+    def channel_names(self) -> List[str]:
+        return (["conversation_history"] if self.changes_history else []) + list(self.channels)
+
+    def merge(self, later: "CheckpointWrite"):
+        """Fold in the writes of a later turn; only the latest value of a channel is kept."""
+        if later.history is not None:
+            self.history, self.appended = later.history, list(later.appended)
+        else:
+            self.appended = self.appended + later.appended
+        self.channels.update(later.channels)
+
+    def write(self, session_id: str, expected_version: Optional[int], new_version: Optional[int] = None, conn: Any = None):
+        """Apply the writes if the conversation is still at `expected_version`."""
+        if self.history is not None:
+            save_conversation(session_id, self.history + self.appended, expected_version, new_version, conn)
+        elif self.appended:
+            append_conversation(session_id, self.appended, expected_version, new_version, conn)
+        elif self.channels and expected_version is not None:
+            # Cached checkpoints are only valid while the version is unchanged
+            claim_conversation_version(session_id, expected_version, new_version, conn)
+        save_session_channels(session_id, self.channels, conn)
+
+
+def save_checkpoint(session_id: str, state: Union[AgentState, Dict[str, Any]], previous: Dict[str, Any]) -> List[str]:
+    """Persist the channels changed since the checkpoint was loaded.
+
+    `previous` must be the unmodified result of `load_checkpoint`; build the
+    workflow state from a copy of it. Raises ConversationConflictError if
+    another turn saved the conversation since it was loaded.
+
+    Returns the names of the channels that were written.
+    """
+    write = CheckpointWrite.from_turn(state, previous)
+    if not write.channel_names:
+        return []
+    version = getattr(previous, "version", None)
+    with transaction(session_id) as conn:
+        write.write(session_id, version, conn=conn)
+    if version is None:
+        session_cache.invalidate(session_id)
+    else:
+        session_cache.put(session_id, next_checkpoint(state, previous, version + 1))
+    return write.channel_names
@@ -20,8 +20,125 @@ FRONTEND_PORT = int(os.getenv('FRONTEND_PORT', '7860'))
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 
+# Conversation state limits: messages kept in memory per session (older ones
+# stay in the database) and activities kept in a draft package
+HISTORY_WINDOW = int(os.getenv('HISTORY_WINDOW', '50'))
+MAX_DRAFT_ACTIVITIES = int(os.getenv('MAX_DRAFT_ACTIVITIES', '50'))
+
+# Upper bound on concurrently running turns in a batch (keep below the provider's rate limit)
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+
+# Admission control for /chat: turns running at once, turns waiting for a slot
+# (more are rejected with 429) and seconds a turn may wait (then 503)
+CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', '16'))
+CHAT_MAX_QUEUE = int(os.getenv('CHAT_MAX_QUEUE', '64'))
+CHAT_QUEUE_TIMEOUT = float(os.getenv('CHAT_QUEUE_TIMEOUT', '30'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '2'))
+# Turns that may wait behind a running turn of the same session (more get 429)
+SESSION_MAX_QUEUE = int(os.getenv('SESSION_MAX_QUEUE', '8'))
+
+# Concurrent model calls per stage and seconds a call may wait for a slot
+CLASSIFY_MAX_CONCURRENCY = int(os.getenv('CLASSIFY_MAX_CONCURRENCY', '8'))
+GENERATE_MAX_CONCURRENCY = int(os.getenv('GENERATE_MAX_CONCURRENCY', '8'))
+STAGE_WAIT_TIMEOUT = float(os.getenv('STAGE_WAIT_TIMEOUT', '30'))
+
+# Rate limits on the chat endpoints: requests per second (with bursts) per
+# client and per session, and estimated LLM tokens per minute per client
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+RATE_LIMIT_CLIENT_RPS = float(os.getenv('RATE_LIMIT_CLIENT_RPS', '5'))
+RATE_LIMIT_CLIENT_BURST = float(os.getenv('RATE_LIMIT_CLIENT_BURST', '20'))
+RATE_LIMIT_SESSION_RPS = float(os.getenv('RATE_LIMIT_SESSION_RPS', '1'))
+RATE_LIMIT_SESSION_BURST = float(os.getenv('RATE_LIMIT_SESSION_BURST', '5'))
+RATE_LIMIT_TOKENS_PER_MINUTE = float(os.getenv('RATE_LIMIT_TOKENS_PER_MINUTE', '100000'))
+# Tokens a turn is assumed to cost on top of its message (prompts and history)
+ESTIMATED_TOKENS_PER_TURN = int(os.getenv('ESTIMATED_TOKENS_PER_TURN', '1500'))
+# API keys whose `X-API-Key` header identifies a client (comma-separated);
+# requests without one of them are limited by their address
+RATE_LIMIT_API_KEYS = frozenset(k.strip() for k in os.getenv('RATE_LIMIT_API_KEYS', '').split(',') if k.strip())
+# Most buckets kept per limit; idle buckets are dropped long before this
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '1000000'))
+
+# JSON backend ("auto" uses orjson when installed, "stdlib" forces the json module)
+# and the smallest response body that is compressed (gzip or brotli)
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto').lower()
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+
+# Times a turn is re-run when another turn of the same session saved first
+TURN_CONFLICT_RETRIES = int(os.getenv('TURN_CONFLICT_RETRIES', '2'))
+
+# SQLite connection pool: reader connections kept open (there is one writer),
+# seconds to wait for a free reader or a locked database, bytes of the
+# database file memory-mapped per connection and prepared statements cached
+DB_READERS = int(os.getenv('DB_READERS', '8'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '5'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+DB_CACHED_STATEMENTS = int(os.getenv('DB_CACHED_STATEMENTS', '256'))
+
+# Database files sessions are spread across, each with its own writer; change
+# it only together with `python -m app.maintenance reshard`
+DB_SHARDS = max(1, int(os.getenv('DB_SHARDS', '1')))
+
+# Compression of stored message contents ("off", "zlib" or "zstd"; zstd needs
+# the zstandard package) and the smallest content that is compressed
+HISTORY_COMPRESSION = os.getenv('HISTORY_COMPRESSION', 'off').lower()
+HISTORY_COMPRESSION_MIN_SIZE = int(os.getenv('HISTORY_COMPRESSION_MIN_SIZE', '64'))
+
+# Session expiry: sessions idle for SESSION_TTL_DAYS are archived to gzipped
+# NDJSON files in ARCHIVE_DIR and deleted, then freed pages are vacuumed.
+# The API runs this every MAINTENANCE_INTERVAL seconds (0 disables it), in
+# batches of MAINTENANCE_BATCH_SIZE sessions or VACUUM_STEP_PAGES pages with
+# MAINTENANCE_PAUSE seconds in between
+SESSION_TTL_DAYS = float(os.getenv('SESSION_TTL_DAYS', '30'))
+ARCHIVE_DIR = Path(os.getenv('ARCHIVE_DIR', str(Path(__file__).parent.parent / 'data' / 'archive')))
+MAINTENANCE_INTERVAL = float(os.getenv('MAINTENANCE_INTERVAL', '3600'))
+MAINTENANCE_BATCH_SIZE = int(os.getenv('MAINTENANCE_BATCH_SIZE', '50'))
+MAINTENANCE_PAUSE = float(os.getenv('MAINTENANCE_PAUSE', '0.05'))
+VACUUM_STEP_PAGES = int(os.getenv('VACUUM_STEP_PAGES', '256'))
+
+# Bytes of recently active sessions' checkpoints cached in memory (0 disables the cache)
+SESSION_CACHE_BYTES = int(os.getenv('SESSION_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# Checkpoint persistence: "write_behind" answers before the turn is stored and
+# flushes queued writes in batches every PERSISTENCE_FLUSH_INTERVAL seconds;
+# "sync" stores every turn before answering, so a crash cannot lose it
+PERSISTENCE_MODE = os.getenv('PERSISTENCE_MODE', 'write_behind').lower()
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '0.2'))
+PERSISTENCE_BATCH_SIZE = int(os.getenv('PERSISTENCE_BATCH_SIZE', '100'))
+
+# Idempotency keys on /chat: seconds a completed response is kept for retries
+# and the most responses kept at once
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '600'))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '10000'))
+
+# Background chat jobs: worker threads and how many jobs may wait for one
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', '100'))
+# Seconds between a worker's heartbeats on its unfinished jobs, and seconds
+# without one after which a job counts as interrupted and is failed
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '10'))
+JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '60'))
+
+# Speculative tool execution ("off", "conservative" or "aggressive")
+SPECULATION_MODE = os.getenv('SPECULATION_MODE', 'conservative').lower()
+
+# Tracing: fraction of requests traced (0 disables tracing) and where spans go
+# ("memory" keeps the last TRACE_MEMORY_SPANS spans in-process, "file"
+# appends OTLP/JSON spans to TRACE_FILE)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'memory').lower()
+TRACE_MEMORY_SPANS = int(os.getenv('TRACE_MEMORY_SPANS', '10000'))
+TRACE_FILE = Path(os.getenv('TRACE_FILE', str(Path(__file__).parent.parent / 'data' / 'traces.jsonl')))
+
+# LLM record/replay cassettes ("record", "replay" or empty to disable)
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', '').lower()
+LLM_CASSETTE_PATH = Path(os.getenv('LLM_CASSETTE_PATH', str(Path(__file__).parent.parent / 'tests' / 'cassettes' / 'llm.jsonl.gz')))
+LLM_CASSETTE_SIMULATE_LATENCY = os.getenv('LLM_CASSETTE_SIMULATE_LATENCY', 'False').lower() == 'true'
+
 def validate_config():
     """Validate that required configuration is present."""
+    if LLM_CASSETTE_MODE == 'replay':
+        return True
     if not GOOGLE_API_KEY and not DEEPSEEK_API_KEY:
         print("WARNING: Neither GOOGLE_API_KEY nor DEEPSEEK_API_KEY is set. The application will not function correctly without a valid API key.")
         return False
@@ -1,8 +1,17 @@
 """Database module for the AI Travel Assistant."""
+import atexit
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any
-import json
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+
+from app import history_codec
+from app.db_pool import ConnectionPool, PooledConnection
+from app.history import Message, to_dicts
+from app.serialization import dumps_str, loads
+from app.metrics import DB_SECONDS, timed
+from app.sharding import ShardedPool
+from app.tracing import traced
 
 # Ensure data directory exists
 DATA_DIR = Path(__file__).parent.parent / "data"
@@ -10,54 +19,380 @@ DATA_DIR.mkdir(exist_ok=True)
 
 DB_PATH = DATA_DIR / "demo_travel_app.db"
 
-def get_db_connection():
-    """Create a database connection."""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+# Long-lived connections shared by every database function, one pool per
+# shard (see app/sharding.py)
+pool = ShardedPool(DB_PATH)
+atexit.register(pool.close)
 
-def init_db():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
-    try:
-        # Create conversations table
+class ConversationConflictError(RuntimeError):
+    """Raised when a conversation changed since the version a write was based on."""
+
+def _operation(name: str, kind: str):
+    """Trace a database function and record its latency as a read or write."""
+    def decorator(func):
+        return traced(f"db.{name}")(timed(DB_SECONDS, operation=name, kind=kind)(func))
+    return decorator
+
+def shard_of(session_id: Optional[str] = None) -> ConnectionPool:
+    """The pool of a session's shard, or of the main shard without a session."""
+    return pool.main if session_id is None else pool.for_session(session_id)
+
+def get_db_connection(session_id: Optional[str] = None) -> PooledConnection:
+    """Borrow a connection for reads of a session's shard; `close()` returns it to the pool."""
+    return shard_of(session_id).connection()
+
+def init_db(target: Optional[ShardedPool] = None):
+    """Initialize every shard of the database with required tables."""
+    target = target or pool
+    for shard in target.shards:
+        _create_tables(shard, main=shard is target.main)
+
+def _create_tables(shard: ConnectionPool, main: bool):
+    with shard.transaction() as conn:
+        # Create conversations table (one row per session, versioned for
+        # conflict detection); `history` is the legacy JSON blob, emptied once
+        # its messages are migrated to the messages table
         conn.execute("""
         CREATE TABLE IF NOT EXISTS conversations (
             session_id TEXT PRIMARY KEY,
             history TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """)
-        conn.commit()
+        
+        # Databases created before conversations were versioned lack the column
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(conversations)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        
+        # Finds idle sessions for expiry
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updated_at)")
+        
+        # Create messages table (one row per message, appended in `seq` order;
+        # `content` is text or a compressed BLOB, see app/history_codec.py)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp INTEGER,
+            PRIMARY KEY (session_id, seq)
+        ) WITHOUT ROWID
+        """)
+        _migrate_history_blobs(conn)
+        
+        # Create session state table (one row per persisted workflow channel)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_state (
+            session_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, channel)
+        )
+        """)
+        
+        if main:
+            # Create jobs table for background chat turns
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL DEFAULT '[]',
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+def _migrate_history_blobs(conn: sqlite3.Connection):
+    """Move histories stored as one JSON blob per conversation into the messages table."""
+    rows = conn.execute("SELECT session_id, history FROM conversations WHERE history != '[]'").fetchall()
+    for row in rows:
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (row["session_id"],))
+        # Older versions stored ISO timestamp strings; the column holds epoch seconds
+        _insert_messages(conn, row["session_id"], 0, [Message.from_dict(m) for m in loads(row["history"])])
+    conn.execute("UPDATE conversations SET history = '[]' WHERE history != '[]'")
+
+def _insert_messages(conn: sqlite3.Connection, session_id: str, first_seq: int, messages: List[Dict[str, Any]]):
+    conn.executemany(
+        "INSERT INTO messages (session_id, seq, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [
+            (session_id, seq, message["role"], history_codec.encode(message["content"]), message.get("timestamp"))
+            for seq, message in enumerate(to_dicts(messages), first_seq)
+        ]
+    )
+
+def _message(row: sqlite3.Row) -> Dict[str, Any]:
+    message = {"role": row["role"], "content": history_codec.decode(row["content"])}
+    if row["timestamp"] is not None:
+        message["timestamp"] = row["timestamp"]
+    return message
+
+def transaction(session_id: Optional[str] = None):
+    """Run several writes to a session's shard in one transaction, committed together or not at all.
+    
+    Writes share the shard's single writer connection; a transaction started
+    inside another one in the same thread joins it. Without `session_id` the
+    transaction is on the main shard.
+    """
+    return shard_of(session_id).transaction()
+
+@contextmanager
+def _write_connection(session_id: str, conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+    """Join the caller's transaction, or run the write in a transaction of its own."""
+    if conn is not None:
+        yield conn
+        return
+    with transaction(session_id) as conn:
+        yield conn
+
+def _claim_version(conn: sqlite3.Connection, session_id: str, expected_version: int, new_version: Optional[int] = None):
+    """Move a conversation from `expected_version` to `new_version` (default: the next one).
+    
+    Starts the write transaction, so the caller's following writes are based
+    on the version it read. A missing conversation counts as version 0.
+    """
+    new_version = expected_version + 1 if new_version is None else new_version
+    cursor = conn.execute(
+        "UPDATE conversations SET version = ?, updated_at = CURRENT_TIMESTAMP WHERE session_id = ? AND version = ?",
+        (new_version, session_id, expected_version)
+    )
+    if cursor.rowcount:
+        return
+    if expected_version == 0:
+        try:
+            conn.execute(
+                "INSERT INTO conversations (session_id, history, version) VALUES (?, '[]', ?)",
+                (session_id, new_version)
+            )
+            return
+        except sqlite3.IntegrityError:
+            pass
+    raise ConversationConflictError(
+        f"Conversation {session_id} changed since version {expected_version}"
+    )
+
+@_operation("claim_conversation_version", "write")
+def claim_conversation_version(
+    session_id: str,
+    expected_version: int,
+    new_version: Optional[int] = None,
+    conn: Optional[sqlite3.Connection] = None
+):
+    """Move a conversation to a new version without changing its messages."""
+    with _write_connection(session_id, conn) as conn:
+        _claim_version(conn, session_id, expected_version, new_version)
+
+@_operation("save_conversation", "write")
+def save_conversation(
+    session_id: str,
+    history: List[Dict[str, Any]],
+    expected_version: Optional[int] = None,
+    new_version: Optional[int] = None,
+    conn: Optional[sqlite3.Connection] = None
+):
+    """Replace a conversation history.
+    
+    With `expected_version`, raises ConversationConflictError instead of
+    overwriting a conversation another turn has saved in the meantime. Pass
+    `conn` to write as part of the caller's transaction, opened with
+    `transaction(session_id)` so it is on the session's shard. Prefer
+    `append_conversation` when the stored history only grew.
+    """
+    with _write_connection(session_id, conn) as conn:
+        if expected_version is not None:
+            _claim_version(conn, session_id, expected_version, new_version)
+        else:
+            conn.execute("""
+            INSERT INTO conversations (session_id, history, version) VALUES (?, '[]', 1)
+            ON CONFLICT(session_id) DO UPDATE SET 
+                version = version + 1,
+                updated_at = CURRENT_TIMESTAMP
+            """, (session_id,))
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        _insert_messages(conn, session_id, 0, history)
+
+@_operation("append_conversation", "write")
+def append_conversation(
+    session_id: str,
+    messages: List[Dict[str, Any]],
+    expected_version: Optional[int] = None,
+    new_version: Optional[int] = None,
+    conn: Optional[sqlite3.Connection] = None
+):
+    """Append messages to a stored conversation; the cost does not depend on its length."""
+    if not messages:
+        return
+    with _write_connection(session_id, conn) as conn:
+        if expected_version is not None:
+            _claim_version(conn, session_id, expected_version, new_version)
+        else:
+            conn.execute("""
+            INSERT INTO conversations (session_id, history, version) VALUES (?, '[]', 1)
+            ON CONFLICT(session_id) DO UPDATE SET
+                version = version + 1,
+                updated_at = CURRENT_TIMESTAMP
+            """, (session_id,))
+        next_seq = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()[0]
+        _insert_messages(conn, session_id, next_seq, messages)
+
+@_operation("get_conversation", "read")
+def get_conversation_record(session_id: str) -> Tuple[List[Dict[str, Any]], int]:
+    """Retrieve a conversation history and its version (0 if it does not exist)."""
+    conn = get_db_connection(session_id)
+    try:
+        # The version is read first: messages newer than it can only make a
+        # later write conflict, never lose a turn
+        version = _version(conn, session_id)
+        rows = conn.execute(
+            "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY seq",
+            (session_id,)
+        ).fetchall()
+        return [_message(row) for row in rows], version
     finally:
         conn.close()
 
-def save_conversation(session_id: str, history: List[Dict[str, Any]]):
-    """Save or update a conversation history."""
-    conn = get_db_connection()
+@_operation("get_recent_messages", "read")
+def get_recent_messages(session_id: str, limit: int) -> Tuple[List[Dict[str, Any]], int, int]:
+    """Retrieve the last `limit` messages of a conversation with its total length and version."""
+    conn = get_db_connection(session_id)
     try:
-        conn.execute("""
-        INSERT INTO conversations (session_id, history) VALUES (?, ?)
-        ON CONFLICT(session_id) DO UPDATE SET 
-            history = excluded.history,
-            updated_at = CURRENT_TIMESTAMP
-        """, (session_id, json.dumps(history)))
-        conn.commit()
+        version = _version(conn, session_id)
+        rows = conn.execute(
+            "SELECT seq, role, content, timestamp FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+        total = rows[0]["seq"] + 1 if rows else 0
+        return [_message(row) for row in reversed(rows)], total, version
+    finally:
+        conn.close()
+
+@_operation("get_messages", "read")
+def get_messages(session_id: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Retrieve the messages at positions `start` to `end` of a conversation."""
+    conn = get_db_connection(session_id)
+    try:
+        rows = conn.execute(
+            "SELECT role, content, timestamp FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_id, start, end)
+        ).fetchall()
+        return [_message(row) for row in rows]
+    finally:
+        conn.close()
+
+def _version(conn: sqlite3.Connection, session_id: str) -> int:
+    result = conn.execute(
+        "SELECT version FROM conversations WHERE session_id = ?",
+        (session_id,)
+    ).fetchone()
+    return result['version'] if result else 0
+
+@_operation("get_conversation_version", "read")
+def get_conversation_version(session_id: str) -> int:
+    """Get the version of a stored conversation (0 if it does not exist)."""
+    conn = get_db_connection(session_id)
+    try:
+        return _version(conn, session_id)
     finally:
         conn.close()
 
 def get_conversation(session_id: str) -> List[Dict[str, Any]]:
     """Retrieve a conversation history by session_id."""
-    conn = get_db_connection()
+    return get_conversation_record(session_id)[0]
+
+@_operation("save_session_channels", "write")
+def save_session_channels(session_id: str, channels: Dict[str, Any], conn: Optional[sqlite3.Connection] = None):
+    """Save or update workflow state channels for a session."""
+    if not channels:
+        return
+    with _write_connection(session_id, conn) as conn:
+        conn.executemany("""
+        INSERT INTO session_state (session_id, channel, value) VALUES (?, ?, ?)
+        ON CONFLICT(session_id, channel) DO UPDATE SET
+            value = excluded.value,
+            updated_at = CURRENT_TIMESTAMP
+        """, [(session_id, channel, dumps_str(value)) for channel, value in channels.items()])
+
+@_operation("get_session_channels", "read")
+def get_session_channels(session_id: str) -> Dict[str, Any]:
+    """Retrieve the saved workflow state channels for a session."""
+    conn = get_db_connection(session_id)
     try:
-        result = conn.execute(
-            "SELECT history FROM conversations WHERE session_id = ?",
+        rows = conn.execute(
+            "SELECT channel, value FROM session_state WHERE session_id = ?",
             (session_id,)
-        ).fetchone()
-        return json.loads(result['history']) if result else []
+        ).fetchall()
+        return {row['channel']: loads(row['value']) for row in rows}
     finally:
         conn.close()
 
+@_operation("create_job", "write")
+def create_job(job_id: str, session_id: str, status: str):
+    """Create a job record."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, session_id, status) VALUES (?, ?, ?)",
+            (job_id, session_id, status)
+        )
+
+@_operation("update_job", "write")
+def update_job(job_id: str, **fields: Any):
+    """Update a job's status, progress, result or error."""
+    columns = {key: dumps_str(value) if key in ("progress", "result") else value for key, value in fields.items()}
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (*columns.values(), job_id)
+        )
+
+@_operation("get_job", "read")
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Retrieve a job record by job_id."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = loads(job["progress"])
+        job["result"] = loads(job["result"]) if job["result"] else None
+        return job
+    finally:
+        conn.close()
+
+@_operation("touch_jobs", "write")
+def touch_jobs(job_ids: List[str]):
+    """Record that unfinished jobs are still being worked on."""
+    if not job_ids:
+        return
+    with transaction() as conn:
+        conn.execute(f"""
+        UPDATE jobs SET updated_at = CURRENT_TIMESTAMP
+        WHERE job_id IN ({", ".join("?" * len(job_ids))}) AND status IN ('queued', 'running')
+        """, job_ids)
+
+def fail_unfinished_jobs(error: str, stale_after: float) -> int:
+    """Mark queued or running jobs not updated for `stale_after` seconds as failed.
+    
+    Workers touch their unfinished jobs regularly (see app/jobs.py), so these
+    are jobs whose worker stopped, e.g. in a restart.
+    """
+    with transaction() as conn:
+        cursor = conn.execute("""
+        UPDATE jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE status IN ('queued', 'running') AND updated_at < datetime('now', ?)
+        """, (error, f"-{float(stale_after)} seconds"))
+        return cursor.rowcount
+
 # Initialize the database when the module is imported
 init_db()
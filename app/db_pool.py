@@ -0,0 +1,147 @@
+"""Pooled SQLite connections.
+
+Opening a connection per query paid for the open and close and a cold
+statement cache on every call, and in the default rollback-journal mode a
+writer blocked every reader. The pool keeps long-lived connections instead:
+one writer, held under a lock because SQLite allows a single writer anyway,
+and up to `readers` reader connections handed out one thread at a time.
+Every connection runs in WAL mode, so reads never wait for the writer, with
+`synchronous=NORMAL`, memory-mapped I/O and a prepared statement cache, and
+new databases are created with incremental auto-vacuum.
+
+Borrowing blocks, so async code goes through a thread pool
+(`run_in_threadpool`), as the API endpoints do.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Union
+
+from app.config import DB_READERS, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT, DB_MMAP_SIZE, DB_CACHED_STATEMENTS
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no reader connection is returned to the pool in time."""
+
+
+class PooledConnection:
+    """A borrowed connection; `close()` returns it to the pool instead of closing it."""
+    __slots__ = ("_conn", "_release")
+
+    def __init__(self, conn: sqlite3.Connection, release: Callable[[sqlite3.Connection], None]):
+        self._conn = conn
+        self._release = release
+
+    def __getattr__(self, name: str):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._release(conn)
+
+    def __del__(self):
+        # A connection that was never closed must not shrink the pool
+        self.close()
+
+
+class ConnectionPool:
+    """One writer and up to `readers` reader connections to a SQLite database."""
+
+    def __init__(self, path: Union[str, Path], readers: int = DB_READERS, timeout: float = DB_POOL_TIMEOUT):
+        self.path = str(path)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(readers)
+        self._writer_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections move between threads, but the pool lends each to one thread at a time
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=DB_CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row
+        if not conn.execute("PRAGMA page_count").fetchone()[0]:
+            # Lets maintenance return freed pages in steps; only takes effect
+            # before the database is created (see app/maintenance.py)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> PooledConnection:
+        """Borrow a reader connection; closing it returns it to the pool."""
+        if not self._reader_slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"No database connection was free within {self.timeout}s")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except BaseException:
+                self._reader_slots.release()
+                raise
+        return PooledConnection(conn, self._release)
+
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.ProgrammingError:
+            # Closed by `close()` while borrowed
+            pass
+        finally:
+            self._reader_slots.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the writer connection for one transaction, committed together or not at all.
+
+        A nested call in the same thread joins the outer transaction.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self._writer
+                finally:
+                    self._depth -= 1
+                return
+
+            self._depth = 1
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                self._depth = 0
+
+    def close(self):
+        """Close every connection; later calls open new ones."""
+        with self._writer_lock, self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._writer = None
+            while not self._idle.empty():
+                self._idle.get_nowait()
@@ -0,0 +1,140 @@
+"""Compact conversation history for the AI Travel Assistant.
+
+Messages are stored as `__slots__` records with interned roles and integer
+timestamps instead of dicts with ISO strings. `ConversationHistory` keeps only
+a bounded window of recent messages in memory; older messages spill over to
+the database and are only counted by `offset`.
+"""
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+from app.config import HISTORY_WINDOW
+
+
+def _parse_timestamp(value: Any) -> int:
+    """Convert a stored timestamp (epoch seconds or legacy ISO string) to an int."""
+    if value is None or value == "":
+        return int(time.time())
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+class Message:
+    """A single conversation message."""
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: Any = None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = _parse_timestamp(timestamp)
+
+    @classmethod
+    def from_dict(cls, data: Union["Message", Dict[str, Any]]) -> "Message":
+        """Build a message from its stored dict form."""
+        if isinstance(data, cls):
+            return data
+        return cls(data["role"], data["content"], data.get("timestamp"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the dict form used for storage and the API."""
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+    # Mapping-style access keeps code written against dict messages working
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, dict):
+            other = Message.from_dict(other)
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (self.role, self.content, self.timestamp) == (other.role, other.content, other.timestamp)
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r}, timestamp={self.timestamp})"
+
+
+class ConversationHistory:
+    """Bounded window over a conversation's messages.
+
+    Iteration, indexing and `len` cover the in-memory window; `total` counts
+    every message including the ones that only live in the database.
+    """
+    __slots__ = ("_window", "offset")
+
+    def __init__(self, messages: Iterable[Any] = (), maxlen: int = None, offset: int = 0):
+        self._window = deque(maxlen=maxlen or HISTORY_WINDOW)
+        self.offset = offset
+        self.extend(messages)
+
+    @property
+    def maxlen(self) -> int:
+        return self._window.maxlen
+
+    @property
+    def total(self) -> int:
+        """Number of messages in the conversation, including spilled ones."""
+        return self.offset + len(self._window)
+
+    def append(self, message: Any):
+        """Append a message, spilling the oldest one out of the window if full."""
+        if len(self._window) == self._window.maxlen:
+            self.offset += 1
+        self._window.append(Message.from_dict(message))
+
+    def extend(self, messages: Iterable[Any]):
+        for message in messages:
+            self.append(message)
+
+    def copy(self) -> "ConversationHistory":
+        history = ConversationHistory(maxlen=self.maxlen, offset=self.offset)
+        history._window.extend(self._window)
+        return history
+
+    def since(self, total: int) -> List[Message]:
+        """Get the messages appended after the conversation had `total` messages."""
+        start = total - self.offset
+        if start < 0:
+            raise ValueError("Messages after the requested position were spilled before being saved")
+        return list(self._window)[start:]
+
+    def recent(self, max_messages: int) -> List[Message]:
+        """Get up to `max_messages` of the most recent messages."""
+        if max_messages <= 0:
+            return []
+        return list(self._window)[-max_messages:]
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._window)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return list(self._window)[index]
+        return self._window[index]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ConversationHistory):
+            return self.offset == other.offset and list(self._window) == list(other._window)
+        if isinstance(other, list):
+            return self.offset == 0 and list(self._window) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ConversationHistory(total={self.total}, window={len(self._window)})"
+
+
+def to_dicts(history: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Convert history messages to their dict form for storage."""
+    return [m.to_dict() if isinstance(m, Message) else m for m in history]
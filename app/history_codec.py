@@ -0,0 +1,101 @@
+"""Compact encoding of stored message contents.
+
+Assistant replies make up most of the database: long texts that repeat the
+same travel vocabulary from message to message. With HISTORY_COMPRESSION set
+to "zlib" or "zstd", message contents of at least
+HISTORY_COMPRESSION_MIN_SIZE bytes are stored as a BLOB: one format byte
+followed by the UTF-8 text compressed against a preset dictionary of that
+vocabulary, which pays off even for a single short reply. Plain text rows
+stay readable, so old and new rows can be mixed and `decode` is applied to
+every row that is read.
+
+Format bytes are never reused: a change to the dictionary or the layout
+gets a new one, so rows written earlier still decode.
+"""
+import zlib
+from typing import Union
+
+from app.config import HISTORY_COMPRESSION, HISTORY_COMPRESSION_MIN_SIZE
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Format bytes
+ZLIB_V1 = 1
+ZSTD_V1 = 2
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+
+# Phrases common in replies; later bytes are the cheapest to reference
+DICTIONARY = (
+    "Let me know if you would like more details, or if you want to change the dates. "
+    "Would you like me to add this to your travel package? I can also look for hotels nearby. "
+    "Here are some options for your trip. The total price for all passengers is "
+    "per night, including breakfast, free Wi-Fi, pool, spa, fitness center and airport shuttle. "
+    "Check-in from 3:00 PM, check-out until 11:00 AM. Rating: 4.5 out of 5 stars, city center, "
+    "walking distance to the main attractions, museums, restaurants and shopping. "
+    "Departure: Arrival: Duration: nonstop direct flight with 1 stop, economy class, business class, "
+    "Air France, Lufthansa, British Airways, Emirates, Delta, United, American Airlines, "
+    "Paris, London, Rome, Tokyo, New York, Barcelona, Dubai, Amsterdam. "
+    "I've found several flight options from New York to your destination. The best option is "
+    "I've found several hotel options in the city. Based on your preferences, I recommend "
+    "Your draft travel package now includes the flight, the hotel and these activities: "
+    "Here is a summary of your itinerary. Great choice! "
+).encode("utf-8")
+
+_zstd_dictionary = (
+    zstandard.ZstdCompressionDict(DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    if zstandard is not None else None
+)
+
+
+def resolve_format(name: str = HISTORY_COMPRESSION) -> int:
+    """Format byte for a HISTORY_COMPRESSION setting; 0 stores plain text.
+
+    "zstd" uses zlib when the `zstandard` package is not installed.
+    """
+    if name == "zstd" and zstandard is not None:
+        return ZSTD_V1
+    if name in ("zlib", "zstd"):
+        return ZLIB_V1
+    return 0
+
+
+FORMAT = resolve_format()
+
+
+def _compress(data: bytes, fmt: int) -> bytes:
+    if fmt == ZSTD_V1:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dictionary).compress(data)
+    compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=DICTIONARY)
+    return compressor.compress(data) + compressor.flush()
+
+
+def encode(text: str, fmt: int = None, min_size: int = HISTORY_COMPRESSION_MIN_SIZE) -> Union[str, bytes]:
+    """Encode a message content for storage; short or incompressible texts stay plain."""
+    fmt = FORMAT if fmt is None else fmt
+    if not fmt or not isinstance(text, str):
+        return text
+    data = text.encode("utf-8")
+    if len(data) < min_size:
+        return text
+    encoded = bytes((fmt,)) + _compress(data, fmt)
+    return encoded if len(encoded) < len(data) else text
+
+
+def decode(value: Union[str, bytes]) -> str:
+    """Decode a stored message content of any format."""
+    if not isinstance(value, bytes):
+        return value
+    fmt, payload = value[0], value[1:]
+    if fmt == ZLIB_V1:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=DICTIONARY)
+        return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+    if fmt == ZSTD_V1:
+        if zstandard is None:
+            raise RuntimeError("Stored history is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dictionary).decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown stored history format {fmt}")
@@ -0,0 +1,90 @@
+"""Idempotency keys for `/chat`.
+
+Clients retry a turn with the same `Idempotency-Key` header after a network
+error. The first request with a key runs the turn; repeats while it is still
+running wait for the same execution, and repeats after it finished get the
+stored response, so a retry never re-runs the workflow or appends the turn a
+second time. Completed responses are kept in memory for IDEMPOTENCY_TTL
+seconds; failed turns are forgotten so they can be retried.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from app.config import IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS
+
+
+class IdempotencyKeyReusedError(ValueError):
+    """Raised when a key is sent again with a different request."""
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Hash the request fields that must match for a key to be reused."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "task", "expires_at")
+
+    def __init__(self, fingerprint: str, task: asyncio.Task):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.expires_at = 0.0
+
+
+class IdempotencyStore:
+    """Completed and in-flight results by idempotency key (one event loop)."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._in_flight: Dict[str, _Entry] = {}
+        # Ordered by completion, which is also expiry order
+        self._completed: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.executions = 0
+        self.replays = 0
+
+    async def run(self, key: str, fingerprint: str, execute: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `execute` once per key and share its result with every repeat.
+
+        The execution runs as its own task, so it finishes (and its result is
+        stored for the retry) even if the client that started it disconnects.
+        """
+        self._evict()
+        entry = self._in_flight.get(key) or self._completed.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyKeyReusedError(f"Idempotency key {key!r} was used for a different request")
+            self.replays += 1
+            if entry.task.done():
+                return entry.task.result()
+        else:
+            self.executions += 1
+            entry = self._in_flight[key] = _Entry(fingerprint, asyncio.ensure_future(execute()))
+            entry.task.add_done_callback(lambda task: self._finished(key, entry))
+        return await asyncio.shield(entry.task)
+
+    def _finished(self, key: str, entry: _Entry):
+        del self._in_flight[key]
+        # Failed turns are not stored, so the client's retry runs them again
+        if not entry.task.cancelled() and entry.task.exception() is None:
+            entry.expires_at = time.monotonic() + self.ttl
+            self._completed[key] = entry
+
+    def _evict(self):
+        """Drop expired results and the oldest ones beyond max_keys."""
+        now = time.monotonic()
+        while self._completed:
+            key, entry = next(iter(self._completed.items()))
+            if entry.expires_at > now and len(self._completed) < self.max_keys:
+                break
+            del self._completed[key]
+
+    def __len__(self) -> int:
+        return len(self._in_flight) + len(self._completed)
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,136 @@
+"""Background chat jobs.
+
+Long multi-tool turns can outlast an HTTP timeout, so `/chat/jobs` submits
+the turn to a bounded pool of worker threads and returns a job id at once.
+The job record in SQLite tracks the status (queued, running, succeeded or
+failed), the workflow nodes completed so far and the final response.
+
+Every worker process touches its unfinished jobs every JOB_HEARTBEAT_INTERVAL
+seconds and fails jobs nobody has touched for JOB_STALE_AFTER seconds: those
+were left behind by a worker that stopped. Jobs of live workers, including
+other uvicorn workers sharing the database, are never failed.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+from app.config import JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_HEARTBEAT_INTERVAL, JOB_STALE_AFTER
+from app.chat_service import run_turn
+from app.database import create_job, update_job, touch_jobs, fail_unfinished_jobs
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are already queued or running."""
+
+
+class JobRunner:
+    """Runs chat turns on a bounded thread pool and records their progress."""
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        queue_limit: int = JOB_QUEUE_LIMIT,
+        heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL,
+        stale_after: float = JOB_STALE_AFTER
+    ):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-job")
+        # Jobs waiting or running; bounds the executor's otherwise unbounded queue
+        self.slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        # Unfinished jobs of this runner, touched by the heartbeat
+        self._active: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def submit(self, session_id: str, message: str, chat_history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Queue a chat turn and return its job id."""
+        if not self.slots.acquire(blocking=False):
+            raise JobQueueFullError("Too many chat jobs in progress, retry later")
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._active.add(job_id)
+        try:
+            create_job(job_id, session_id, "queued")
+            self.executor.submit(self._run, job_id, session_id, message, chat_history)
+        except Exception:
+            self._finished(job_id)
+            raise
+        return job_id
+
+    def _finished(self, job_id: str):
+        with self._lock:
+            self._active.discard(job_id)
+        self.slots.release()
+
+    def _run(self, job_id: str, session_id: str, message: str, chat_history: Optional[List[Dict[str, Any]]]):
+        progress: List[Dict[str, Any]] = []
+
+        def on_node(node: str):
+            progress.append({"node": node, "completed_at": time.time()})
+            update_job(job_id, progress=progress)
+
+        try:
+            update_job(job_id, status="running")
+            result_state = run_turn(session_id, message, chat_history, on_node=on_node)
+            update_job(
+                job_id,
+                status="succeeded",
+                result={"response": result_state.final_response, "session_id": session_id}
+            )
+        except Exception as e:
+            update_job(job_id, status="failed", error=str(e))
+        finally:
+            self._finished(job_id)
+
+    def beat(self) -> int:
+        """Touch this runner's unfinished jobs and fail stale ones; returns how many failed."""
+        with self._lock:
+            job_ids = list(self._active)
+        touch_jobs(job_ids)
+        return fail_unfinished_jobs("Interrupted: the worker running it stopped", self.stale_after)
+
+    def start(self):
+        """Start the heartbeat (once per worker process, on application startup)."""
+        if self._heartbeat is None:
+            self._stop.clear()
+            self._heartbeat = threading.Thread(target=self._run_heartbeat, name="chat-job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _run_heartbeat(self):
+        while True:
+            try:
+                failed = self.beat()
+                if failed:
+                    logger.warning("Failed %d interrupted chat jobs", failed)
+            except Exception:
+                logger.exception("Chat job heartbeat failed")
+            if self._stop.wait(self.heartbeat_interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def shutdown(self, wait: bool = True):
+        self.stop()
+        self.executor.shutdown(wait=wait)
+
+
+job_runner = JobRunner()
+
+
+def submit_job(session_id: str, message: str, chat_history: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Queue a chat turn on the shared job runner."""
+    return job_runner.submit(session_id, message, chat_history)
+
@@ -1,28 +1,66 @@
 """FastAPI application for the AI Travel Assistant."""
+import asyncio
 import uuid
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional
 import traceback # Import traceback module
 import logging # Import logging
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-from app.state import AgentState
-from app.workflow import compiled_workflow
-from app.database import save_conversation, get_conversation
-from app.config import validate_config
+from app.admission import AdmissionRejectedError, StageBusyError, chat_admission
+from app.chat_service import BatchItem, BatchResult, by_session, messages_between, run_turn
+from app.config import BATCH_MAX_CONCURRENCY, RATE_LIMIT_ENABLED, validate_config
+from app.database import ConversationConflictError, get_job
+from app.idempotency import IdempotencyKeyReusedError, idempotency_store, request_fingerprint
+from app.jobs import FINISHED_STATUSES, JobQueueFullError, job_runner, submit_job
+from app.metrics import MetricsMiddleware, render_metrics
+from app.rate_limit import RateLimitMiddleware, rate_limits
+from app.maintenance import maintenance_scheduler
+from app.persistence import checkpoint_writer
+from app.payloads import StructuredRequest, StructuredResults, build_structured_results
+from app.serialization import CompressionMiddleware, FastJSONResponse
+from app.service_stats import get_service_stats
+from app.session_locks import session_locks
 
 # Validate configuration
 validate_config()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Expire idle sessions and reclaim their space in the background
+    maintenance_scheduler.start()
+    # Keep this worker's chat jobs alive and fail those of stopped workers
+    job_runner.start()
+    yield
+    await run_in_threadpool(job_runner.stop)
+    await run_in_threadpool(maintenance_scheduler.stop)
+    # Write checkpoints still queued by the write-behind persistence
+    await run_in_threadpool(checkpoint_writer.close)
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Travel Assistant API",
     description="API for the AI Travel Assistant demo",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
+# Compress large responses (history pages, search results) for clients that accept it
+app.add_middleware(CompressionMiddleware)
+
+# Limit requests and LLM spend per client and session
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limits=rate_limits)
+
+# Record latency and in-flight requests (outermost, so rejections are counted too)
+app.add_middleware(MetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -32,48 +70,117 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Seconds between job status checks when streaming job progress
+JOB_POLL_INTERVAL = 0.5
+
 # Request and response models
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     chat_history: Optional[List[Dict[str, str]]] = None
+    # Structured search results / draft to return next to the reply
+    structured: Optional[StructuredRequest] = None
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
+    results: Optional[StructuredResults] = None
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+    timestamp: int
+
+class ChatV2Request(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    # Messages of the conversation the client has already seen (the `turn` of its last response)
+    last_seen_turn: Optional[int] = Field(default=None, ge=0)
+    structured: Optional[StructuredRequest] = None
+
+class ChatV2Response(BaseModel):
+    session_id: str
+    # Messages in the conversation after this turn
+    turn: int
+    message: ChatMessage
+    missed: List[ChatMessage] = []
+    results: Optional[StructuredResults] = None
+
+class BatchChatItem(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+class BatchChatResult(BaseModel):
+    session_id: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+
+class JobProgress(BaseModel):
+    node: str
+    completed_at: float
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    session_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    session_id: str
+    status: str
+    progress: List[JobProgress]
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
 
 @app.get("/")
 async def root():
     """Root endpoint."""
     return {"message": "AI Travel Assistant API is running"}
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    """Chat endpoint."""
-    # Generate session ID if not provided
-    session_id = request.session_id or str(uuid.uuid4())
-    
-    # Get conversation history from database or request
-    conversation_history = request.chat_history or get_conversation(session_id)
-    
-    # Create initial state
-    initial_state = AgentState(
-        user_input=request.message,
-        conversation_history=conversation_history
-    )
+async def _run_chat_turn(
+    session_id: str,
+    message: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    structured: Optional[StructuredRequest] = None
+):
+    """Run a turn off the event loop; turns of one session run one at a time, in arrival order.
     
-    # Invoke workflow
-    try:
-        result_state = compiled_workflow.invoke(initial_state)
-        
-        # Save conversation to database
-        save_conversation(session_id, result_state.conversation_history)
-        
-        # Return response
-        return ChatResponse(
-            response=result_state.final_response,
-            session_id=session_id
+    Turns queued behind their own session don't take an admission slot, but
+    count against the admission queue.
+    """
+    async with session_locks.hold(session_id, chat_admission), chat_admission.admit():
+        return await run_in_threadpool(
+            run_turn, session_id, message, chat_history, structured_results=bool(structured and structured.include)
         )
+
+def _structured_results(result_state, structured: Optional[StructuredRequest]) -> Dict[str, Any]:
+    """Response fields for the structured payloads a request asked for."""
+    if not structured or not structured.include:
+        return {}
+    return {"results": build_structured_results(result_state, structured)}
+
+async def _respond(idempotency_key: Optional[str], fingerprint: str, execute):
+    """Run a chat request once per idempotency key and map failures to HTTP errors."""
+    try:
+        if idempotency_key is None:
+            return await execute()
+        return await idempotency_store.run(idempotency_key, fingerprint, execute)
+    except AdmissionRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
+    except StageBusyError as e:
+        # The model stage stayed saturated; the turn was not stored, so a retry is safe
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    except ConversationConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
     except Exception as e:
         # Log the detailed traceback
         tb_str = traceback.format_exc()
@@ -81,6 +188,150 @@ async def chat(request: ChatRequest):
         # Reraise as HTTPException
         raise HTTPException(status_code=500, detail=f"Error processing request: {e}") from e
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    """Admission and rate limit rejections plus speculation hit rates."""
+    return get_service_stats()
+
+@app.post("/chat", response_model=ChatResponse, response_model_exclude_unset=True)
+async def chat(request: ChatRequest, idempotency_key: Optional[str] = Header(default=None)):
+    """Chat endpoint.
+    
+    Retries that repeat the `Idempotency-Key` header of an earlier request get
+    its response instead of running the turn again.
+    """
+    async def execute() -> ChatResponse:
+        # Generate session ID if not provided
+        session_id = request.session_id or str(uuid.uuid4())
+        result_state = await _run_chat_turn(session_id, request.message, request.chat_history, request.structured)
+        
+        # Return response
+        return ChatResponse(
+            response=result_state.final_response,
+            session_id=session_id,
+            **_structured_results(result_state, request.structured)
+        )
+    
+    fingerprint = request_fingerprint(
+        "v1", request.message, request.session_id, request.chat_history,
+        request.structured.model_dump() if request.structured else None
+    )
+    return await _respond(idempotency_key, fingerprint, execute)
+
+@app.post("/v2/chat", response_model=ChatV2Response, response_model_exclude_unset=True)
+async def chat_v2(request: ChatV2Request, idempotency_key: Optional[str] = Header(default=None)):
+    """Chat endpoint where the server owns the history.
+    
+    The client sends only the new message and how many messages it has seen;
+    the response carries the new assistant message plus any messages the
+    client missed (e.g. turns sent from another device).
+    """
+    async def execute() -> ChatV2Response:
+        session_id = request.session_id or str(uuid.uuid4())
+        result_state = await _run_chat_turn(session_id, request.message, structured=request.structured)
+        
+        history = result_state.conversation_history
+        reply = history[-1]
+        # Messages before the user message of this turn the client has not seen
+        missed = []
+        if request.last_seen_turn is not None:
+            missed = await run_in_threadpool(
+                messages_between, session_id, history, request.last_seen_turn, history.total - 2
+            )
+        
+        return ChatV2Response(
+            session_id=session_id,
+            turn=history.total,
+            message=ChatMessage(**reply.to_dict()),
+            missed=[ChatMessage(**m.to_dict()) for m in missed],
+            **_structured_results(result_state, request.structured)
+        )
+    
+    fingerprint = request_fingerprint(
+        "v2", request.message, request.session_id, request.last_seen_turn,
+        request.structured.model_dump() if request.structured else None
+    )
+    return await _respond(idempotency_key, fingerprint, execute)
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest):
+    """Run many independent chat turns; results are returned in request order."""
+    items = [
+        BatchItem(session_id=item.session_id or str(uuid.uuid4()), message=item.message)
+        for item in request.items
+    ]
+    
+    results: List[Optional[BatchResult]] = [None] * len(items)
+    limit = asyncio.Semaphore(min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    
+    async def run_session(indexes: List[int]):
+        # Turns of one session run in order; every turn is admitted like a /chat turn
+        async with limit:
+            for index in indexes:
+                item = items[index]
+                try:
+                    results[index] = BatchResult(item.session_id, state=await _run_chat_turn(item.session_id, item.message))
+                except Exception as e:
+                    results[index] = BatchResult(item.session_id, error=str(e))
+    
+    await asyncio.gather(*(run_session(indexes) for indexes in by_session(items).values()))
+    
+    return BatchChatResponse(results=[
+        BatchChatResult(
+            session_id=result.session_id,
+            response=result.state.final_response if result.state else None,
+            error=result.error
+        )
+        for result in results
+    ])
+
+@app.post("/chat/jobs", response_model=JobSubmitted, status_code=202)
+async def create_chat_job(request: ChatRequest):
+    """Run a chat turn in the background; poll `/chat/jobs/{job_id}` for the result."""
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    try:
+        job_id = await run_in_threadpool(submit_job, session_id, request.message, request.chat_history)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"}) from e
+    
+    return JobSubmitted(job_id=job_id, session_id=session_id, status="queued")
+
+@app.get("/chat/jobs/{job_id}", response_model=JobStatus, response_model_exclude_unset=True)
+async def chat_job_status(job_id: str):
+    """Get a chat job's status, per-node progress and final response."""
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(**job)
+
+@app.get("/chat/jobs/{job_id}/events")
+async def chat_job_events(job_id: str):
+    """Stream a chat job's status as server-sent events until it finishes."""
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_event = None
+        current = job
+        while True:
+            event = JobStatus(**current).model_dump_json()
+            if event != last_event:
+                yield f"data: {event}\n\n"
+                last_event = event
+            if current["status"] in FINISHED_STATUSES:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            current = await run_in_threadpool(get_job, job_id)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 if __name__ == "__main__":
     import uvicorn
     from app.config import BACKEND_HOST, BACKEND_PORT
@@ -0,0 +1,324 @@
+"""Background maintenance of the conversation database.
+
+Jobs work through the tables in small batches, each written in its own
+short transaction, and pause between batches so they can run next to the
+API server without holding up its writes.
+
+- `expire_sessions` archives sessions idle for longer than the TTL to a
+  gzipped NDJSON file and deletes them.
+- `incremental_vacuum` returns the pages freed by deletions to the file
+  system.
+- `recompress_history` (app/recompression.py) re-encodes stored message
+  contents.
+- `reshard` (app/resharding.py) copies sessions to a different number of
+  shards; run it with the API stopped.
+
+The API runs expiry and vacuum every MAINTENANCE_INTERVAL seconds; all
+jobs can also be run from the command line.
+
+Usage:
+    python -m app.maintenance expire [--ttl-days 30]
+    python -m app.maintenance enable-incremental-vacuum
+    python -m app.maintenance recompress [--format zlib] [--batch-size 500] [--pause 0.05]
+    python -m app.maintenance reshard --shards 16 [--from 1]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app import database, history_codec
+from app.config import (
+    ARCHIVE_DIR,
+    DB_SHARDS,
+    MAINTENANCE_BATCH_SIZE,
+    MAINTENANCE_INTERVAL,
+    MAINTENANCE_PAUSE,
+    SESSION_TTL_DAYS,
+    VACUUM_STEP_PAGES,
+)
+from app.db_pool import ConnectionPool
+from app.recompression import recompress_history
+from app.resharding import reshard
+from app.serialization import loads
+from app.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+# auto_vacuum mode that allows `PRAGMA incremental_vacuum`
+INCREMENTAL = 2
+
+
+@dataclass
+class MaintenanceReport:
+    """What a maintenance run expired and reclaimed."""
+    sessions_expired: int = 0
+    messages_deleted: int = 0
+    archive: Optional[str] = None
+    pages_vacuumed: int = 0
+    bytes_reclaimed: int = 0
+    file_bytes_before: int = 0
+    file_bytes_after: int = 0
+
+
+def _file_size() -> int:
+    """Bytes used by the database files and their write-ahead logs."""
+    paths = [path for shard in database.pool.shards for path in (shard.path, f"{shard.path}-wal")]
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def _archive_record(conn: Any, row: Any) -> Dict[str, Any]:
+    """A session as one archive line: its conversation, messages and channels."""
+    messages = conn.execute(
+        "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY seq",
+        (row["session_id"],)
+    ).fetchall()
+    channels = conn.execute(
+        "SELECT channel, value FROM session_state WHERE session_id = ?",
+        (row["session_id"],)
+    ).fetchall()
+    return {
+        "session_id": row["session_id"],
+        "version": row["version"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "messages": [
+            {"role": m["role"], "content": history_codec.decode(m["content"]), "timestamp": m["timestamp"]}
+            for m in messages
+        ],
+        "channels": {c["channel"]: loads(c["value"]) for c in channels},
+    }
+
+
+def expire_sessions(
+    ttl_days: float = SESSION_TTL_DAYS,
+    archive_dir: Path = ARCHIVE_DIR,
+    batch_size: int = MAINTENANCE_BATCH_SIZE,
+    pause: float = MAINTENANCE_PAUSE,
+    report: Optional[MaintenanceReport] = None
+) -> MaintenanceReport:
+    """Archive and delete sessions not written for `ttl_days`.
+
+    Every batch is appended to the archive before it is deleted. A session
+    written again after it was read is kept (and may appear in the archive).
+    """
+    report = report or MaintenanceReport()
+    cutoff = datetime.fromtimestamp(time.time() - ttl_days * 86400, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    archive = None
+
+    try:
+        for shard in database.pool.shards:
+            while True:
+                conn = shard.connection()
+                try:
+                    rows = conn.execute("""
+                    SELECT session_id, version, created_at, updated_at FROM conversations
+                    WHERE updated_at < ? ORDER BY updated_at LIMIT ?
+                    """, (cutoff, batch_size)).fetchall()
+                    records = [_archive_record(conn, row) for row in rows]
+                finally:
+                    conn.close()
+                if not records:
+                    break
+
+                if archive is None:
+                    Path(archive_dir).mkdir(parents=True, exist_ok=True)
+                    path = Path(archive_dir) / f"sessions-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.ndjson.gz"
+                    report.archive = str(path)
+                    archive = gzip.open(path, "at", encoding="utf-8")
+                for record in records:
+                    archive.write(json.dumps(record, ensure_ascii=False) + "\n")
+                archive.flush()
+
+                expired = 0
+                with shard.transaction() as conn:
+                    for record in records:
+                        # Skip sessions that were written since they were read
+                        cursor = conn.execute(
+                            "DELETE FROM conversations WHERE session_id = ? AND version = ?",
+                            (record["session_id"], record["version"])
+                        )
+                        if not cursor.rowcount:
+                            continue
+                        conn.execute("DELETE FROM messages WHERE session_id = ?", (record["session_id"],))
+                        conn.execute("DELETE FROM session_state WHERE session_id = ?", (record["session_id"],))
+                        expired += 1
+                        report.messages_deleted += len(record["messages"])
+                for record in records:
+                    session_cache.invalidate(record["session_id"])
+                report.sessions_expired += expired
+                if not expired:
+                    break
+                if pause:
+                    time.sleep(pause)
+    finally:
+        if archive is not None:
+            archive.close()
+    return report
+
+
+def incremental_vacuum(
+    step_pages: int = VACUUM_STEP_PAGES,
+    pause: float = MAINTENANCE_PAUSE,
+    report: Optional[MaintenanceReport] = None
+) -> MaintenanceReport:
+    """Return free pages of every shard to the file system, `step_pages` at a time."""
+    report = report or MaintenanceReport()
+    for shard in database.pool.shards:
+        _vacuum_shard(shard, step_pages, pause, report)
+    return report
+
+
+def _vacuum_shard(shard: ConnectionPool, step_pages: int, pause: float, report: MaintenanceReport):
+    conn = shard.connection()
+    try:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        conn.close()
+    if mode != INCREMENTAL:
+        logger.warning("Incremental vacuum is off for %s; run `python -m app.maintenance enable-incremental-vacuum`", shard.path)
+        return
+
+    while True:
+        with shard.transaction() as conn:
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_before:
+                conn.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall()
+                freed = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            else:
+                freed = 0
+        report.pages_vacuumed += freed
+        report.bytes_reclaimed += freed * page_size
+        if not freed:
+            break
+        if pause:
+            time.sleep(pause)
+
+    with shard.transaction() as conn:
+        # Lets the file shrink without waiting for readers
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+
+def enable_incremental_vacuum():
+    """Switch existing database files to incremental vacuum (rewrites each file once)."""
+    for shard in database.pool.shards:
+        with shard.transaction() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        with shard.transaction() as conn:
+            conn.execute("VACUUM")
+
+
+def run_maintenance(ttl_days: float = SESSION_TTL_DAYS) -> MaintenanceReport:
+    """Expire idle sessions, then vacuum the pages they freed."""
+    report = MaintenanceReport(file_bytes_before=_file_size())
+    expire_sessions(ttl_days, report=report)
+    incremental_vacuum(report=report)
+    report.file_bytes_after = _file_size()
+    logger.info(
+        "Maintenance expired %d sessions (%d messages), reclaimed %d bytes",
+        report.sessions_expired, report.messages_deleted, report.bytes_reclaimed
+    )
+    return report
+
+
+class MaintenanceScheduler:
+    """Runs `run_maintenance` every `interval` seconds on a background thread."""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.sessions_expired = 0
+        self.bytes_reclaimed = 0
+        self.last_report: Optional[MaintenanceReport] = None
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                report = run_maintenance()
+            except Exception:
+                logger.exception("Maintenance run failed")
+                continue
+            self.runs += 1
+            self.sessions_expired += report.sessions_expired
+            self.bytes_reclaimed += report.bytes_reclaimed
+            self.last_report = report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "sessions_expired": self.sessions_expired,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_run": asdict(self.last_report) if self.last_report else None,
+        }
+
+
+maintenance_scheduler = MaintenanceScheduler()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conversation database maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    expire = commands.add_parser("expire", help="Archive and delete idle sessions, then vacuum")
+    expire.add_argument("--ttl-days", type=float, default=SESSION_TTL_DAYS, help="Idle days before a session expires")
+    commands.add_parser("enable-incremental-vacuum", help="Switch an existing database to incremental vacuum")
+    recompress = commands.add_parser("recompress", help="Re-encode stored message contents")
+    recompress.add_argument("--format", choices=["off", "zlib", "zstd"], help="Target format (default: HISTORY_COMPRESSION)")
+    recompress.add_argument("--batch-size", type=int, default=500, help="Rows per transaction")
+    recompress.add_argument("--pause", type=float, default=MAINTENANCE_PAUSE, help="Seconds to wait between batches")
+    resharding = commands.add_parser("reshard", help="Copy sessions to a new number of shards (API stopped)")
+    resharding.add_argument("--shards", type=int, required=True, help="Number of shards to copy to")
+    resharding.add_argument("--from", dest="source", type=int, default=DB_SHARDS, help="Current number of shards (default: DB_SHARDS)")
+    args = parser.parse_args(argv)
+
+    if args.command == "expire":
+        report = run_maintenance(args.ttl_days)
+        print(
+            f"Expired {report.sessions_expired} sessions ({report.messages_deleted} messages)"
+            f"{f' to {report.archive}' if report.archive else ''}; vacuumed {report.pages_vacuumed} pages"
+            f" ({report.bytes_reclaimed:,} bytes); file size {report.file_bytes_before:,} -> {report.file_bytes_after:,} bytes",
+            file=sys.stderr
+        )
+    elif args.command == "enable-incremental-vacuum":
+        enable_incremental_vacuum()
+    elif args.command == "recompress":
+        fmt = history_codec.resolve_format(args.format) if args.format else None
+        report = recompress_history(fmt, args.batch_size, args.pause)
+        print(
+            f"Re-encoded {report.rows} messages: {report.bytes_before:,} -> {report.bytes_after:,} bytes"
+            f" (ratio {report.ratio:.2f})",
+            file=sys.stderr
+        )
+    elif args.command == "reshard":
+        report = reshard(args.shards, args.source)
+        print(
+            f"Copied {report.sessions} sessions ({report.messages} messages) and {report.jobs} jobs"
+            f" to {', '.join(report.files)}; set DB_SHARDS={args.shards}",
+            file=sys.stderr
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,75 @@
-"""LangGraph nodes for the AI Travel Assistant."""
-from typing import Dict, Any, Annotated
+"""LangGraph nodes for the AI Travel Assistant.
 
-from langgraph.graph import StateGraph
+Nodes return only the channels they change; the reducers declared on
+`AgentState` merge those partial updates into the workflow state.
+"""
+import time
+from typing import Dict, Any, List
 
-from app.state import AgentState
+from app.config import MAX_DRAFT_ACTIVITIES
+from app.state import AgentState, make_message, draft_changes
 from app.language_model import classify_intent, generate_response
 from app.mock_tools import search_mock_flights, search_mock_hotels, get_mock_general_info
+from app.speculation import predict_searches, use_speculative, record_speculation_outcome
 
-def user_input_processor(state: AgentState) -> AgentState:
+def user_input_processor(state: AgentState) -> Dict[str, Any]:
     """Process user input and add it to conversation history."""
-    # Add user input to conversation history
+    # Add user input to conversation history (appended by the reducer); search
+    # results of an earlier turn are cleared here so the finished state of a
+    # turn still holds its own results for structured responses
     if state.user_input:
-        state.add_to_history("user", state.user_input)
+        return {
+            "conversation_history": [make_message("user", state.user_input)],
+            "mock_flight_results": [],
+            "mock_hotel_results": []
+        }
     
-    # Return updated state
-    return state
+    return {}
 
-def intent_classifier(state: AgentState) -> AgentState:
+def intent_classifier(state: AgentState) -> Dict[str, Any]:
     """Classify user intent and extract parameters."""
     # Skip if no user input
     if not state.user_input:
-        return state
+        return {}
     
     # Get intent and parameters
     result = classify_intent(state.user_input, state.get_context_window())
     
     # Update state
-    state.intent = result["intent"]
-    state.parameters = result["parameters"]
-    
-    return state
+    return {
+        "intent": result["intent"],
+        "intents": result.get("intents") or [result["intent"]],
+        "parameters": result["parameters"]
+    }
+
+def speculative_search(state: AgentState) -> Dict[str, Any]:
+    """Run likely searches in parallel with intent classification."""
+    speculative_results = {}
+    for intent, search_args in predict_searches(state).items():
+        start = time.perf_counter()
+        results = SEARCH_FUNCTIONS[intent](**search_args)
+        speculative_results[intent] = {
+            "input": state.user_input,
+            "args": search_args,
+            "results": results,
+            "elapsed": time.perf_counter() - start
+        }
+    
+    if speculative_results:
+        return {"speculative_results": speculative_results}
+    return {}
 
-def draft_manager(state: AgentState) -> AgentState:
+def draft_manager(state: AgentState) -> Dict[str, Any]:
     """Manage the travel draft package."""
     # Skip if intent is not related to drafting
-    if state.intent not in ["start_draft", "update_draft"]:
-        return state
+    if not state.has_intent("start_draft", "update_draft"):
+        return {}
     
     # Extract parameters
     params = state.parameters
     
-    # Update draft with new information
+    # Update draft with new information; nested values are copied because
+    # other branches may be reading the same state concurrently
     updates = {}
     
     if "destination" in params and params["destination"]:
@@ -56,41 +85,38 @@ def draft_manager(state: AgentState) -> AgentState:
         updates["budget"] = params["budget"]
     
     if "preferences" in params and params["preferences"]:
-        if "preferences" not in state.draft_package:
-            state.draft_package["preferences"] = {}
+        merged_preferences = dict(state.draft_package.get("preferences") or {})
         
         # Handle different formats of preference data
         preferences = params["preferences"]
         if isinstance(preferences, dict):
-            state.draft_package["preferences"].update(preferences)
+            merged_preferences.update(preferences)
         elif isinstance(preferences, list):
             # Convert list to dictionary if it's a list of interests
-            state.draft_package["preferences"]["interests"] = preferences
+            merged_preferences["interests"] = preferences
         else:
             # Handle string or other formats
-            state.draft_package["preferences"]["general"] = preferences
+            merged_preferences["general"] = preferences
             
-        updates["preferences"] = state.draft_package["preferences"]
+        updates["preferences"] = merged_preferences
     
     if "activities" in params and params["activities"]:
         if isinstance(params["activities"], list):
-            if "activities" not in state.draft_package:
-                state.draft_package["activities"] = []
-            
-            state.draft_package["activities"].extend(params["activities"])
-            updates["activities"] = state.draft_package["activities"]
+            # Keep the draft bounded: only the most recent activities are retained
+            activities = list(state.draft_package.get("activities") or []) + params["activities"]
+            updates["activities"] = activities[-MAX_DRAFT_ACTIVITIES:]
     
-    # Update the draft
+    # Update the draft (only the changed fields are merged by the reducer)
     if updates:
-        state.update_draft(updates)
+        return {"draft_package": draft_changes(state.draft_package, updates)}
     
-    return state
+    return {}
 
-def mock_flight_search_tool(state: AgentState) -> AgentState:
+def mock_flight_search_tool(state: AgentState) -> Dict[str, Any]:
     """Search for flights using mock data."""
     # Skip if intent is not related to flights
-    if state.intent != "search_flights":
-        return state
+    if not state.has_intent("search_flights"):
+        return {}
     
     # Extract parameters
     params = state.parameters
@@ -99,25 +125,28 @@ def mock_flight_search_tool(state: AgentState) -> AgentState:
     return_date = params.get("return_date", "")
     travelers = params.get("travelers", 1)
     
-    # Search for flights
+    # Search for flights, reusing a matching speculative search
     if destination and departure_date:
-        flights = search_mock_flights(
-            destination=destination,
-            date=departure_date,
-            return_date=return_date,
-            num_passengers=travelers
-        )
+        search_args = {
+            "destination": destination,
+            "date": departure_date,
+            "return_date": return_date,
+            "num_passengers": travelers
+        }
+        flights = use_speculative(state, "search_flights", search_args)
+        if flights is not None:
+            return {"mock_flight_results": flights, "speculation_hits": ["search_flights"]}
         
         # Update state
-        state.mock_flight_results = flights
+        return {"mock_flight_results": search_mock_flights(**search_args)}
     
-    return state
+    return {}
 
-def mock_hotel_search_tool(state: AgentState) -> AgentState:
+def mock_hotel_search_tool(state: AgentState) -> Dict[str, Any]:
     """Search for hotels using mock data."""
     # Skip if intent is not related to hotels
-    if state.intent != "search_hotels":
-        return state
+    if not state.has_intent("search_hotels"):
+        return {}
     
     # Extract parameters
     params = state.parameters
@@ -126,25 +155,28 @@ def mock_hotel_search_tool(state: AgentState) -> AgentState:
     check_out = params.get("check_out", "")
     guests = params.get("guests", 1)
     
-    # Search for hotels
+    # Search for hotels, reusing a matching speculative search
     if destination and check_in:
-        hotels = search_mock_hotels(
-            destination=destination,
-            check_in=check_in,
-            check_out=check_out,
-            num_guests=guests
-        )
+        search_args = {
+            "destination": destination,
+            "check_in": check_in,
+            "check_out": check_out,
+            "num_guests": guests
+        }
+        hotels = use_speculative(state, "search_hotels", search_args)
+        if hotels is not None:
+            return {"mock_hotel_results": hotels, "speculation_hits": ["search_hotels"]}
         
         # Update state
-        state.mock_hotel_results = hotels
+        return {"mock_hotel_results": search_mock_hotels(**search_args)}
     
-    return state
+    return {}
 
-def general_info_handler(state: AgentState) -> AgentState:
+def general_info_handler(state: AgentState) -> Dict[str, Any]:
     """Handle general information requests."""
     # Skip if intent is not related to information
-    if state.intent != "get_info":
-        return state
+    if not state.has_intent("get_info"):
+        return {}
     
     # Extract parameters
     params = state.parameters
@@ -155,12 +187,12 @@ def general_info_handler(state: AgentState) -> AgentState:
     if topic and destination:
         info = get_mock_general_info(topic, destination)
         
-        # Add info to state parameters for response generation
-        state.parameters["info_result"] = info
+        # Add info to state parameters for response generation (merged by the reducer)
+        return {"parameters": {"info_result": info}}
     
-    return state
+    return {}
 
-def response_generator(state: AgentState) -> AgentState:
+def response_generator(state: AgentState) -> Dict[str, Any]:
     """Generate a response based on the current state."""
     # Prepare context for response generation
     context = {
@@ -169,35 +201,48 @@ def response_generator(state: AgentState) -> AgentState:
         "draft_package": state.draft_package if any(state.draft_package.values()) else None,
         "flight_results": state.mock_flight_results if state.mock_flight_results else None,
         "hotel_results": state.mock_hotel_results if state.mock_hotel_results else None,
-        "user_input": state.user_input
+        "user_input": state.user_input,
+        "results_rendered": state.structured_results
     }
     
     # Generate response
     response = generate_response(context)
     
-    # Update state
-    state.final_response = response
-    
-    # Add response to conversation history
-    state.add_to_history("assistant", response)
-    
-    # Clear temporary data
-    state.user_input = ""
-    state.clear_search_results()
+    # Account for speculative searches made during this turn
+    record_speculation_outcome(state)
     
-    return state
+    # Update state, add the response to conversation history and clear the input
+    return {
+        "final_response": response,
+        "conversation_history": [make_message("assistant", response)],
+        "user_input": ""
+    }
+
+# Search functions that can be launched speculatively, keyed by intent
+SEARCH_FUNCTIONS = {
+    "search_flights": search_mock_flights,
+    "search_hotels": search_mock_hotels,
+}
+
+# Tool node handling each intent; a message may fan out to several of them
+INTENT_NODES = {
+    "start_draft": "draft_manager",
+    "update_draft": "draft_manager",
+    "search_flights": "mock_flight_search_tool",
+    "search_hotels": "mock_hotel_search_tool",
+    "get_info": "general_info_handler",
+}
 
-def get_next_node(state: AgentState) -> str:
-    """Determine the next node based on intent."""
-    intent = state.intent
-    
-    if intent == "start_draft" or intent == "update_draft":
-        return "draft_manager"
-    elif intent == "search_flights":
-        return "mock_flight_search_tool"
-    elif intent == "search_hotels":
-        return "mock_hotel_search_tool"
-    elif intent == "get_info":
-        return "general_info_handler"
-    else:
-        return "response_generator"
+def get_next_node(state: AgentState) -> List[str]:
+    """Determine the next nodes based on the detected intents.
+    
+    Returns every matching tool node so that LangGraph runs them in parallel;
+    messages without a tool intent go straight to the response generator.
+    """
+    nodes = []
+    for intent in state.intents or [state.intent]:
+        node = INTENT_NODES.get(intent)
+        if node and node not in nodes:
+            nodes.append(node)
+    
+    return nodes or ["response_generator"]
@@ -0,0 +1,134 @@
+"""Structured search results and draft package for chat responses.
+
+Clients that render flight and hotel cards ask for them with `include`
+instead of parsing the reply text. `fields` projects each kind down to the
+fields the client actually renders, so payloads stay small.
+"""
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel, Field, field_validator
+
+from app.state import AgentState
+
+
+class FlightOption(BaseModel):
+    airline: Optional[str] = None
+    airline_code: Optional[str] = None
+    flight_number: Optional[str] = None
+    departure_city: Optional[str] = None
+    destination_city: Optional[str] = None
+    departure_date: Optional[str] = None
+    return_date: Optional[str] = None
+    departure_time: Optional[str] = None
+    arrival_time: Optional[str] = None
+    duration: Optional[str] = None
+    price: Optional[float] = None
+    seats_available: Optional[int] = None
+    cabin_class: Optional[str] = None
+    stops: Optional[int] = None
+    aircraft: Optional[str] = None
+    amenities: Optional[List[str]] = None
+    baggage_allowance: Optional[str] = None
+    refundable: Optional[bool] = None
+
+
+class RoomType(BaseModel):
+    name: Optional[str] = None
+    beds: Optional[str] = None
+    size: Optional[str] = None
+    view: Optional[str] = None
+    price: Optional[float] = None
+    available: Optional[int] = None
+
+
+class HotelOption(BaseModel):
+    name: Optional[str] = None
+    rating: Optional[float] = None
+    price_per_night: Optional[float] = None
+    neighborhood: Optional[str] = None
+    address: Optional[str] = None
+    distance_to_center: Optional[str] = None
+    nearby_landmarks: Optional[List[str]] = None
+    amenities: Optional[List[str]] = None
+    room_types: Optional[List[RoomType]] = None
+    breakfast_included: Optional[bool] = None
+    free_cancellation: Optional[bool] = None
+    review_count: Optional[int] = None
+    images: Optional[List[str]] = None
+    check_in: Optional[str] = None
+    check_out: Optional[str] = None
+
+
+class DraftPackage(BaseModel):
+    destination: Optional[str] = None
+    dates: Optional[Any] = None
+    travelers: Optional[Any] = None
+    preferences: Optional[Dict[str, Any]] = None
+    activities: Optional[List[Any]] = None
+    budget: Optional[Any] = None
+    created_at: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+# Structured payload kinds and their models
+PAYLOAD_MODELS: Dict[str, Type[BaseModel]] = {
+    "flights": FlightOption,
+    "hotels": HotelOption,
+    "draft": DraftPackage,
+}
+
+
+class StructuredRequest(BaseModel):
+    """Which structured payloads to return, optionally projected to some fields."""
+    include: List[str] = Field(default_factory=list)
+    fields: Dict[str, List[str]] = Field(default_factory=dict)
+
+    @field_validator("include")
+    @classmethod
+    def _known_kinds(cls, include: List[str]) -> List[str]:
+        unknown = set(include) - set(PAYLOAD_MODELS)
+        if unknown:
+            raise ValueError(f"Unknown payloads {sorted(unknown)}; choose from {sorted(PAYLOAD_MODELS)}")
+        return include
+
+    @field_validator("fields")
+    @classmethod
+    def _known_fields(cls, fields: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        for kind, names in fields.items():
+            model = PAYLOAD_MODELS.get(kind)
+            if model is None:
+                raise ValueError(f"Unknown payload {kind!r}; choose from {sorted(PAYLOAD_MODELS)}")
+            unknown = set(names) - set(model.model_fields)
+            if unknown:
+                raise ValueError(f"Unknown {kind} fields {sorted(unknown)}")
+        return fields
+
+
+class StructuredResults(BaseModel):
+    flights: Optional[List[FlightOption]] = None
+    hotels: Optional[List[HotelOption]] = None
+    draft: Optional[DraftPackage] = None
+
+
+def _project(model: Type[BaseModel], data: Dict[str, Any], fields: Optional[List[str]]) -> BaseModel:
+    """Build a model from only the requested fields, so the rest are left unset."""
+    names = model.model_fields if fields is None else fields
+    return model(**{name: data[name] for name in names if name in data})
+
+
+def build_structured_results(state: AgentState, request: StructuredRequest) -> StructuredResults:
+    """Collect the requested payloads of a finished turn."""
+    sources = {
+        "flights": state.mock_flight_results,
+        "hotels": state.mock_hotel_results,
+        "draft": state.draft_package,
+    }
+    results = {}
+    for kind in request.include:
+        model, fields = PAYLOAD_MODELS[kind], request.fields.get(kind)
+        source = sources[kind]
+        if isinstance(source, list):
+            results[kind] = [_project(model, item, fields) for item in source]
+        else:
+            results[kind] = _project(model, source, fields)
+    return StructuredResults(**results)
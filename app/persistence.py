@@ -0,0 +1,262 @@
+"""Write-behind persistence of session checkpoints.
+
+Saving a turn's checkpoint used to hold up the `/chat` response until the
+history was serialized and committed. In "write_behind" mode the turn's
+writes are queued instead: writes of the same session are merged, so only
+the latest state of each channel is written, and a background thread
+flushes the queue in batched transactions. A session's queued checkpoint is
+served from memory, so its next turn starts from the previous one, and
+`close()` drains the queue on shutdown.
+
+If another worker saved the session while its writes were queued, queued
+appended messages are re-applied after that worker's turn. A turn that
+replaces the whole history (a client-supplied one) could not be merged that
+way, so it is stored before the turn returns, as in "sync" mode.
+
+"sync" mode stores every checkpoint before the turn returns: slower, but a
+crash cannot lose a turn that was already answered.
+"""
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.config import PERSISTENCE_MODE, PERSISTENCE_FLUSH_INTERVAL, PERSISTENCE_BATCH_SIZE
+from app.state import AgentState
+from app.checkpointer import Checkpoint, CheckpointWrite, load_checkpoint, next_checkpoint, save_checkpoint
+from app.database import ConversationConflictError, get_conversation_version, shard_of, transaction
+from app.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+
+class _Queued:
+    """Writes queued for a session and the checkpoint they lead to."""
+    __slots__ = ("write", "checkpoint", "base_version")
+
+    def __init__(self, write: CheckpointWrite, checkpoint: Checkpoint, base_version: int):
+        self.write = write
+        self.checkpoint = checkpoint
+        # Stored conversation version the writes apply to
+        self.base_version = base_version
+
+
+class CheckpointWriter:
+    """Loads and saves session checkpoints, storing them synchronously or write-behind."""
+
+    def __init__(
+        self,
+        mode: str = PERSISTENCE_MODE,
+        flush_interval: float = PERSISTENCE_FLUSH_INTERVAL,
+        batch_size: int = PERSISTENCE_BATCH_SIZE
+    ):
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        # One batch is written at a time, so a session is never in two batches
+        self._flush_lock = threading.Lock()
+        self._queued: "OrderedDict[str, _Queued]" = OrderedDict()
+        self._flushing: Dict[str, _Queued] = {}
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.flushed = 0
+        self.coalesced = 0
+        self.rebased = 0
+        self.dropped = 0
+
+    @property
+    def write_behind(self) -> bool:
+        return self.mode == "write_behind" and not self._closed
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queued) + len(self._flushing)
+
+    def load(self, session_id: str) -> Checkpoint:
+        """Load a session's checkpoint, including writes that are still queued."""
+        with self._lock:
+            queued = self._queued.get(session_id) or self._flushing.get(session_id)
+            if queued is not None:
+                return queued.checkpoint.copy()
+        return load_checkpoint(session_id)
+
+    def save(self, session_id: str, state: Union[AgentState, Dict[str, Any]], previous: Checkpoint) -> List[str]:
+        """Save the channels a turn changed; see `save_checkpoint`.
+
+        In write-behind mode the writes are only queued, except for turns
+        that replace the whole history. The conflict check runs against the
+        queued checkpoint, so a turn that raced with another turn of the
+        session still fails with ConversationConflictError.
+        """
+        if not self.write_behind:
+            if self._closed:
+                # Writes queued before shutdown go first
+                self.flush()
+            return save_checkpoint(session_id, state, previous)
+
+        write = CheckpointWrite.from_turn(state, previous)
+        if write.history is not None:
+            # A replaced history (sent by the client) cannot be merged with a
+            # turn another worker saves first, so it is stored right away
+            self.flush()
+            return save_checkpoint(session_id, state, previous)
+        stored_version = None
+        while True:
+            with self._lock:
+                queued = self._queued.get(session_id)
+                latest = queued or self._flushing.get(session_id)
+                if latest is not None or stored_version is not None:
+                    return self._enqueue(session_id, state, previous, write, queued,
+                                         latest.checkpoint.version if latest else stored_version)
+            # Nothing queued: read the stored version without holding up other sessions' turns
+            stored_version = get_conversation_version(session_id)
+
+    def _enqueue(
+        self,
+        session_id: str,
+        state: Union[AgentState, Dict[str, Any]],
+        previous: Checkpoint,
+        write: CheckpointWrite,
+        queued: Optional[_Queued],
+        version: int
+    ) -> List[str]:
+        """Queue a turn's writes on top of `version` (called with the lock held)."""
+        expected_version = getattr(previous, "version", None)
+        if expected_version is not None and expected_version != version:
+            raise ConversationConflictError(f"Conversation {session_id} was saved by another turn")
+        if not write.changes_history and not write.channels:
+            return []
+
+        checkpoint = next_checkpoint(state, previous, version + 1)
+        if queued is not None:
+            queued.write.merge(write)
+            queued.checkpoint = checkpoint
+            self.coalesced += 1
+        else:
+            self._queued[session_id] = _Queued(write, checkpoint, version)
+        self._start()
+        if len(self._queued) >= self.batch_size:
+            self._wakeup.set()
+        return write.channel_names
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every queued checkpoint; returns the number still queued after failures."""
+        while self._flush_batch():
+            pass
+        return len(self._queued)
+
+    def _flush_batch(self) -> bool:
+        """Write up to `batch_size` sessions in one transaction per shard; False if nothing was written."""
+        with self._flush_lock:
+            with self._lock:
+                batch: List[Tuple[str, _Queued]] = []
+                while self._queued and len(batch) < self.batch_size:
+                    session_id, queued = self._queued.popitem(last=False)
+                    self._flushing[session_id] = queued
+                    batch.append((session_id, queued))
+            if not batch:
+                return False
+
+            # A transaction cannot span database files: one per shard
+            shards: Dict[Any, List[Tuple[str, _Queued]]] = {}
+            for item in batch:
+                shards.setdefault(shard_of(item[0]), []).append(item)
+            failed = []
+            for items in shards.values():
+                try:
+                    with transaction(items[0][0]) as conn:
+                        for session_id, queued in items:
+                            queued.write.write(session_id, queued.base_version, queued.checkpoint.version, conn)
+                    for session_id, queued in items:
+                        session_cache.put(session_id, queued.checkpoint)
+                except Exception:
+                    # One bad session must not hold up the others
+                    failed += [item for item in items if not self._write_one(*item)]
+
+            with self._lock:
+                for session_id, queued in batch:
+                    del self._flushing[session_id]
+                for session_id, queued in failed:
+                    self._requeue(session_id, queued)
+                self.flushed += len(batch) - len(failed)
+            return len(failed) < len(batch)
+
+    def _write_one(self, session_id: str, queued: _Queued) -> bool:
+        """Write one session on its own; False if it should be retried."""
+        try:
+            try:
+                with transaction(session_id) as conn:
+                    queued.write.write(session_id, queued.base_version, queued.checkpoint.version, conn)
+                session_cache.put(session_id, queued.checkpoint)
+            except ConversationConflictError:
+                self._rebase(session_id, queued)
+        except ConversationConflictError:
+            logger.error("Dropped queued checkpoint of %s: conversation was saved elsewhere", session_id)
+            session_cache.invalidate(session_id)
+            self.dropped += 1
+        except Exception:
+            logger.exception("Failed to write checkpoint of %s, will retry", session_id)
+            return False
+        return True
+
+    def _rebase(self, session_id: str, queued: _Queued):
+        """Write queued appends after the turns another process saved in the meantime."""
+        if queued.write.history is not None:
+            # `save` stores replaced histories itself; never let one overwrite another worker's turn
+            raise ConversationConflictError(f"Conversation {session_id} was replaced by another process")
+        stored = get_conversation_version(session_id)
+        # Keep the queued version when possible, so later queued writes still apply
+        version = max(stored + 1, queued.checkpoint.version)
+        with transaction(session_id) as conn:
+            queued.write.write(session_id, stored, version, conn)
+        # The queued checkpoint lacks the other process's messages
+        session_cache.invalidate(session_id)
+        self.rebased += 1
+        logger.warning("Re-applied queued checkpoint of %s after a write from elsewhere", session_id)
+
+    def _requeue(self, session_id: str, queued: _Queued):
+        """Put failed writes back in front of any writes queued for the session since."""
+        later = self._queued.get(session_id)
+        if later is not None:
+            queued.write.merge(later.write)
+            queued.checkpoint = later.checkpoint
+        self._queued[session_id] = queued
+        self._queued.move_to_end(session_id, last=False)
+
+    def close(self):
+        """Drain the queue and store later checkpoints synchronously."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        left = self.flush()
+        if left:
+            logger.error("%d checkpoints could not be written on shutdown", left)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "queue_depth": self.queue_depth,
+            "flushed": self.flushed,
+            "coalesced": self.coalesced,
+            "rebased": self.rebased,
+            "dropped": self.dropped,
+        }
+
+
+checkpoint_writer = CheckpointWriter()
+atexit.register(checkpoint_writer.close)
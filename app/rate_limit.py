@@ -0,0 +1,203 @@
+"""Per-client and per-session rate limiting for the chat endpoints.
+
+`RateLimitMiddleware` charges every chat request against token buckets:
+requests per second per client and per session, and estimated LLM tokens
+per minute per client. A client is identified by its `X-API-Key` header when
+it is one of RATE_LIMIT_API_KEYS and otherwise by its address, so sending a
+made-up key does not get a caller a fresh bucket. Requests over a limit get a 429 with Retry-After
+before any workflow runs.
+
+A bucket is two numbers. A bucket that has been idle long enough to refill
+completely is indistinguishable from a new one, so it is dropped; memory only
+grows with the keys active within the refill time.
+"""
+import hmac
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from app.config import (
+    RATE_LIMIT_CLIENT_RPS,
+    RATE_LIMIT_CLIENT_BURST,
+    RATE_LIMIT_SESSION_RPS,
+    RATE_LIMIT_SESSION_BURST,
+    RATE_LIMIT_TOKENS_PER_MINUTE,
+    ESTIMATED_TOKENS_PER_TURN,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_API_KEYS,
+)
+
+# Requests that run workflow turns
+LIMITED_PATHS = ("/chat", "/v2/chat", "/chat/jobs", "/chat/batch")
+
+
+class TokenBucketLimiter:
+    """Token buckets by key, refilled at `rate` per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        # key -> [tokens, last refill time], least recently used first
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def _tokens(self, key: str, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        return min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+
+    def wait_time(self, key: str, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)."""
+        missing = min(cost, self.capacity) - self._tokens(key, now)
+        return max(0.0, missing / self.rate)
+
+    def consume(self, key: str, cost: float, now: float):
+        """Take `cost` tokens (callers check `wait_time` first)."""
+        self._buckets[key] = [self._tokens(key, now) - cost, now]
+        self._buckets.move_to_end(key)
+        self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop least recently used buckets that have refilled (or exceed max_keys)."""
+        while self._buckets:
+            key = next(iter(self._buckets))
+            if self._tokens(key, now) < self.capacity and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def estimate_turn_tokens(message: str) -> int:
+    """Rough LLM token cost of a turn: the message plus prompts and history."""
+    return len(message) // 4 + ESTIMATED_TOKENS_PER_TURN
+
+
+def client_identity(scope: Dict[str, Any], api_keys: Optional[Collection[str]] = None) -> str:
+    """Identify the caller by a configured API key or, failing that, by address."""
+    api_keys = RATE_LIMIT_API_KEYS if api_keys is None else api_keys
+    for name, value in scope.get("headers", []):
+        if name == b"x-api-key":
+            # Compare against every key in constant time so the check leaks nothing
+            if sum(hmac.compare_digest(value, known.encode("utf-8")) for known in api_keys):
+                return "key:" + value.decode("latin-1")
+            break
+    client = scope.get("client")
+    return "addr:" + (client[0] if client else "unknown")
+
+
+def _turns(body: bytes) -> List[Tuple[Optional[str], str]]:
+    """(session_id, message) of every turn a request body asks for."""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return []
+    if not isinstance(payload, dict):
+        return []
+    items = payload.get("items") if isinstance(payload.get("items"), list) else [payload]
+    return [
+        (item.get("session_id"), str(item.get("message") or ""))
+        for item in items
+        if isinstance(item, dict)
+    ]
+
+
+class RateLimits:
+    """The buckets a chat request is charged against."""
+
+    def __init__(self):
+        self.client_requests = TokenBucketLimiter(RATE_LIMIT_CLIENT_RPS, RATE_LIMIT_CLIENT_BURST)
+        self.session_requests = TokenBucketLimiter(RATE_LIMIT_SESSION_RPS, RATE_LIMIT_SESSION_BURST)
+        self.client_tokens = TokenBucketLimiter(RATE_LIMIT_TOKENS_PER_MINUTE / 60, RATE_LIMIT_TOKENS_PER_MINUTE)
+        self.rejected = 0
+
+    def check(self, client: str, turns: List[Tuple[Optional[str], str]], now: Optional[float] = None) -> float:
+        """Charge a request; returns 0 if allowed, else the seconds to wait."""
+        now = time.monotonic() if now is None else now
+        charges = [
+            (self.client_requests, client, max(len(turns), 1)),
+            (self.client_tokens, client, sum(estimate_turn_tokens(message) for _, message in turns)),
+        ]
+        sessions: Dict[str, int] = {}
+        for session_id, _ in turns:
+            if session_id:
+                sessions[session_id] = sessions.get(session_id, 0) + 1
+        charges += [(self.session_requests, session_id, count) for session_id, count in sessions.items()]
+
+        # Charge nothing unless every bucket has room
+        wait = max(limiter.wait_time(key, cost, now) for limiter, key, cost in charges)
+        if wait > 0:
+            self.rejected += 1
+            return wait
+        for limiter, key, cost in charges:
+            limiter.consume(key, cost, now)
+        return 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "rejected": self.rejected,
+            "client_keys": len(self.client_requests),
+            "session_keys": len(self.session_requests),
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying `RateLimits` to the chat endpoints."""
+
+    def __init__(self, app, limits: Optional[RateLimits] = None):
+        self.app = app
+        self.limits = limits or rate_limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in LIMITED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        # Read the body to find the sessions and messages, then replay it to the app
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                await self.app(scope, receive, send)
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+
+        wait = self.limits.check(client_identity(scope), _turns(body))
+        if wait > 0:
+            await _reject(send, wait)
+            return
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+async def _reject(send, wait: float):
+    body = json.dumps({"detail": "Rate limit exceeded"}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(math.ceil(wait)).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+rate_limits = RateLimits()
@@ -0,0 +1,92 @@
+"""Re-encoding of stored message contents.
+
+`recompress_history` rewrites message contents stored before compression
+was enabled, or in another format (see app/history_codec.py), in small
+batches of short transactions so it can run next to the API server. Run it
+with `python -m app.maintenance recompress`.
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from app import database, history_codec
+from app.config import MAINTENANCE_PAUSE
+
+
+@dataclass
+class RecompressionReport:
+    """Message contents re-encoded by `recompress_history` and their stored size."""
+    rows: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def ratio(self) -> float:
+        return self.bytes_before / self.bytes_after if self.bytes_after else 1.0
+
+
+def _stored_size(value: Union[str, bytes]) -> int:
+    return len(value) if isinstance(value, bytes) else len(value.encode("utf-8"))
+
+
+def _stored_format(value: Union[str, bytes]) -> int:
+    return value[0] if isinstance(value, bytes) else 0
+
+
+def recompress_history(
+    fmt: Optional[int] = None,
+    batch_size: int = 500,
+    pause: float = MAINTENANCE_PAUSE,
+    limit: Optional[int] = None
+) -> RecompressionReport:
+    """Re-encode stored message contents in `fmt` (default: the configured format).
+
+    Rows written before compression was enabled, or in another format, are
+    rewritten, on every shard; format 0 decompresses them back to text. At
+    most `limit` rows are examined.
+    """
+    fmt = history_codec.FORMAT if fmt is None else fmt
+    report = RecompressionReport()
+    examined = 0
+
+    for shard in database.pool.shards:
+        last_key = ("", -1)
+        while limit is None or examined < limit:
+            conn = shard.connection()
+            try:
+                rows = conn.execute("""
+                SELECT session_id, seq, content FROM messages
+                WHERE (session_id, seq) > (?, ?)
+                ORDER BY session_id, seq LIMIT ?
+                """, (*last_key, batch_size if limit is None else min(batch_size, limit - examined))).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                break
+            examined += len(rows)
+            last_key = (rows[-1]["session_id"], rows[-1]["seq"])
+
+            updates = []
+            for row in rows:
+                stored = row["content"]
+                if _stored_format(stored) == fmt:
+                    continue
+                encoded = history_codec.encode(history_codec.decode(stored), fmt)
+                if encoded == stored:
+                    continue
+                updates.append((encoded, row["session_id"], row["seq"], stored))
+                report.bytes_before += _stored_size(stored)
+                report.bytes_after += _stored_size(encoded)
+
+            if updates:
+                with shard.transaction() as conn:
+                    # Skip rows a turn rewrote since they were read
+                    conn.executemany(
+                        "UPDATE messages SET content = ? WHERE session_id = ? AND seq = ? AND content = ?",
+                        updates
+                    )
+                report.rows += len(updates)
+            if pause:
+                time.sleep(pause)
+
+    return report
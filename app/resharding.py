@@ -0,0 +1,133 @@
+"""Moving stored sessions to a different number of shards.
+
+`reshard` copies every session of a layout (see app/sharding.py) into a new
+layout of `count` database files, in batches, with each session placed by
+the same hash the API uses. Jobs move to the new first shard. Copies are
+made as stored: compressed message contents stay compressed.
+
+Run it with the API stopped, since writes made while it runs are not copied.
+Then start the API with DB_SHARDS set to the new count. The old files are
+left in place; delete them once the new layout is in use. If a run fails,
+delete the new files and run it again.
+
+Usage:
+    python -m app.maintenance reshard --shards 16 [--from 1]
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Union
+
+from app.config import DB_SHARDS, MAINTENANCE_BATCH_SIZE
+from app.database import DB_PATH, init_db
+from app.db_pool import ConnectionPool
+from app.sharding import ShardedPool, shard_paths
+
+
+# Copied columns, named because databases migrated from older versions
+# have them in a different order
+COLUMNS = {
+    "conversations": ("session_id", "history", "version", "created_at", "updated_at"),
+    "messages": ("session_id", "seq", "role", "content", "timestamp"),
+    "session_state": ("session_id", "channel", "value", "updated_at"),
+    "jobs": ("job_id", "session_id", "status", "progress", "result", "error", "created_at", "updated_at"),
+}
+
+
+@dataclass
+class ReshardReport:
+    """What `reshard` copied and where to."""
+    sessions: int = 0
+    messages: int = 0
+    jobs: int = 0
+    files: List[str] = field(default_factory=list)
+
+
+def _select(conn, table: str, where: str = "", params: tuple = ()) -> List[tuple]:
+    return [tuple(row) for row in conn.execute(f"SELECT {', '.join(COLUMNS[table])} FROM {table} {where}", params)]
+
+
+def _session_rows(conn, table: str, session_ids: List[str]) -> List[tuple]:
+    return _select(conn, table, f"WHERE session_id IN ({', '.join('?' * len(session_ids))})", tuple(session_ids))
+
+
+def _insert(conn, table: str, rows: List[tuple]):
+    if rows:
+        columns = COLUMNS[table]
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+
+
+def reshard(
+    count: int,
+    source_count: int = DB_SHARDS,
+    path: Union[str, Path] = DB_PATH,
+    batch_size: int = MAINTENANCE_BATCH_SIZE
+) -> ReshardReport:
+    """Copy every session from the `source_count` layout of `path` to a `count` layout.
+
+    Raises FileNotFoundError if the source layout is incomplete and
+    FileExistsError if a file of the new layout already exists.
+    """
+    if count < 1 or count == source_count:
+        raise ValueError(f"Cannot reshard from {source_count} to {count} shards")
+    missing = [str(p) for p in shard_paths(path, source_count) if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"Missing shards of the current layout: {', '.join(missing)}")
+    existing = [str(p) for p in shard_paths(path, count) if p.exists()]
+    if existing:
+        raise FileExistsError(f"Move these files away before resharding: {', '.join(existing)}")
+
+    report = ReshardReport(files=[str(p) for p in shard_paths(path, count)])
+    source = ShardedPool(path, source_count)
+    target = ShardedPool(path, count)
+    try:
+        init_db(target)
+        for shard in source.shards:
+            _copy_sessions(shard, target, batch_size, report)
+
+        conn = source.main.connection()
+        try:
+            jobs = _select(conn, "jobs")
+        finally:
+            conn.close()
+        with target.main.transaction() as conn:
+            _insert(conn, "jobs", jobs)
+        report.jobs = len(jobs)
+    finally:
+        source.close()
+        target.close()
+    return report
+
+
+def _copy_sessions(shard: ConnectionPool, target: ShardedPool, batch_size: int, report: ReshardReport):
+    """Copy the sessions of one source shard, `batch_size` at a time."""
+    last_id = ""
+    while True:
+        conn = shard.connection()
+        try:
+            conversations = _select(
+                conn, "conversations", "WHERE session_id > ? ORDER BY session_id LIMIT ?", (last_id, batch_size)
+            )
+            if not conversations:
+                return
+            session_ids = [row[0] for row in conversations]
+            messages = _session_rows(conn, "messages", session_ids)
+            channels = _session_rows(conn, "session_state", session_ids)
+        finally:
+            conn.close()
+        last_id = session_ids[-1]
+
+        # Every session's rows go to one target shard, in one transaction per shard
+        batches: Dict[ConnectionPool, List[List[tuple]]] = {}
+        for table, rows in enumerate((conversations, messages, channels)):
+            for row in rows:
+                batches.setdefault(target.for_session(row[0]), [[], [], []])[table].append(row)
+        for target_shard, (shard_conversations, shard_messages, shard_channels) in batches.items():
+            with target_shard.transaction() as conn:
+                _insert(conn, "conversations", shard_conversations)
+                _insert(conn, "messages", shard_messages)
+                _insert(conn, "session_state", shard_channels)
+        report.sessions += len(conversations)
+        report.messages += len(messages)
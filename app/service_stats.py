@@ -0,0 +1,94 @@
+"""Service stats from admission control, rate limiting, persistence, maintenance and caches.
+
+The modules keep their own counters; this gathers them for `GET /stats` and
+exposes them to `GET /metrics` through a collector callback.
+"""
+from typing import Any, Dict, List, Tuple
+
+from app.admission import get_admission_stats
+from app.idempotency import idempotency_store
+from app.maintenance import maintenance_scheduler
+from app.metrics import registry
+from app.persistence import checkpoint_writer
+from app.rate_limit import rate_limits
+from app.session_cache import session_cache
+from app.session_locks import session_locks
+from app.speculation import get_speculation_stats
+
+
+def get_service_stats() -> Dict[str, Any]:
+    """Admission and rate limit rejections plus speculation hit rates."""
+    return {
+        "admission": get_admission_stats(),
+        "sessions": {"active": len(session_locks), "rejected": session_locks.rejected},
+        "rate_limit": rate_limits.snapshot(),
+        "speculation": get_speculation_stats(),
+        "idempotency": {"executions": idempotency_store.executions, "replays": idempotency_store.replays},
+        "persistence": checkpoint_writer.stats(),
+        "session_cache": session_cache.stats(),
+        "maintenance": maintenance_scheduler.stats(),
+    }
+
+
+def collect_service_stats() -> List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]:
+    """Expose the stats kept by admission control, rate limiting and caches as metrics."""
+    admission = get_admission_stats()
+    chat = admission["chat"]
+    stages = [("classification", admission["classification"]), ("generation", admission["generation"])]
+    speculation = get_speculation_stats()
+    caches = {
+        "speculation": (speculation["hits"], speculation["misses"]),
+        "idempotency": (idempotency_store.replays, idempotency_store.executions),
+        "session": (session_cache.hits, session_cache.misses),
+    }
+    return [
+        ("chat_admission_in_flight", "gauge", "Chat turns holding an admission slot.", [({}, chat["in_flight"])]),
+        ("chat_admission_queue_depth", "gauge", "Chat turns waiting for an admission slot or for their session.", [({}, chat["queue_depth"])]),
+        ("chat_admission_admitted_total", "counter", "Chat turns admitted.", [({}, chat["admitted"])]),
+        ("chat_admission_rejected_total", "counter", "Chat turns rejected by admission control.", [
+            ({"reason": "queue_full"}, chat["rejected_queue_full"]),
+            ({"reason": "timeout"}, chat["rejected_timeout"]),
+            ({"reason": "session_full"}, session_locks.rejected),
+        ]),
+        ("llm_stage_in_flight", "gauge", "Model calls running per stage.",
+         [({"stage": name}, stats["in_flight"]) for name, stats in stages]),
+        ("llm_stage_waiting", "gauge", "Model calls waiting for a stage slot.",
+         [({"stage": name}, stats["waiting"]) for name, stats in stages]),
+        ("llm_stage_timeouts_total", "counter", "Model calls that gave up waiting for a stage slot.",
+         [({"stage": name}, stats["timeouts"]) for name, stats in stages]),
+        ("rate_limit_rejected_total", "counter", "Requests rejected by the rate limiter.",
+         [({}, rate_limits.rejected)]),
+        ("rate_limit_active_keys", "gauge", "Clients and sessions with a rate limit bucket.", [
+            ({"limit": "client"}, len(rate_limits.client_requests)),
+            ({"limit": "session"}, len(rate_limits.session_requests)),
+        ]),
+        ("checkpoint_write_queue_depth", "gauge", "Sessions with checkpoint writes not yet stored.",
+         [({}, checkpoint_writer.queue_depth)]),
+        ("checkpoint_writes_total", "counter", "Queued checkpoint writes by outcome.", [
+            ({"outcome": "flushed"}, checkpoint_writer.flushed),
+            ({"outcome": "coalesced"}, checkpoint_writer.coalesced),
+            ({"outcome": "rebased"}, checkpoint_writer.rebased),
+            ({"outcome": "dropped"}, checkpoint_writer.dropped),
+        ]),
+        ("session_cache_bytes", "gauge", "Estimated memory used by cached session checkpoints.",
+         [({}, session_cache.bytes)]),
+        ("session_cache_entries", "gauge", "Sessions with a cached checkpoint.", [({}, len(session_cache))]),
+        ("session_cache_evictions_total", "counter", "Cached checkpoints evicted to stay within the byte limit.",
+         [({}, session_cache.evictions)]),
+        ("session_cache_stale_total", "counter", "Cached checkpoints dropped because another writer changed the session.",
+         [({}, session_cache.stale)]),
+        ("maintenance_runs_total", "counter", "Scheduled maintenance runs completed.",
+         [({}, maintenance_scheduler.runs)]),
+        ("maintenance_sessions_expired_total", "counter", "Idle sessions archived and deleted.",
+         [({}, maintenance_scheduler.sessions_expired)]),
+        ("maintenance_bytes_reclaimed_total", "counter", "Database bytes returned to the file system by vacuum.",
+         [({}, maintenance_scheduler.bytes_reclaimed)]),
+        ("cache_hits_total", "counter", "Cache hits.", [({"cache": name}, hits) for name, (hits, _) in caches.items()]),
+        ("cache_misses_total", "counter", "Cache misses.", [({"cache": name}, misses) for name, (_, misses) in caches.items()]),
+        ("cache_hit_ratio", "gauge", "Share of cache lookups that hit.", [
+            ({"cache": name}, hits / (hits + misses) if hits + misses else 0.0)
+            for name, (hits, misses) in caches.items()
+        ]),
+    ]
+
+registry.register_collector(collect_service_stats)
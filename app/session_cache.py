@@ -0,0 +1,120 @@
+"""In-memory cache of recently active sessions' checkpoints.
+
+Loading a checkpoint reads the history window and the channels from SQLite
+and decodes them, even when this worker wrote the very same session a moment
+ago. The cache keeps the checkpoints of recently active sessions, bounded
+by an estimate of their size in bytes and evicting the least recently used
+ones first. Checkpoints are put in when they are loaded and whenever a write
+commits (write-through). Every entry is tagged with the conversation
+version, and a lookup only serves it while the stored version still
+matches, so writes by other workers invalidate it.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.config import SESSION_CACHE_BYTES
+from app.serialization import dumps
+
+# Rough bytes per entry and per message besides the message contents
+ENTRY_OVERHEAD = 512
+MESSAGE_OVERHEAD = sys.getsizeof(0) + 64
+
+
+def checkpoint_size(checkpoint: Dict[str, Any]) -> int:
+    """Estimate the memory a cached checkpoint takes."""
+    size = ENTRY_OVERHEAD
+    for message in checkpoint.get("conversation_history") or ():
+        size += MESSAGE_OVERHEAD + sys.getsizeof(message.content)
+    channels = {channel: value for channel, value in checkpoint.items() if channel != "conversation_history"}
+    return size + len(dumps(channels))
+
+
+class SessionCache:
+    """Byte-bounded LRU cache of checkpoints keyed by session id."""
+
+    def __init__(self, max_bytes: int = SESSION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str, current_version: Callable[[str], int]) -> Optional[Any]:
+        """Get a cached checkpoint if it is still at the stored version.
+
+        `current_version` reads the stored version; it is only called when
+        the session is cached.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+        if entry is not None and entry[0].version == current_version(session_id):
+            with self._lock:
+                if session_id in self._entries:
+                    self._entries.move_to_end(session_id)
+                self.hits += 1
+            return entry[0]
+        with self._lock:
+            if entry is not None:
+                self.stale += 1
+                self._remove(session_id, entry)
+            self.misses += 1
+        return None
+
+    def put(self, session_id: str, checkpoint: Any):
+        """Cache a checkpoint unless a newer one of the session is cached already."""
+        if self.max_bytes <= 0 or checkpoint.version is None:
+            return
+        size = checkpoint_size(checkpoint)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                if entry[0].version > checkpoint.version:
+                    return
+                self._remove(session_id, entry)
+            if size > self.max_bytes:
+                return
+            self._entries[session_id] = (checkpoint, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest_id, oldest = next(iter(self._entries.items()))
+                self._remove(oldest_id, oldest)
+                self.evictions += 1
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._remove(session_id, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, session_id: str, entry: Tuple[Any, int]):
+        # Only remove the entry that was looked up, not one put in since
+        if self._entries.get(session_id) is entry:
+            del self._entries[session_id]
+            self.bytes -= entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
+
+
+session_cache = SessionCache()
@@ -0,0 +1,67 @@
+"""Per-session serialization of chat turns.
+
+Two turns of one session that run together both start from the same
+checkpoint, and the second save would drop the first turn. `SessionLocks`
+queues turns per session on the event loop while different sessions run in
+parallel; the conversation version check in the database catches any race
+that bypasses the lock (other processes, background jobs).
+
+Turns waiting for their session count against the admission queue, and at
+most SESSION_MAX_QUEUE may wait per session, so a burst on one session
+(retries, double submits) is rejected early instead of queueing without
+bound.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from app.admission import AdmissionController, AdmissionRejectedError
+from app.config import ADMISSION_RETRY_AFTER, SESSION_MAX_QUEUE
+
+
+class SessionLocks:
+    """Keyed asyncio locks; a session's lock only exists while it is held or awaited."""
+
+    def __init__(self, max_waiting: int = SESSION_MAX_QUEUE, retry_after: int = ADMISSION_RETRY_AFTER):
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def hold(self, session_id: str, queue: Optional[AdmissionController] = None) -> AsyncIterator[None]:
+        """Wait for earlier turns of the session (in arrival order), then run this one.
+
+        Raises AdmissionRejectedError if `max_waiting` turns already wait for
+        the session or `queue` is full; the wait counts against `queue`.
+        """
+        # One turn holds the lock, the others wait for it
+        if self._users.get(session_id, 0) > self.max_waiting:
+            self.rejected += 1
+            raise AdmissionRejectedError("Too many turns waiting for this session, retry later", 429, self.retry_after)
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        self._users[session_id] = self._users.get(session_id, 0) + 1
+        try:
+            if lock.locked() and queue is not None:
+                async with queue.waiting():
+                    await lock.acquire()
+            else:
+                await lock.acquire()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._users[session_id] -= 1
+            if not self._users[session_id]:
+                del self._users[session_id]
+                del self._locks[session_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+session_locks = SessionLocks()
@@ -0,0 +1,61 @@
+"""Sessions spread across several SQLite databases.
+
+SQLite lets one writer at a time into a database file, so with persistence
+on the request path all sessions queue for the same lock. With DB_SHARDS
+set above 1, each session is stored in one of that many files, picked by a
+stable hash of its id, and every file has its own connection pool and
+writer. Writes to sessions on different shards run in parallel; a session's
+data (conversation, messages, channels) always lives on one shard, so its
+transactions never span files. Data not owned by a session, like jobs, is
+kept on the first shard.
+
+With one shard the database file is DB_PATH itself, as before sharding.
+"""
+import hashlib
+from pathlib import Path
+from typing import List, Union
+
+from app.config import DB_POOL_TIMEOUT, DB_READERS, DB_SHARDS
+from app.db_pool import ConnectionPool
+
+
+def shard_index(session_id: str, count: int) -> int:
+    """The shard a session belongs to; the same in every process and release."""
+    if count == 1:
+        return 0
+    digest = hashlib.blake2b(session_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def shard_paths(path: Union[str, Path], count: int) -> List[Path]:
+    """Database files of a layout with `count` shards, named after `path`."""
+    path = Path(path)
+    if count == 1:
+        return [path]
+    return [path.with_name(f"{path.stem}.{i}-of-{count}{path.suffix}") for i in range(count)]
+
+
+class ShardedPool:
+    """One connection pool per shard of the database at `path`."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        count: int = DB_SHARDS,
+        readers: int = DB_READERS,
+        timeout: float = DB_POOL_TIMEOUT
+    ):
+        self.path = Path(path)
+        self.shards = [ConnectionPool(p, readers, timeout) for p in shard_paths(path, count)]
+
+    @property
+    def main(self) -> ConnectionPool:
+        """The shard holding data that does not belong to a session."""
+        return self.shards[0]
+
+    def for_session(self, session_id: str) -> ConnectionPool:
+        return self.shards[shard_index(session_id, len(self.shards))]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
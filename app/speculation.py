@@ -0,0 +1,134 @@
+"""Speculative tool execution for the AI Travel Assistant.
+
+Tool searches normally start only after the intent classifier has waited on
+the language model. When cheap local signals (keywords in the message plus a
+destination and dates already in the draft) make a search likely, it is
+launched in parallel with classification. The result is kept if the final
+intent and search arguments match and discarded otherwise.
+"""
+import threading
+from typing import Any, Dict, Optional
+
+from app.config import SPECULATION_MODE
+from app.state import AgentState
+
+OFF = "off"
+CONSERVATIVE = "conservative"
+AGGRESSIVE = "aggressive"
+
+# Keywords that hint at each speculatable intent
+INTENT_KEYWORDS = {
+    "search_flights": ("flight", "fly", "plane", "airline"),
+    "search_hotels": ("hotel", "stay", "accommodation", "room"),
+}
+
+
+def _draft_dates(draft: Dict[str, Any]) -> Optional[tuple]:
+    """Extract (start, end) dates from the draft, if they are specific enough."""
+    dates = draft.get("dates")
+    if not isinstance(dates, dict):
+        return None
+    for start_key, end_key in (("start", "end"), ("departure_date", "return_date"), ("check_in", "check_out")):
+        if dates.get(start_key):
+            return dates[start_key], dates.get(end_key, "")
+    return None
+
+
+def predict_searches(state: AgentState, mode: str = None) -> Dict[str, Dict[str, Any]]:
+    """Predict which searches the current message will need, with their arguments.
+
+    Conservative mode requires a matching keyword in the message; aggressive
+    mode speculates whenever the draft has a destination and dates.
+    """
+    mode = mode or SPECULATION_MODE
+    if mode == OFF or not state.user_input:
+        return {}
+
+    draft = state.draft_package or {}
+    destination = draft.get("destination")
+    dates = _draft_dates(draft)
+    if not destination or not dates:
+        return {}
+
+    text = state.user_input.lower()
+    travelers = draft.get("travelers") or 1
+    predictions = {}
+    for intent, keywords in INTENT_KEYWORDS.items():
+        if mode != AGGRESSIVE and not any(keyword in text for keyword in keywords):
+            continue
+        if intent == "search_flights":
+            predictions[intent] = {
+                "destination": destination,
+                "date": dates[0],
+                "return_date": dates[1],
+                "num_passengers": travelers,
+            }
+        else:
+            predictions[intent] = {
+                "destination": destination,
+                "check_in": dates[0],
+                "check_out": dates[1],
+                "num_guests": travelers,
+            }
+    return predictions
+
+
+def use_speculative(state: AgentState, intent: str, search_args: Dict[str, Any]) -> Optional[Any]:
+    """Return speculative results for a search if they were made with the same arguments."""
+    speculation = state.speculative_results.get(intent)
+    if speculation and speculation["input"] == state.user_input and speculation["args"] == search_args:
+        return speculation["results"]
+    return None
+
+
+class SpeculationStats:
+    """Thread-safe counters describing how useful speculation has been."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.launched = 0
+            self.hits = 0
+            self.misses = 0
+            self.saved_seconds = 0.0
+            self.wasted_seconds = 0.0
+
+    def record(self, hit: bool, elapsed: float):
+        with self._lock:
+            self.launched += 1
+            if hit:
+                self.hits += 1
+                self.saved_seconds += elapsed
+            else:
+                self.misses += 1
+                self.wasted_seconds += elapsed
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "launched": self.launched,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / self.launched if self.launched else 0.0,
+                "saved_seconds": round(self.saved_seconds, 6),
+                "wasted_seconds": round(self.wasted_seconds, 6),
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+def record_speculation_outcome(state: AgentState):
+    """Count each speculative search of the turn as a hit or as wasted work."""
+    for intent, speculation in state.speculative_results.items():
+        if speculation["input"] != state.user_input:
+            continue
+        speculation_stats.record(intent in state.speculation_hits, speculation["elapsed"])
+
+
+def get_speculation_stats() -> Dict[str, Any]:
+    """Get the speculation hit rate and wasted work so far."""
+    return speculation_stats.snapshot()
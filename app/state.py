@@ -1,22 +1,53 @@
 """State management for the AI Travel Assistant."""
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import Annotated, List, Dict, Any, get_args, get_origin, get_type_hints
 from datetime import datetime
 
+from app.history import ConversationHistory, Message
+
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer that merges updates from parallel branches into a dict channel."""
+    return {**(left or {}), **(right or {})}
+
+def merge_unique(left: List[Any], right: List[Any]) -> List[Any]:
+    """Reducer that appends items from parallel branches without duplicates."""
+    return list(left or []) + [item for item in (right or []) if item not in (left or [])]
+
+def append_messages(left: ConversationHistory, right: Any) -> ConversationHistory:
+    """Reducer for the append-only history: nodes return only the new messages."""
+    if isinstance(right, ConversationHistory) and not left:
+        return right
+    history = left.copy() if isinstance(left, ConversationHistory) else ConversationHistory(left or [])
+    history.extend(right or [])
+    return history
+
+def make_message(role: str, content: str) -> Message:
+    """Create a conversation history entry."""
+    return Message(role, content)
+
+def draft_changes(draft: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the draft fields to write for an update, including timestamps."""
+    changes = dict(updates)
+    changes["last_modified"] = datetime.now().isoformat()
+    if not draft.get("created_at"):
+        changes["created_at"] = changes["last_modified"]
+    return changes
+
 @dataclass
 class AgentState:
     """State container for the AI Travel Assistant."""
     
     # Input and conversation state
     user_input: str = ""
-    conversation_history: List[Dict[str, str]] = field(default_factory=list)
+    conversation_history: Annotated[ConversationHistory, append_messages] = field(default_factory=ConversationHistory)
     
     # Intent and parameters from the last user message
     intent: str = ""
-    parameters: Dict[str, Any] = field(default_factory=dict)
+    intents: List[str] = field(default_factory=list)
+    parameters: Annotated[Dict[str, Any], merge_dicts] = field(default_factory=dict)
     
     # Travel package draft state
-    draft_package: Dict[str, Any] = field(default_factory=lambda: {
+    draft_package: Annotated[Dict[str, Any], merge_dicts] = field(default_factory=lambda: {
         "destination": "",
         "dates": {},
         "travelers": 0,
@@ -31,29 +62,56 @@ class AgentState:
     mock_flight_results: List[Dict[str, Any]] = field(default_factory=list)
     mock_hotel_results: List[Dict[str, Any]] = field(default_factory=list)
     
-    # Response generation
+    # Searches launched speculatively alongside intent classification, keyed by
+    # intent, and the intents whose tool node reused them
+    speculative_results: Annotated[Dict[str, Dict[str, Any]], merge_dicts] = field(default_factory=dict)
+    speculation_hits: Annotated[List[str], merge_unique] = field(default_factory=list)
+    
+    # Response generation; `structured_results` is set when the client renders
+    # search results and the draft itself, so the reply can stay short
+    structured_results: bool = False
     final_response: str = ""
     
+    def __post_init__(self):
+        # Accept plain lists of message dicts, e.g. client-supplied history
+        if not isinstance(self.conversation_history, ConversationHistory):
+            self.conversation_history = ConversationHistory(self.conversation_history)
+    
+    @classmethod
+    def from_result(cls, result: Any) -> "AgentState":
+        """Build a state from a workflow result, which LangGraph returns as a dict of channels."""
+        if isinstance(result, cls):
+            return result
+        return cls(**{key: value for key, value in result.items() if key in cls.__dataclass_fields__})
+    
+    def apply(self, update: Dict[str, Any]) -> "AgentState":
+        """Apply a node's partial update to this state using the channel reducers."""
+        hints = get_type_hints(type(self), include_extras=True)
+        for channel, value in update.items():
+            hint = hints[channel]
+            if get_origin(hint) is Annotated:
+                value = get_args(hint)[1](getattr(self, channel), value)
+            setattr(self, channel, value)
+        return self
+    
     def update_draft(self, updates: Dict[str, Any]):
         """Update the draft package with new information."""
-        self.draft_package.update(updates)
-        self.draft_package["last_modified"] = datetime.now().isoformat()
-        if not self.draft_package["created_at"]:
-            self.draft_package["created_at"] = self.draft_package["last_modified"]
+        self.draft_package.update(draft_changes(self.draft_package, updates))
+    
+    def has_intent(self, *intents: str) -> bool:
+        """Check whether any of the given intents was detected in the last message."""
+        detected = self.intents or [self.intent]
+        return any(intent in detected for intent in intents)
     
     def add_to_history(self, role: str, content: str):
         """Add a message to the conversation history."""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+        self.conversation_history.append(make_message(role, content))
     
     def clear_search_results(self):
         """Clear temporary search results."""
         self.mock_flight_results.clear()
         self.mock_hotel_results.clear()
     
-    def get_context_window(self, max_messages: int = 5) -> List[Dict[str, str]]:
+    def get_context_window(self, max_messages: int = 5) -> List[Message]:
         """Get the recent conversation context."""
-        return self.conversation_history[-max_messages:] if self.conversation_history else []
+        return self.conversation_history.recent(max_messages)
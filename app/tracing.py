@@ -0,0 +1,204 @@
+"""Lightweight tracing for the AI Travel Assistant.
+
+Spans cover the `/chat` request, every workflow node and every model and
+database call. They carry parent/child relationships plus `session_id` and
+`intent` attributes and are exported in the OpenTelemetry (OTLP/JSON) span
+layout, either to an in-memory collector or to a JSON Lines file.
+
+When sampling is off, `span()` returns a shared no-op context manager, so an
+untraced call costs about as much as a context variable lookup.
+"""
+import collections
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.config import TRACE_SAMPLE_RATE, TRACE_EXPORTER, TRACE_FILE, TRACE_MEMORY_SPANS
+from app.metrics import NODE_SECONDS
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_session_id: contextvars.ContextVar = contextvars.ContextVar("trace_session_id", default=None)
+
+
+class Span:
+    """A timed operation within a trace."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        tracer.export(self)
+        return False
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Convert to the OTLP/JSON span layout."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class _NoopSpan:
+    """Shared span used when a trace is not sampled."""
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class InMemoryExporter:
+    """Keeps the last `max_spans` finished spans in memory (for tests and ad-hoc inspection)."""
+
+    def __init__(self, max_spans: int = TRACE_MEMORY_SPANS):
+        self._lock = threading.Lock()
+        self.spans: Deque[Span] = collections.deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class FileExporter:
+    """Appends finished spans to a JSON Lines file, one OTLP span per line."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_otlp(), separators=(",", ":"))
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporter."""
+
+    def __init__(self, sample_rate: float, exporter: Any):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def export(self, span: Span):
+        self.exporter.export(span)
+
+    def span(self, name: str, **attributes: Any):
+        """Start a span as a child of the current one.
+
+        A new trace is only started with probability `sample_rate`; children of
+        unsampled traces are not recorded either.
+        """
+        parent = _current_span.get()
+        if parent is None and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        session_id = _session_id.get()
+        if session_id is not None:
+            attributes.setdefault("session_id", session_id)
+        return Span(name, parent, attributes)
+
+
+def _create_exporter():
+    if TRACE_EXPORTER == "file":
+        return FileExporter(TRACE_FILE)
+    return InMemoryExporter()
+
+
+tracer = Tracer(TRACE_SAMPLE_RATE, _create_exporter())
+
+
+def span(name: str, **attributes: Any):
+    """Start a span on the global tracer."""
+    return tracer.span(name, **attributes)
+
+
+def set_session(session_id: Optional[str]) -> contextvars.Token:
+    """Attach a session id to every span started in the current context."""
+    return _session_id.set(session_id)
+
+
+def traced(name: str) -> Callable:
+    """Decorator that wraps every call of a function in a span."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_node(name: str, node: Callable) -> Callable:
+    """Wrap a workflow node in a span carrying the node name and intent.
+
+    The node's execution time is also recorded in the node latency histogram.
+    """
+    node_seconds = NODE_SECONDS.labels(node=name)
+
+    @functools.wraps(node)
+    def wrapper(state):
+        with node_seconds.time(), tracer.span(f"node.{name}", node=name) as node_span:
+            update = node(state)
+            node_span.set_attribute("intent", (update or {}).get("intent") or state.intent)
+            return update
+    return wrapper
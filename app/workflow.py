@@ -1,18 +1,19 @@
 """LangGraph workflow for the AI Travel Assistant."""
-from typing import Annotated, TypedDict
-
 from langgraph.graph import StateGraph
 
 from app.state import AgentState
+from app.tracing import trace_node
 from app.nodes import (
     user_input_processor,
     intent_classifier,
+    speculative_search,
     draft_manager,
     mock_flight_search_tool,
     mock_hotel_search_tool,
     general_info_handler,
     response_generator,
-    get_next_node
+    get_next_node,
+    INTENT_NODES
 )
 
 def create_workflow() -> StateGraph:
@@ -20,14 +21,19 @@ def create_workflow() -> StateGraph:
     # Create the workflow
     workflow = StateGraph(AgentState)
     
-    # Add nodes
-    workflow.add_node("user_input_processor", user_input_processor)
-    workflow.add_node("intent_classifier", intent_classifier)
-    workflow.add_node("draft_manager", draft_manager)
-    workflow.add_node("mock_flight_search_tool", mock_flight_search_tool)
-    workflow.add_node("mock_hotel_search_tool", mock_hotel_search_tool)
-    workflow.add_node("general_info_handler", general_info_handler)
-    workflow.add_node("response_generator", response_generator)
+    # Add nodes, each wrapped in a tracing span
+    nodes = {
+        "user_input_processor": user_input_processor,
+        "intent_classifier": intent_classifier,
+        "speculative_search": speculative_search,
+        "draft_manager": draft_manager,
+        "mock_flight_search_tool": mock_flight_search_tool,
+        "mock_hotel_search_tool": mock_hotel_search_tool,
+        "general_info_handler": general_info_handler,
+        "response_generator": response_generator,
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, trace_node(name, node))
     
     # Set the entry point
     workflow.set_entry_point("user_input_processor")
@@ -35,13 +41,19 @@ def create_workflow() -> StateGraph:
     # Define edges
     workflow.add_edge("user_input_processor", "intent_classifier")
     
-    # Conditional edges based on intent
+    # Likely searches start alongside classification; tool nodes reuse them
+    # when the classified intent and arguments match
+    workflow.add_edge("user_input_processor", "speculative_search")
+    
+    # Conditional edges based on intent; multi-intent messages fan out to
+    # several tool nodes which run in parallel within the same step
     workflow.add_conditional_edges(
         "intent_classifier",
-        get_next_node
+        get_next_node,
+        sorted(set(INTENT_NODES.values())) + ["response_generator"]
     )
     
-    # Connect tool nodes to response generator
+    # Connect tool nodes to response generator, which joins the parallel branches
     workflow.add_edge("draft_manager", "response_generator")
     workflow.add_edge("mock_flight_search_tool", "response_generator")
     workflow.add_edge("mock_hotel_search_tool", "response_generator")
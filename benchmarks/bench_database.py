@@ -0,0 +1,113 @@
+"""Database throughput benchmark for concurrent sessions.
+
+Runs chat-turn-shaped database traffic from 1/8/32 threads, each thread one
+session: every turn reads the conversation and session channels, then
+appends two messages and saves the draft package in one transaction. It
+compares a connection opened per call in rollback-journal mode (how
+`get_db_connection` used to work) with the connection pool in WAL mode, on
+a fresh database file each.
+
+Usage:
+    python benchmarks/bench_database.py [--seconds 2]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import database
+from app.sharding import ShardedPool
+
+THREADS = (1, 8, 32)
+
+class ConnectionPerCall:
+    """The old behaviour: a new default-mode connection for every call."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        # Stands in for a single-shard ShardedPool
+        self.shards = [self]
+        self.main = self
+
+    def for_session(self, session_id):
+        return self
+
+    def close(self):
+        pass
+
+    def connection(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+def run(pool, threads, seconds):
+    """Reads and writes per second with `threads` sessions taking turns."""
+    database.pool = pool
+    database.init_db()
+    counts = [[0, 0] for _ in range(threads)]
+    deadline = time.perf_counter() + seconds
+
+    def session(index):
+        session_id = f"bench-{index}"
+        database.save_conversation(session_id, [])
+        while time.perf_counter() < deadline:
+            database.get_conversation_record(session_id)
+            database.get_session_channels(session_id)
+            with database.transaction(session_id) as conn:
+                database.append_conversation(session_id, [
+                    {"role": "user", "content": "Find flights to Paris", "timestamp": 1700000000},
+                    {"role": "assistant", "content": "Here are three options.", "timestamp": 1700000001},
+                ], conn=conn)
+                database.save_session_channels(session_id, {"draft_package": {"destination": "Paris"}}, conn=conn)
+            counts[index][0] += 2
+            counts[index][1] += 1
+
+    workers = [threading.Thread(target=session, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return sum(reads for reads, _ in counts) / elapsed, sum(writes for _, writes in counts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0, help="Duration of each run")
+    args = parser.parse_args()
+
+    original = database.pool
+    print(f"{'threads':>8} {'mode':>14} {'reads/s':>10} {'writes/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in THREADS:
+            for mode, pool in (
+                ("per-call", ConnectionPerCall(Path(tmp) / f"per_call_{threads}.db")),
+                ("pooled (WAL)", ShardedPool(Path(tmp) / f"pooled_{threads}.db", 1)),
+            ):
+                reads, writes = run(pool, threads, args.seconds)
+                print(f"{threads:>8} {mode:>14} {reads:>10,.0f} {writes:>10,.0f}")
+                pool.close()
+    database.pool = original
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Compression benchmark for stored message contents.
+
+Builds conversations of HISTORY_WINDOW messages from what the demo actually
+produces: the mock model's replies, and replies listing the mock tools'
+flights, hotels, attractions and travel info for every destination. The
+contents are encoded one message at a time, as they are stored, and the
+benchmark reports the compression ratio and the encode/decode cost per KB
+of text for each stored format. "zlib, no dictionary" shows what the preset
+dictionary contributes.
+
+The preset dictionary was written from typical replies, so a corpus that
+quotes it would only measure the dictionary compressing its own text. The
+ratio is also reported for the messages that share no run of
+OVERLAP_CHARS characters with the dictionary.
+
+Usage:
+    python benchmarks/bench_history_compression.py [--sessions 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import history_codec
+from app.config import HISTORY_WINDOW
+from app.language_model import MockLanguageModel
+from app.mock_tools import get_mock_general_info, search_mock_flights, search_mock_hotels
+
+# London has no transportation or food info in the mock data
+DESTINATIONS = ["Paris", "Tokyo", "Rome", "Barcelona", "Dubai", "Sydney", "Bangkok", "Singapore"]
+INFO_TOPICS = ["attractions", "weather", "transportation", "food", "safety"]
+
+# Shortest run of characters shared with the dictionary that counts as quoting it
+OVERLAP_CHARS = 24
+
+USER_MESSAGES = [
+    "What can I do in {destination} with two kids for a long weekend?",
+    "Show me flights to {destination} leaving on {date}, two adults.",
+    "Any hotels in {destination} with a pool that are not too far from the old town?",
+    "How do I get around {destination} without renting a car?",
+    "Is {destination} safe at night? Anything I should watch out for?",
+    "Which local dishes should we try in {destination}?",
+    "Let's go with the second option.",
+    "Can you move the trip a week later and check prices again?",
+]
+
+def _flight_reply(destination, date):
+    lines = [f"These are the flights to {destination} on {date} I could find:"]
+    for i, flight in enumerate(search_mock_flights(destination, date, num_passengers=2), 1):
+        stops = "no stops" if not flight["stops"] else f"{flight['stops']} stop(s)"
+        lines.append(
+            f"{i}. {flight['airline']} {flight['flight_number']}, {flight['departure_time']} to "
+            f"{flight['arrival_time']} ({flight['duration']}, {stops}), {flight['cabin_class']} on a "
+            f"{flight['aircraft']}, ${flight['price']:,.2f}. Baggage: {flight['baggage_allowance']}."
+        )
+    return "\n".join(lines)
+
+def _hotel_reply(destination, date):
+    lines = [f"Hotels in {destination} from {date}:"]
+    for i, hotel in enumerate(search_mock_hotels(destination, date), 1):
+        lines.append(
+            f"{i}. {hotel['name']} in {hotel['neighborhood']} ({hotel['distance_to_center']} out), "
+            f"{hotel['rating']} from {hotel['review_count']} reviews, ${hotel['price_per_night']:,.2f} a night. "
+            f"Amenities: {', '.join(hotel['amenities'][:4])}."
+        )
+    return "\n".join(lines)
+
+def _info_reply(destination, topic):
+    info = get_mock_general_info(topic, destination)
+    lines = [f"Some notes on {topic} in {destination}:"]
+    for key, value in info.items():
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            if isinstance(item, dict):
+                lines.append("- " + "; ".join(f"{k.replace('_', ' ')}: {v}" for k, v in item.items() if isinstance(v, (str, int, float))))
+            else:
+                lines.append(f"- {key.replace('_', ' ')}: {item}")
+    return "\n".join(lines)
+
+def conversation(rng):
+    """HISTORY_WINDOW messages alternating between user and assistant."""
+    destination = rng.choice(DESTINATIONS)
+    date = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    model = MockLanguageModel()
+    replies = [
+        lambda: _flight_reply(destination, date),
+        lambda: _hotel_reply(destination, date),
+        lambda: _info_reply(destination, rng.choice(INFO_TOPICS)),
+        lambda: model._generate_mock_response(rng.choice(["flight", "hotel", "weather", "trip"])),
+    ]
+    messages = []
+    while len(messages) < HISTORY_WINDOW:
+        messages.append(rng.choice(USER_MESSAGES).format(destination=destination, date=date))
+        messages.append(rng.choice(replies)())
+    return messages
+
+def quotes_dictionary(text):
+    """Whether `text` shares a run of OVERLAP_CHARS characters with the dictionary."""
+    dictionary = history_codec.DICTIONARY.decode("utf-8")
+    return any(text[i:i + OVERLAP_CHARS] in dictionary for i in range(len(text) - OVERLAP_CHARS + 1))
+
+def zlib_without_dictionary(text):
+    return zlib.compress(text.encode("utf-8"), history_codec.ZLIB_LEVEL)
+
+def zlib_decompress(data):
+    return zlib.decompress(data).decode("utf-8")
+
+def per_kb(func, values, total_kb, repeat=5, number=200):
+    """Best time in microseconds to process 1 KB of text."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            for value in values:
+                func(value)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6 / total_kb
+
+def report(title, texts, formats):
+    plain_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    total_kb = plain_bytes / 1024
+    print(f"\n{title}: {len(texts)} messages, {plain_bytes:,} bytes of text")
+    print(f"{'format':>22} {'bytes':>10} {'ratio':>7} {'enc us/KB':>10} {'dec us/KB':>10}")
+    for name, encode, decode in formats:
+        encoded = [encode(text) for text in texts]
+        size = sum(len(value) for value in encoded)
+        print(
+            f"{name:>22} {size:>10,} {plain_bytes / size:>7.2f}"
+            f" {per_kb(encode, texts, total_kb, repeat=3, number=2):>10.1f}"
+            f" {per_kb(decode, encoded, total_kb, repeat=3, number=2):>10.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="Conversations of HISTORY_WINDOW messages")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [message for _ in range(args.sessions) for message in conversation(rng)]
+    # Only contents of at least HISTORY_COMPRESSION_MIN_SIZE bytes are compressed
+    texts = [message for message in messages if len(message.encode("utf-8")) >= history_codec.HISTORY_COMPRESSION_MIN_SIZE]
+
+    formats = [
+        ("zlib, no dictionary", zlib_without_dictionary, zlib_decompress),
+        ("zlib + dictionary", lambda t: history_codec.encode(t, history_codec.ZLIB_V1, 0), history_codec.decode),
+    ]
+    if history_codec.zstandard is not None:
+        formats.append(("zstd + dictionary", lambda t: history_codec.encode(t, history_codec.ZSTD_V1, 0), history_codec.decode))
+    else:
+        print("zstd: skipped (zstandard not installed)")
+
+    print(f"{args.sessions} conversations of {HISTORY_WINDOW} messages")
+    report("All compressed messages", texts, formats)
+    report(
+        f"Messages sharing no {OVERLAP_CHARS}-character run with the dictionary",
+        [text for text in texts if not quotes_dictionary(text)],
+        formats
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Serialization benchmark for stored history and API payloads.
+
+Compares stdlib `json` with the fast path in `app.serialization` (orjson,
+when installed) for encoding and decoding 10/100/1000-turn histories, and
+shows the bytes on the wire with gzip and brotli compression.
+
+Usage:
+    python benchmarks/bench_serialization.py
+"""
+import gzip
+import json
+import os
+import sys
+import time
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import serialization
+from app.serialization import compress
+
+TURNS = (10, 100, 1000)
+USER_MESSAGE = "Can you find flights from New York to Paris for June 15-22?"
+ASSISTANT_MESSAGE = (
+    "I've found several flight options from New York to Paris for June 15-22. "
+    "The best option is a direct flight with Air France departing at 7:30 PM."
+)
+
+def session(turns):
+    """A stored history of `turns` user/assistant exchanges."""
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": USER_MESSAGE, "timestamp": 1700000000 + turn})
+        history.append({"role": "assistant", "content": ASSISTANT_MESSAGE, "timestamp": 1700000001 + turn})
+    return history
+
+def best_of(func, repeat=5):
+    """Best per-call time in microseconds."""
+    number = 20
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+def main():
+    backend = "orjson" if serialization.FAST_JSON else "stdlib (orjson not installed)"
+    print(f"fast path: {backend}")
+    print(f"{'turns':>6} {'json enc us':>12} {'fast enc us':>12} {'json dec us':>12} {'fast dec us':>12}"
+          f" {'bytes':>10} {'gzip':>9} {'brotli':>9}")
+    for turns in TURNS:
+        history = session(turns)
+        stdlib_data = json.dumps(history)
+        fast_data = serialization.dumps(history)
+        brotli_size = len(compress(fast_data, "br")) if serialization.brotli is not None else float("nan")
+        print(
+            f"{turns:>6}"
+            f" {best_of(lambda: json.dumps(history)):>12.1f}"
+            f" {best_of(lambda: serialization.dumps(history)):>12.1f}"
+            f" {best_of(lambda: json.loads(stdlib_data)):>12.1f}"
+            f" {best_of(lambda: serialization.loads(fast_data)):>12.1f}"
+            f" {len(fast_data):>10,}"
+            f" {len(gzip.compress(fast_data, compresslevel=6)):>9,}"
+            f" {brotli_size:>9,}"
+        )
+
+if __name__ == "__main__":
+    main()
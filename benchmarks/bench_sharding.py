@@ -0,0 +1,82 @@
+"""Sustained write throughput with sessions sharded across database files.
+
+Runs chat-turn writes as `PERSISTENCE_MODE=sync` stores them: every turn
+appends two messages and saves the draft package in one transaction of its
+session's shard. 32 threads each cycle through their own sessions for a
+fixed time, on fresh databases with 1, 4 and 16 shards, and the benchmark
+reports committed turns per second.
+
+Usage:
+    python benchmarks/bench_sharding.py [--seconds 3] [--threads 32]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import database
+from app.sharding import ShardedPool
+
+SHARDS = (1, 4, 16)
+SESSIONS_PER_THREAD = 8
+
+TURN = [
+    {"role": "user", "content": "Find flights to Paris", "timestamp": 1700000000},
+    {"role": "assistant", "content": "I've found several flight options from New York to Paris.", "timestamp": 1700000001},
+]
+
+def run(pool, threads, seconds):
+    """Committed turns per second with `threads` writers."""
+    database.pool = pool
+    database.init_db()
+    counts = [0] * threads
+    start_line = threading.Barrier(threads + 1)
+
+    def writer(index):
+        sessions = [f"bench-{index}-{i}" for i in range(SESSIONS_PER_THREAD)]
+        start_line.wait()
+        deadline = time.perf_counter() + seconds
+        turn = 0
+        while time.perf_counter() < deadline:
+            session_id = sessions[turn % len(sessions)]
+            with database.transaction(session_id) as conn:
+                database.append_conversation(session_id, TURN, conn=conn)
+                database.save_session_channels(session_id, {"draft_package": {"destination": "Paris"}}, conn=conn)
+            turn += 1
+        counts[index] = turn
+
+    workers = [threading.Thread(target=writer, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_line.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration of each run")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent writers")
+    args = parser.parse_args()
+
+    original = database.pool
+    print(f"{'shards':>7} {'writes/s':>10} {'speedup':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in SHARDS:
+            pool = ShardedPool(Path(tmp) / f"bench_{count}.db", count)
+            writes = run(pool, args.threads, args.seconds)
+            pool.close()
+            baseline = baseline or writes
+            print(f"{count:>7} {writes:>10,.0f} {writes / baseline:>7.2f}x")
+    database.pool = original
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Memory benchmark for per-session conversation state.
+
+Compares the legacy history representation (a list of dicts with ISO
+timestamp strings) with the compact, windowed `ConversationHistory`.
+
+Usage:
+    python benchmarks/bench_state_memory.py
+"""
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+# Add the parent directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.state import AgentState
+
+TURNS = (10, 100, 1000)
+USER_MESSAGE = "Can you find flights from New York to Paris for June 15-22?"
+ASSISTANT_MESSAGE = (
+    "I've found several flight options from New York to Paris for June 15-22. "
+    "The best option is a direct flight with Air France departing at 7:30 PM."
+)
+
+def legacy_session(turns):
+    """Build a session the way AgentState stored history before."""
+    history = []
+    for _ in range(turns):
+        for role, content in (("user", USER_MESSAGE), ("assistant", ASSISTANT_MESSAGE)):
+            history.append({"role": role, "content": content, "timestamp": datetime.now().isoformat()})
+    return history
+
+def compact_session(turns):
+    """Build a session with the compact AgentState history."""
+    state = AgentState()
+    for _ in range(turns):
+        state.add_to_history("user", USER_MESSAGE)
+        state.add_to_history("assistant", ASSISTANT_MESSAGE)
+    return state
+
+def measure(build, turns):
+    """Bytes allocated by a session, excluding the shared message strings."""
+    tracemalloc.start()
+    session = build(turns)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del session
+    return current
+
+def main():
+    print(f"{'turns':>6} {'legacy bytes':>14} {'compact bytes':>14} {'ratio':>7}")
+    for turns in TURNS:
+        legacy = measure(legacy_session, turns)
+        compact = measure(compact_session, turns)
+        print(f"{turns:>6} {legacy:>14,} {compact:>14,} {legacy / compact:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -70,7 +70,7 @@ def debug_intent_classification():
         
         # Run intent classification
         print(f"Input: '{state.user_input}'")
-        result_state = intent_classifier(state)
+        result_state = state.apply(intent_classifier(state))
         
         print(f"Detected intent: {result_state.intent}")
         print(f"Extracted parameters: {json.dumps(result_state.parameters, indent=2)}")
@@ -96,7 +96,7 @@ def debug_draft_manager():
         
         # Run draft manager
         print(f"Input parameters: {json.dumps(state.parameters, indent=2)}")
-        result_state = draft_manager(state)
+        result_state = state.apply(draft_manager(state))
         
         print(f"Updated draft package: {json.dumps(result_state.draft_package, indent=2)}")
         
@@ -121,7 +121,7 @@ def debug_response_generator():
         
         # Run response generator
         print(f"Input: '{state.user_input}'")
-        result_state = response_generator(state)
+        result_state = state.apply(response_generator(state))
         
         print(f"Generated response: {result_state.final_response[:100]}...")
         
@@ -19,49 +19,54 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import BACKEND_HOST, BACKEND_PORT
 
-# API endpoint
-API_URL = f"http://{BACKEND_HOST}:{BACKEND_PORT}/chat"
+# API endpoint (the server keeps the history; we send only the new message)
+API_URL = f"http://{BACKEND_HOST}:{BACKEND_PORT}/v2/chat"
 
 # Session management
 session_id = str(uuid.uuid4())
+# Messages of the conversation received so far
+last_seen_turn = 0
+
+# Attempts per message on network errors; retries reuse the message's
+# idempotency key, so the backend runs the turn only once
+MAX_ATTEMPTS = 3
+
+def post_chat(payload: dict) -> requests.Response:
+    """POST a chat turn, retrying connection errors and timeouts."""
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return requests.post(API_URL, json=payload, headers=headers, timeout=120)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == MAX_ATTEMPTS:
+                raise
+            time.sleep(0.5 * attempt)
 
 def respond(message: str, chat_history: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
     """Send message to API and get response."""
-    global session_id
+    global session_id, last_seen_turn
     
-    # Convert Gradio chat history to API format
-    api_history = []
-    for user_msg, bot_msg in chat_history:
-        if user_msg:
-            api_history.append({"role": "user", "content": user_msg})
-        if bot_msg:
-            api_history.append({"role": "assistant", "content": bot_msg})
-    
-    # Add current message
-    api_history.append({"role": "user", "content": message})
-    
-    # Prepare payload - only include necessary fields
     payload = {
         "message": message,
-        "session_id": session_id
+        "session_id": session_id,
+        "last_seen_turn": last_seen_turn
     }
     
-    # Only include chat history if it's not empty
-    if api_history:
-        payload["chat_history"] = api_history
-    
     try:
         # Send request to API
-        response = requests.post(API_URL, json=payload)
+        response = post_chat(payload)
         response.raise_for_status()
         
         # Parse response
         data = response.json()
-        bot_message = data["response"]
+        bot_message = data["message"]["content"]
+        session_id = data["session_id"]
+        last_seen_turn = data["turn"]
         
-        # Update session ID if provided
-        if "session_id" in data:
-            session_id = data["session_id"]
+        # Show turns sent from elsewhere in this session before our own
+        missed = data.get("missed", [])
+        for user_msg, bot_msg in zip(missed[::2], missed[1::2]):
+            chat_history.append((user_msg["content"], bot_msg["content"]))
         
         # Return updated chat history
         chat_history.append((message, bot_message))
@@ -194,8 +199,9 @@ with gr.Blocks(css=os.path.join(static_dir, "custom.css"), theme=gr.themes.Soft(
     # Clear conversation function
     def clear_conversation():
         """Clear the conversation history."""
-        global session_id
+        global session_id, last_seen_turn
         session_id = str(uuid.uuid4())  # Generate new session ID
+        last_seen_turn = 0
         return [], "Conversation cleared. Ready for new input."
     
     # Connect UI components to functions
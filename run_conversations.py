@@ -0,0 +1,171 @@
+"""
+Offline Conversation Runner
+
+Streams a JSONL file of multi-turn conversations through the AI Travel
+Assistant workflow and writes one NDJSON result per turn as soon as it
+completes. Conversations run concurrently; turns within a conversation run
+in order. Input and output are streamed, so files of any size can be
+processed with constant memory.
+
+Input lines look like:
+    {"conversation_id": "c1", "turns": ["Plan a trip to Paris", "Find flights"]}
+
+Lines that are not a JSON object are reported in the output and skipped,
+and so is a conversation that fails as a whole (for example when its
+`turns` is not a list): one error line with its conversation_id.
+Every run stores its sessions under a new prefix, so results do not depend
+on earlier runs; pass --session-prefix to continue the sessions of a run.
+
+Usage:
+    python run_conversations.py conversations.jsonl --output results.ndjson --concurrency 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, Iterator, Optional
+
+# Add the current directory to the path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app.chat_service import run_turn
+
+def read_conversations(
+    source: IO[str],
+    on_invalid: Optional[Callable[[int, str], None]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Lazily parse conversations from a JSONL stream, skipping blank lines.
+
+    Lines that are not a JSON object are skipped and passed to `on_invalid`
+    with their line number and the reason.
+    """
+    for line_number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            conversation = json.loads(line)
+        except json.JSONDecodeError as e:
+            conversation, reason = None, f"Invalid JSON: {e}"
+        else:
+            reason = None if isinstance(conversation, dict) else "Not a JSON object"
+        if reason:
+            if on_invalid is not None:
+                on_invalid(line_number, reason)
+            continue
+        conversation.setdefault("conversation_id", f"line-{line_number}")
+        yield conversation
+
+class ResultWriter:
+    """Thread-safe NDJSON writer that flushes every result."""
+
+    def __init__(self, sink: IO[str]):
+        self.sink = sink
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.errors = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _write_line(self, result: Dict[str, Any]):
+        self.sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.sink.flush()
+
+    def write(self, result: Dict[str, Any]):
+        with self.lock:
+            self._write_line(result)
+            self.turns += 1
+            if result.get("error"):
+                self.errors += 1
+
+    def skip(self, line_number: int, reason: str):
+        """Report an input line that could not be run."""
+        with self.lock:
+            self._write_line({"line": line_number, "error": reason})
+            self.skipped += 1
+
+    def fail(self, conversation_id: Any, error: str):
+        """Report a conversation that stopped outside of a turn."""
+        with self.lock:
+            self._write_line({"conversation_id": conversation_id, "error": error})
+            self.failed += 1
+
+def run_conversation(conversation: Dict[str, Any], writer: ResultWriter, session_prefix: str = ""):
+    """Run the turns of one conversation in order, writing each result."""
+    conversation_id = conversation["conversation_id"]
+    session_id = f"{session_prefix}{conversation_id}"
+
+    turns = conversation.get("turns") or conversation.get("messages") or []
+    if not isinstance(turns, list):
+        raise ValueError("'turns' must be a list of messages")
+
+    for turn, message in enumerate(turns):
+        result = {"conversation_id": conversation_id, "turn": turn, "message": message}
+        start = time.perf_counter()
+        try:
+            result["response"] = run_turn(session_id, message).final_response
+        except Exception as e:
+            result["error"] = str(e)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        writer.write(result)
+
+def run_conversations(source: IO[str], sink: IO[str], concurrency: int = 4, session_prefix: str = "") -> ResultWriter:
+    """Stream conversations through the workflow with bounded concurrency.
+
+    At most `concurrency` conversations are in flight; the next one is read
+    from the input only when a slot frees up.
+    """
+    writer = ResultWriter(sink)
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def worker(conversation):
+        try:
+            run_conversation(conversation, writer, session_prefix)
+        except Exception as e:
+            writer.fail(conversation.get("conversation_id"), str(e))
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for conversation in read_conversations(source, writer.skip):
+            slots.acquire()
+            executor.submit(worker, conversation)
+
+    return writer
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Run JSONL conversations through the AI Travel Assistant")
+    parser.add_argument("input", help="JSONL file of conversations ('-' for stdin)")
+    parser.add_argument("--output", required=True, help="NDJSON file for per-turn results ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations to run concurrently")
+    parser.add_argument(
+        "--session-prefix",
+        help="Prefix for the session ids of the conversations (default: a new one per run)"
+    )
+
+    args = parser.parse_args()
+    session_prefix = args.session_prefix
+    if session_prefix is None:
+        session_prefix = f"offline_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}_"
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        start = time.perf_counter()
+        writer = run_conversations(source, sink, args.concurrency, session_prefix)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Processed {writer.turns} turns ({writer.errors} errors, {writer.failed} conversations failed,"
+            f" {writer.skipped} invalid lines skipped)"
+            f" in {elapsed:.1f}s; sessions are stored as {session_prefix}<conversation_id>",
+            file=sys.stderr
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
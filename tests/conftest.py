@@ -0,0 +1,39 @@
+"""Shared test configuration."""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The suite sends many turns from one test client in quick succession; the
+# rate limiter itself is covered by test_rate_limit.py
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+# Most tests read the database right after a turn; the write-behind queue is
+# covered by test_persistence.py
+os.environ.setdefault("PERSISTENCE_MODE", "sync")
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import database
+from app.session_cache import session_cache
+from app.sharding import ShardedPool
+from tests.helpers import use_database
+
+@pytest.fixture(autouse=True)
+def isolated_database(tmp_path):
+    """Give every test an empty database instead of the one in data/."""
+    original = database.pool
+    database.pool = ShardedPool(tmp_path / "test.db")
+    database.init_db()
+    session_cache.clear()
+    yield tmp_path / "test.db"
+    database.pool.close()
+    database.pool = original
+    session_cache.clear()
+
+@pytest.fixture
+def sharded_database(tmp_path):
+    """An empty database of 4 shards; returns its path."""
+    return use_database(tmp_path / "sharded.db", 4)
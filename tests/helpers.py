@@ -0,0 +1,35 @@
+"""Stubs, clients and database setup shared by the tests."""
+import asyncio
+import time
+
+import httpx
+
+from app import database
+from app.session_cache import session_cache
+from app.sharding import ShardedPool
+
+# Intent classification stubbed in for tests that only exercise the reply path
+CLASSIFICATION = {"intent": "greeting", "parameters": {}}
+
+def slow_reply(context, delay=0.02):
+    """Reply after a delay standing in for provider latency; fail on request."""
+    time.sleep(delay)
+    if context["user_input"] == "fail":
+        raise RuntimeError("provider error")
+    return f"reply to {context['user_input']}"
+
+async def post_concurrently(requests, headers=None):
+    """Send every request body to /chat of the app at once."""
+    from app.main import app
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.post("/chat", json=body, headers=headers) for body in requests))
+
+def use_database(path, shards=1):
+    """Point the database functions at the layout of `path` with `shards` files."""
+    database.pool.close()
+    database.pool = ShardedPool(path, shards)
+    database.init_db()
+    session_cache.clear()
+    return path
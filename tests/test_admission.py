@@ -0,0 +1,116 @@
+"""Tests for admission control and stage limits."""
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.admission import AdmissionController, AdmissionRejectedError, StageBusyError, StageLimiter
+from app.config import ADMISSION_RETRY_AFTER
+from app.database import get_conversation
+from app.main import app
+from tests.helpers import CLASSIFICATION, post_concurrently, slow_reply
+
+def test_queue_full_is_rejected_fast():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5, retry_after=3)
+    
+    async def hold(release):
+        async with controller.admit():
+            await release.wait()
+    
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(release))
+        queued = asyncio.create_task(hold(release))
+        await asyncio.sleep(0.01)
+        assert controller.snapshot()["queue_depth"] == 1
+        
+        start = time.perf_counter()
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            async with controller.admit():
+                pass
+        assert time.perf_counter() - start < 0.05
+        assert rejected.value.status_code == 429 and rejected.value.retry_after == 3
+        
+        release.set()
+        await asyncio.gather(running, queued)
+    
+    asyncio.run(scenario())
+    stats = controller.snapshot()
+    assert stats["admitted"] == 2 and stats["rejected_queue_full"] == 1
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+def test_queue_timeout_is_503():
+    controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=0.05)
+    
+    async def scenario():
+        async with controller.admit():
+            with pytest.raises(AdmissionRejectedError) as rejected:
+                async with controller.admit():
+                    pass
+        assert rejected.value.status_code == 503
+    
+    asyncio.run(scenario())
+    assert controller.snapshot()["rejected_timeout"] == 1
+
+def test_stage_limiter_bounds_concurrency():
+    stage = StageLimiter("generation", max_concurrent=2, timeout=0.05)
+    peak = []
+    release = threading.Event()
+    
+    def call():
+        try:
+            with stage.slot():
+                peak.append(stage.snapshot()["in_flight"])
+                release.wait()
+        except StageBusyError:
+            pass
+    
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    
+    assert max(peak) == 2
+    assert stage.snapshot() == {"in_flight": 0, "waiting": 0, "timeouts": 1}
+
+def test_chat_returns_retry_after_when_overloaded():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=5, retry_after=7)
+    
+    requests = [{"message": "hi", "session_id": f"admission-{uuid.uuid4()}"} for _ in range(2)]
+    
+    with patch("app.main.chat_admission", controller), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=partial(slow_reply, delay=0.2)):
+        responses = asyncio.run(post_concurrently(requests))
+    
+    assert sorted(r.status_code for r in responses) == [200, 429]
+    rejected = next(r for r in responses if r.status_code == 429)
+    assert rejected.headers["Retry-After"] == "7"
+
+def test_saturated_stage_is_503_and_not_stored():
+    """A turn whose model stage has no capacity fails with Retry-After instead of a fallback reply."""
+    busy = StageLimiter("generation", 1, timeout=0.01)
+    busy._semaphore.acquire()
+    session_id = f"admission-{uuid.uuid4()}"
+    
+    with patch("app.language_model.generate_stage", busy), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION):
+        response = TestClient(app).post("/chat", json={"message": "hi", "session_id": session_id})
+    
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(ADMISSION_RETRY_AFTER)
+    assert "generation capacity" in response.json()["detail"]
+    assert get_conversation(session_id) == []
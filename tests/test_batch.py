@@ -0,0 +1,103 @@
+"""Tests for batch chat execution."""
+import sys
+import time
+import uuid
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import chat_service
+from app.admission import AdmissionController
+from app.chat_service import BatchItem, run_batch
+from app.database import ConversationConflictError, get_conversation
+from app.main import app
+from tests.helpers import CLASSIFICATION, slow_reply
+
+def test_run_batch_in_order_with_errors():
+    """Results come back in input order and failures stay per item."""
+    prefix = uuid.uuid4()
+    items = [BatchItem(f"batch-{prefix}-{i}", message) for i, message in enumerate(["one", "fail", "three"])]
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=partial(slow_reply, delay=0.2)):
+        results = run_batch(items, max_concurrency=3)
+    
+    assert [r.session_id for r in results] == [item.session_id for item in items]
+    assert results[0].state.final_response == "reply to one"
+    assert results[1].state is None and "provider error" in results[1].error
+    assert results[2].state.final_response == "reply to three"
+
+def test_run_batch_concurrency_and_session_order():
+    """Independent turns overlap; turns of one session run in order."""
+    session_id = f"batch-{uuid.uuid4()}"
+    items = [BatchItem(f"{session_id}-{i}", "hello") for i in range(6)]
+    items += [BatchItem(session_id, "first"), BatchItem(session_id, "second")]
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=partial(slow_reply, delay=0.2)):
+        start = time.perf_counter()
+        results = run_batch(items, max_concurrency=8)
+        elapsed = time.perf_counter() - start
+    
+    assert all(result.error is None for result in results)
+    # The session's second turn waits for its first; the others overlap
+    assert elapsed < 1.0
+    assert [m["content"] for m in get_conversation(session_id)] == [
+        "first", "reply to first", "second", "reply to second"
+    ]
+
+def test_run_batch_retries_conflicting_turns():
+    """A batch turn that loses a race with another turn of its session is re-run."""
+    session_id = f"batch-{uuid.uuid4()}"
+    finish_turn = chat_service.finish_turn
+    calls = []
+
+    def conflict_once(*args):
+        calls.append(args[0])
+        if len(calls) == 1:
+            raise ConversationConflictError("saved by another turn")
+        return finish_turn(*args)
+
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", return_value="Hi!"), \
+         patch.object(chat_service, "finish_turn", side_effect=conflict_once):
+        results = run_batch([BatchItem(session_id, "hello")])
+
+    assert results[0].error is None and results[0].state.final_response == "Hi!"
+    assert calls == [session_id, session_id]
+
+def test_batch_endpoint():
+    """The batch endpoint returns one result per item."""
+    client = TestClient(app)
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", return_value="Hi!"):
+        response = client.post("/chat/batch", json={
+            "items": [{"message": "Hello"}, {"message": "Hi", "session_id": f"batch-{uuid.uuid4()}"}],
+            "max_concurrency": 2
+        })
+    
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["response"] for r in results] == ["Hi!", "Hi!"]
+    assert all(r["session_id"] and r["error"] is None for r in results)
+
+def test_batch_endpoint_turns_are_admitted():
+    """Batch turns take admission slots like /chat turns; rejected items report the error."""
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    client = TestClient(app)
+    with patch("app.main.chat_admission", controller), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=partial(slow_reply, delay=0.2)):
+        response = client.post("/chat/batch", json={
+            "items": [{"message": "one"}, {"message": "two"}],
+            "max_concurrency": 2
+        })
+    
+    results = response.json()["results"]
+    assert sorted(r["error"] or "" for r in results) == ["", "Server is busy, retry later"]
+    assert controller.admitted == 1
@@ -0,0 +1,94 @@
+"""Tests for LLM record/replay cassettes."""
+import sys
+import time
+from pathlib import Path
+
+from unittest.mock import patch
+
+import pytest
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import language_model
+from app.cassette import RECORD, REPLAY, Cassette, CassetteMissError, CassetteModel
+
+
+class Message:
+    """Minimal chat message used as model input in these tests."""
+    def __init__(self, type: str, content: str):
+        self.type = type
+        self.content = content
+
+
+class Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class EchoModel:
+    """Test model that echoes the last message, optionally chunked."""
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        return Reply(f"echo: {messages[-1].content}")
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        for word in messages[-1].content.split():
+            time.sleep(0.01)
+            yield Reply(word + " ")
+
+
+MESSAGES = [Message("system", "You are a travel assistant."), Message("human", "Flights to Paris")]
+
+
+def test_record_then_replay(tmp_path):
+    """Recorded interactions replay offline without the model."""
+    path = tmp_path / "llm.jsonl.gz"
+    model = EchoModel()
+    recorder = CassetteModel(Cassette(path, mode=RECORD), model=model, params={"temperature": 0.2})
+    recorded = recorder.invoke(MESSAGES)
+
+    player = CassetteModel(Cassette(path, mode=REPLAY), params={"temperature": 0.2})
+    replayed = player.invoke(MESSAGES)
+
+    assert replayed.content == recorded.content == "echo: Flights to Paris"
+    assert model.calls == 1
+
+
+def test_replay_miss_raises(tmp_path):
+    """Unrecorded requests fail loudly instead of reaching the network."""
+    path = tmp_path / "llm.jsonl.gz"
+    CassetteModel(Cassette(path, mode=RECORD), model=EchoModel(), params={"temperature": 0.2}).invoke(MESSAGES)
+
+    player = CassetteModel(Cassette(path, mode=REPLAY), params={"temperature": 0.7})
+    with pytest.raises(CassetteMissError):
+        player.invoke(MESSAGES)
+
+
+def test_stream_chunks_and_latency(tmp_path):
+    """Streamed chunks replay in order, optionally with recorded timings."""
+    path = tmp_path / "llm.jsonl"
+    recorded = list(CassetteModel(Cassette(path, mode=RECORD), model=EchoModel()).stream(MESSAGES))
+
+    player = CassetteModel(Cassette(path, mode=REPLAY, simulate_latency=True))
+    start = time.perf_counter()
+    replayed = list(player.stream(MESSAGES))
+    elapsed = time.perf_counter() - start
+
+    assert [c.content for c in replayed] == [c.content for c in recorded]
+    assert elapsed >= 0.02
+
+
+def test_replay_miss_is_not_replaced_by_a_fallback(tmp_path):
+    """In replay mode a missing recording fails the turn instead of a canned answer."""
+    cassette = Cassette(tmp_path / "empty.jsonl", mode=REPLAY)
+    with patch.object(language_model, "LLM_CASSETTE_MODE", REPLAY), \
+         patch.object(language_model, "get_cassette", return_value=cassette):
+        with pytest.raises(CassetteMissError, match="No recorded interaction"):
+            language_model.classify_intent("Flights to Paris", [])
+        with pytest.raises(CassetteMissError):
+            language_model.generate_response({"conversation_history": [{"role": "user", "content": "Hi"}]})
@@ -0,0 +1,62 @@
+"""Tests for the delta chat protocol (/v2/chat)."""
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database import get_conversation
+from app.main import app
+from tests.helpers import CLASSIFICATION
+
+def reply(context):
+    return f"reply to {context['user_input']}"
+
+def test_v2_returns_only_the_new_turn():
+    client = TestClient(app)
+    session_id = f"v2-{uuid.uuid4()}"
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=reply):
+        first = client.post("/v2/chat", json={"message": "hi", "session_id": session_id, "last_seen_turn": 0}).json()
+        second = client.post("/v2/chat", json={
+            "message": "again", "session_id": session_id, "last_seen_turn": first["turn"]
+        }).json()
+    
+    assert first["turn"] == 2 and second["turn"] == 4
+    assert second["message"]["role"] == "assistant"
+    assert second["message"]["content"] == "reply to again"
+    assert second["missed"] == []
+    assert [m["content"] for m in get_conversation(session_id)] == ["hi", "reply to hi", "again", "reply to again"]
+
+def test_v2_returns_missed_turns():
+    """Turns sent by another client show up in the next response."""
+    client = TestClient(app)
+    session_id = f"v2-{uuid.uuid4()}"
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=reply):
+        client.post("/v2/chat", json={"message": "from phone", "session_id": session_id})
+        response = client.post("/v2/chat", json={"message": "from laptop", "session_id": session_id, "last_seen_turn": 0}).json()
+    
+    assert [m["content"] for m in response["missed"]] == ["from phone", "reply to from phone"]
+    assert response["message"]["content"] == "reply to from laptop"
+
+def test_v1_history_with_current_message_is_not_duplicated():
+    client = TestClient(app)
+    session_id = f"v2-{uuid.uuid4()}"
+    chat_history = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "again"},
+    ]
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=reply):
+        client.post("/chat", json={"message": "again", "session_id": session_id, "chat_history": chat_history})
+    
+    assert [m["content"] for m in get_conversation(session_id)] == ["hi", "hello", "again", "reply to again"]
@@ -0,0 +1,45 @@
+"""Tests for per-session workflow checkpoints."""
+import copy
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.state import AgentState
+from app.checkpointer import load_checkpoint, save_checkpoint
+
+def test_checkpoint_round_trip():
+    """The draft package and history survive between turns."""
+    session_id = f"test_checkpoint_{uuid.uuid4()}"
+    previous = load_checkpoint(session_id)
+    assert previous["conversation_history"] == []
+    
+    state = AgentState(**copy.deepcopy(previous))
+    state.add_to_history("user", "Plan a trip to Paris")
+    state.update_draft({"destination": "Paris"})
+    written = save_checkpoint(session_id, state, previous)
+    assert set(written) == {"conversation_history", "draft_package"}
+    
+    restored = load_checkpoint(session_id)
+    assert restored["draft_package"]["destination"] == "Paris"
+    assert restored["conversation_history"][0]["content"] == "Plan a trip to Paris"
+
+def test_checkpoint_writes_only_changed_channels():
+    """Unchanged channels are not written again."""
+    session_id = f"test_checkpoint_{uuid.uuid4()}"
+    state = AgentState()
+    state.update_draft({"destination": "Rome"})
+    save_checkpoint(session_id, state, load_checkpoint(session_id))
+    
+    previous = load_checkpoint(session_id)
+    state = AgentState(**copy.deepcopy(previous))
+    state.add_to_history("user", "Hello again")
+    with patch("app.checkpointer.save_session_channels") as save_channels:
+        written = save_checkpoint(session_id, state, previous)
+    
+    assert written == ["conversation_history"]
+    save_channels.assert_called_once()
+    assert save_channels.call_args.args[:2] == (session_id, {})
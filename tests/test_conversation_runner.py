@@ -0,0 +1,71 @@
+"""Tests for the offline JSONL conversation runner."""
+import io
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from run_conversations import run_conversations
+
+def test_runs_conversations_concurrently_with_ordered_turns():
+    """Conversations overlap while each conversation's turns stay in order."""
+    conversations = [
+        {"conversation_id": f"c{i}", "turns": ["Plan a trip", "Find flights", "Thanks"]}
+        for i in range(4)
+    ]
+    source = io.StringIO("\n".join(json.dumps(c) for c in conversations) + "\n\n")
+    sink = io.StringIO()
+    
+    def slow_reply(context):
+        time.sleep(0.1)
+        return f"reply to {context['user_input']}"
+    
+    with patch("app.nodes.classify_intent", return_value={"intent": "greeting", "parameters": {}}), \
+         patch("app.nodes.generate_response", side_effect=slow_reply):
+        start = time.perf_counter()
+        writer = run_conversations(source, sink, concurrency=4, session_prefix=f"runner-{uuid.uuid4()}-")
+        elapsed = time.perf_counter() - start
+    
+    results = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert writer.turns == 12 and writer.errors == 0
+    assert elapsed < 0.9
+    for conversation in conversations:
+        turns = [r for r in results if r["conversation_id"] == conversation["conversation_id"]]
+        assert [r["turn"] for r in turns] == [0, 1, 2]
+        assert turns[1]["response"] == "reply to Find flights"
+        assert turns[1]["latency_ms"] > 0
+
+def test_invalid_lines_are_reported_and_skipped():
+    """A malformed line does not abort the run."""
+    good = json.dumps({"conversation_id": "ok", "turns": ["Hello"]})
+    source = io.StringIO(f"{{not json\n[1, 2]\n{good}\n")
+    sink = io.StringIO()
+    
+    with patch("app.nodes.classify_intent", return_value={"intent": "greeting", "parameters": {}}), \
+         patch("app.nodes.generate_response", return_value="Hi!"):
+        writer = run_conversations(source, sink, session_prefix=f"runner-{uuid.uuid4()}-")
+    
+    results = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert writer.turns == 1 and writer.skipped == 2
+    assert [r["line"] for r in results if "line" in r] == [1, 2]
+    assert results[-1]["response"] == "Hi!"
+
+def test_failed_conversation_is_reported():
+    """A conversation that cannot run still gets an output line."""
+    lines = [{"conversation_id": "bad", "turns": "Hello"}, {"conversation_id": "ok", "turns": ["Hello"]}]
+    source = io.StringIO("".join(json.dumps(line) + "\n" for line in lines))
+    sink = io.StringIO()
+    
+    with patch("app.nodes.classify_intent", return_value={"intent": "greeting", "parameters": {}}), \
+         patch("app.nodes.generate_response", return_value="Hi!"):
+        writer = run_conversations(source, sink, session_prefix=f"runner-{uuid.uuid4()}-")
+    
+    results = {r["conversation_id"]: r for r in map(json.loads, sink.getvalue().splitlines())}
+    assert writer.failed == 1 and writer.turns == 1
+    assert "must be a list" in results["bad"]["error"]
+    assert results["ok"]["response"] == "Hi!"
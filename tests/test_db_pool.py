@@ -0,0 +1,68 @@
+"""Tests for the pooled SQLite connections."""
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.db_pool import ConnectionPool, PoolTimeoutError
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(tmp_path / "pool.db", readers=2, timeout=0.1)
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+    yield pool
+    pool.close()
+
+def test_connections_are_reused_and_tuned(pool):
+    """Closing a borrowed connection returns it to the pool."""
+    conn = pool.connection()
+    raw = conn._conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    conn.close()
+
+    again = pool.connection()
+    assert again._conn is raw
+    again.close()
+
+def test_reader_limit(pool):
+    """Borrowing beyond the reader limit waits, then gives up."""
+    first, second = pool.connection(), pool.connection()
+    with pytest.raises(PoolTimeoutError):
+        pool.connection()
+    first.close()
+    pool.connection().close()
+    second.close()
+
+def test_reads_do_not_wait_for_an_open_write(pool):
+    """Readers see the last committed data while a write transaction is open."""
+    with pool.transaction() as conn:
+        conn.execute("INSERT INTO items VALUES ('draft')")
+        counts = []
+        reader = threading.Thread(target=lambda: counts.append(_count(pool)))
+        reader.start()
+        reader.join(timeout=2)
+        assert counts == [0]
+    assert _count(pool) == 1
+
+def test_nested_transaction_joins_the_outer_one(pool):
+    """A failing outer transaction rolls back writes of nested ones."""
+    with pytest.raises(ValueError):
+        with pool.transaction() as conn:
+            with pool.transaction() as nested:
+                assert nested is conn
+                nested.execute("INSERT INTO items VALUES ('nested')")
+            raise ValueError("abort")
+    assert _count(pool) == 0
+
+def _count(pool):
+    conn = pool.connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    finally:
+        conn.close()
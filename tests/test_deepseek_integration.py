@@ -17,7 +17,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app.state import AgentState
 from app.workflow import compiled_workflow
 from app.language_model import get_language_model, generate_response, classify_intent
-from app.config import DEEPSEEK_API_KEY, GOOGLE_API_KEY
+from app.config import DEEPSEEK_API_KEY, GOOGLE_API_KEY, LLM_CASSETTE_MODE
 from app.nodes import intent_classifier, response_generator
 
 
@@ -39,8 +39,11 @@ class TestDeepSeekIntegration(unittest.TestCase):
         model = get_language_model()
         self.assertIsNotNone(model)
         
-        # Check the model type based on available API keys
-        if self.using_real_api:
+        # Check the model type based on cassette mode and available API keys
+        if LLM_CASSETTE_MODE:
+            from app.cassette import CassetteModel
+            self.assertIsInstance(model, CassetteModel)
+        elif self.using_real_api:
             from langchain_openai import ChatOpenAI
             self.assertIsInstance(model, ChatOpenAI)
         else:
@@ -77,7 +80,7 @@ class TestDeepSeekIntegration(unittest.TestCase):
             self.state.user_input = test_case["input"]
             
             # Run intent classification
-            result_state = intent_classifier(self.state)
+            result_state = self.state.apply(intent_classifier(self.state))
             
             # Check that an intent was classified
             self.assertIsNotNone(result_state.intent)
@@ -139,7 +142,7 @@ class TestDeepSeekIntegration(unittest.TestCase):
                 self.state.mock_flight_results = context["mock_flight_results"]
             
             # Run response generation
-            result_state = response_generator(self.state)
+            result_state = self.state.apply(response_generator(self.state))
             
             # Check that a response was generated
             self.assertIsNotNone(result_state.final_response)
@@ -163,7 +166,7 @@ class TestDeepSeekIntegration(unittest.TestCase):
         self.state.parameters = {"destination": "Tokyo", "topic": "weather"}
         
         # Run response generation
-        result_state = response_generator(self.state)
+        result_state = self.state.apply(response_generator(self.state))
         
         # Check that a fallback response was generated
         self.assertIsNotNone(result_state.final_response)
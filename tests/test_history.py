@@ -0,0 +1,109 @@
+"""Tests for the compact, bounded conversation history."""
+import json
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.history import ConversationHistory, Message
+from app.state import AgentState
+from app.database import (
+    get_conversation,
+    get_messages,
+    get_recent_messages,
+    init_db,
+    save_conversation,
+    transaction,
+)
+from app.checkpointer import load_checkpoint, save_checkpoint
+
+def test_message_record():
+    """Messages are slotted records with interned roles and integer timestamps."""
+    message = Message.from_dict({"role": "user", "content": "Hi", "timestamp": "2025-06-15T10:00:00"})
+    assert not hasattr(message, "__dict__")
+    assert isinstance(message.timestamp, int)
+    assert message["content"] == "Hi" and message.get("missing") is None
+    assert message.role is Message("user", "Hello").role
+    assert message.to_dict() == {"role": "user", "content": "Hi", "timestamp": message.timestamp}
+
+def test_history_window_is_bounded():
+    """Only the most recent messages stay in memory; older ones are counted."""
+    history = ConversationHistory(maxlen=4)
+    for i in range(10):
+        history.append({"role": "user", "content": f"message {i}"})
+    
+    assert len(history) == 4 and history.total == 10 and history.offset == 6
+    assert [m.content for m in history.since(8)] == ["message 8", "message 9"]
+    
+    state = AgentState(conversation_history=history)
+    state.add_to_history("assistant", "reply")
+    assert [m["content"] for m in state.get_context_window(2)] == ["message 9", "reply"]
+
+def test_spilled_history_is_appended_to_storage():
+    """Saving a windowed history appends the new messages to the stored ones."""
+    session_id = f"test_history_{uuid.uuid4()}"
+    save_conversation(session_id, [{"role": "user", "content": f"message {i}"} for i in range(80)])
+    
+    previous = load_checkpoint(session_id)
+    assert previous["conversation_history"].total == 80
+    assert len(previous["conversation_history"]) < 80
+    
+    state = AgentState(**{**previous, "conversation_history": previous["conversation_history"].copy()})
+    state.add_to_history("user", "one more")
+    save_checkpoint(session_id, state, previous)
+    
+    stored = get_conversation(session_id)
+    assert len(stored) == 81
+    assert stored[0]["content"] == "message 0" and stored[-1]["content"] == "one more"
+
+def test_turn_appends_only_new_messages():
+    """A turn that extends a short history does not rewrite the stored messages."""
+    session_id = f"test_history_{uuid.uuid4()}"
+    save_conversation(session_id, [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}])
+    
+    previous = load_checkpoint(session_id)
+    state = AgentState(**{**previous, "conversation_history": previous["conversation_history"].copy()})
+    state.add_to_history("user", "flights to Rome")
+    with patch("app.checkpointer.save_conversation") as rewrite:
+        save_checkpoint(session_id, state, previous)
+    
+    rewrite.assert_not_called()
+    assert [m["content"] for m in get_conversation(session_id)] == ["hello", "hi", "flights to Rome"]
+
+def test_windowed_reads():
+    """Recent messages and ranges are read without loading the whole conversation."""
+    session_id = f"test_history_{uuid.uuid4()}"
+    save_conversation(session_id, [{"role": "user", "content": f"message {i}"} for i in range(10)])
+    
+    messages, total, version = get_recent_messages(session_id, 3)
+    assert [m["content"] for m in messages] == ["message 7", "message 8", "message 9"]
+    assert total == 10 and version == 1
+    assert [m["content"] for m in get_messages(session_id, 2, 4)] == ["message 2", "message 3"]
+    assert get_recent_messages(f"missing_{uuid.uuid4()}", 3) == ([], 0, 0)
+
+def test_history_blobs_are_migrated():
+    """Histories stored as a JSON blob move to the messages table on startup."""
+    session_id = f"test_history_{uuid.uuid4()}"
+    with transaction(session_id) as conn:
+        conn.execute(
+            "INSERT INTO conversations (session_id, history, version) VALUES (?, ?, 3)",
+            (session_id, json.dumps([
+                {"role": "user", "content": "legacy", "timestamp": 1700000000},
+                {"role": "assistant", "content": "iso", "timestamp": datetime.fromtimestamp(1700000001).isoformat()},
+            ]))
+        )
+    
+    init_db()
+    
+    assert get_conversation(session_id) == [
+        {"role": "user", "content": "legacy", "timestamp": 1700000000},
+        {"role": "assistant", "content": "iso", "timestamp": 1700000001},
+    ]
+    with transaction(session_id) as conn:
+        types = conn.execute("SELECT typeof(timestamp) FROM messages WHERE session_id = ?", (session_id,)).fetchall()
+    assert [row[0] for row in types] == ["integer", "integer"]
+    assert load_checkpoint(session_id).version == 3
@@ -0,0 +1,74 @@
+"""Tests for compressed storage of message contents."""
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import database, history_codec
+from app.recompression import recompress_history
+
+REPLY = (
+    "I've found several flight options from New York to Paris. The best option is a nonstop "
+    "direct flight with Air France. Would you like me to add this to your travel package?"
+)
+
+def stored_contents(session_id):
+    conn = database.get_db_connection(session_id)
+    try:
+        return [row["content"] for row in conn.execute(
+            "SELECT content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        )]
+    finally:
+        conn.close()
+
+def test_zlib_round_trip_is_smaller():
+    """Replies compress against the preset dictionary and decode to the same text."""
+    encoded = history_codec.encode(REPLY, history_codec.ZLIB_V1)
+    assert isinstance(encoded, bytes) and encoded[0] == history_codec.ZLIB_V1
+    assert len(encoded) < len(REPLY) / 2
+    assert history_codec.decode(encoded) == REPLY
+
+def test_zstd_round_trip():
+    if history_codec.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    encoded = history_codec.encode(REPLY, history_codec.ZSTD_V1)
+    assert encoded[0] == history_codec.ZSTD_V1
+    assert history_codec.decode(encoded) == REPLY
+
+def test_short_and_plain_texts_stay_text():
+    """Short contents are not worth compressing; text rows decode as-is."""
+    assert history_codec.encode("Hi!", history_codec.ZLIB_V1) == "Hi!"
+    assert history_codec.encode(REPLY, 0) == REPLY
+    assert history_codec.decode("plain") == "plain"
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        history_codec.decode(b"\xff data")
+
+def test_compressed_rows_are_decoded_transparently(sharded_database):
+    """Stored contents are compressed when enabled and read back as text."""
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": REPLY}]
+    with patch.object(history_codec, "FORMAT", history_codec.ZLIB_V1):
+        database.save_conversation("s1", history)
+
+    user, reply = stored_contents("s1")
+    assert user == "Hi" and isinstance(reply, bytes)
+    assert database.get_conversation("s1") == history
+
+def test_recompression_job(sharded_database):
+    """Existing text rows are compressed in batches, and can be decompressed again."""
+    for session_id in ("a", "b", "c"):
+        database.save_conversation(session_id, [{"role": "assistant", "content": REPLY}] * 3)
+
+    report = recompress_history(history_codec.ZLIB_V1, batch_size=4, pause=0)
+    assert report.rows == 9 and report.ratio > 2
+    assert all(isinstance(content, bytes) for content in stored_contents("b"))
+    assert database.get_conversation("b") == [{"role": "assistant", "content": REPLY}] * 3
+
+    assert recompress_history(history_codec.ZLIB_V1, pause=0).rows == 0
+    assert recompress_history(0, pause=0).rows == 9
+    assert stored_contents("c") == [REPLY] * 3
@@ -0,0 +1,93 @@
+"""Tests for idempotency keys on /chat."""
+import asyncio
+import sys
+import uuid
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database import get_conversation
+from app.idempotency import IdempotencyStore
+from app.main import app
+from tests.helpers import CLASSIFICATION, post_concurrently, slow_reply
+
+def test_repeated_key_returns_stored_response():
+    """A retry with the same key neither calls the model nor appends a turn."""
+    client = TestClient(app)
+    session_id = f"idem-{uuid.uuid4()}"
+    body = {"message": "hi", "session_id": session_id}
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", return_value="Hello") as generate:
+        first = client.post("/chat", json=body, headers=headers)
+        second = client.post("/chat", json=body, headers=headers)
+        third = client.post("/chat", json=body)
+    
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    # Requests without a key always run
+    assert third.status_code == 200
+    assert generate.call_count == 2
+    assert len(get_conversation(session_id)) == 4
+
+def test_key_reused_for_different_request():
+    client = TestClient(app)
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", return_value="Hello"):
+        assert client.post("/chat", json={"message": "hi"}, headers=headers).status_code == 200
+        assert client.post("/chat", json={"message": "bye"}, headers=headers).status_code == 422
+
+def test_retry_attaches_to_in_flight_turn():
+    """A retry arriving while the original still runs waits for its result."""
+    session_id = f"idem-{uuid.uuid4()}"
+    body = {"message": "hi", "session_id": session_id}
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=partial(slow_reply, delay=0.2)) as generate:
+        responses = asyncio.run(post_concurrently([body] * 2, headers=headers))
+    
+    assert [r.json() for r in responses] == [{"response": "reply to hi", "session_id": session_id}] * 2
+    assert generate.call_count == 1
+    assert len(get_conversation(session_id)) == 2
+
+def test_store_forgets_failures_and_expired_results():
+    store = IdempotencyStore(ttl=0.05, max_keys=10)
+    calls = []
+    
+    async def execute():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("provider error")
+        return len(calls)
+    
+    async def scenario():
+        try:
+            await store.run("key", "fp", execute)
+        except RuntimeError:
+            pass
+        assert await store.run("key", "fp", execute) == 2
+        assert await store.run("key", "fp", execute) == 2
+        await asyncio.sleep(0.1)
+        assert await store.run("key", "fp", execute) == 3
+    
+    asyncio.run(scenario())
+    assert len(store) == 1
+
+def test_store_is_bounded():
+    store = IdempotencyStore(ttl=60, max_keys=3)
+    
+    async def scenario():
+        for i in range(10):
+            await store.run(f"key-{i}", "fp", lambda: asyncio.sleep(0, result=i))
+    
+    asyncio.run(scenario())
+    assert len(store) <= 3
@@ -0,0 +1,117 @@
+"""Tests for background chat jobs."""
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database import create_job, get_job, fail_unfinished_jobs, transaction
+from app.jobs import JobQueueFullError, JobRunner
+from app.main import app
+from tests.helpers import CLASSIFICATION
+
+def wait_for(job_id, timeout=5.0):
+    """Poll a job until it finishes."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = get_job(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_job_endpoints_report_progress_and_result():
+    """A submitted job records each completed node and the final response."""
+    client = TestClient(app)
+    session_id = f"job-{uuid.uuid4()}"
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", return_value="Hello there"):
+        response = client.post("/chat/jobs", json={"message": "hi", "session_id": session_id})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        wait_for(job_id)
+    
+    status = client.get(f"/chat/jobs/{job_id}").json()
+    assert status["status"] == "succeeded"
+    assert status["result"] == {"response": "Hello there", "session_id": session_id}
+    nodes = [step["node"] for step in status["progress"]]
+    assert nodes[0] == "user_input_processor"
+    assert nodes[-1] == "response_generator"
+    
+    events = client.get(f"/chat/jobs/{job_id}/events").text
+    assert events.startswith("data: ") and '"succeeded"' in events
+
+def test_failed_job_and_unknown_job():
+    client = TestClient(app)
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=RuntimeError("provider error")):
+        job_id = client.post("/chat/jobs", json={"message": "hi"}).json()["job_id"]
+        job = wait_for(job_id)
+    
+    assert job["status"] == "failed"
+    assert "provider error" in job["error"]
+    assert client.get(f"/chat/jobs/{uuid.uuid4()}").status_code == 404
+
+def test_job_queue_is_bounded():
+    """Submissions beyond the workers plus the queue limit are rejected."""
+    release = threading.Event()
+    runner = JobRunner(workers=1, queue_limit=1)
+    
+    def blocked_turn(*args, **kwargs):
+        release.wait()
+        return SimpleNamespace(final_response="done")
+    
+    with patch("app.jobs.run_turn", side_effect=blocked_turn):
+        job_ids = [runner.submit(f"job-{uuid.uuid4()}", "hi") for _ in range(2)]
+        try:
+            runner.submit(f"job-{uuid.uuid4()}", "hi")
+            assert False, "Expected JobQueueFullError"
+        except JobQueueFullError:
+            pass
+        release.set()
+        runner.shutdown()
+    
+    assert all(get_job(job_id)["status"] == "succeeded" for job_id in job_ids)
+
+def make_stale(job_id):
+    with transaction() as conn:
+        conn.execute("UPDATE jobs SET updated_at = datetime('now', '-5 minutes') WHERE job_id = ?", (job_id,))
+
+def test_only_jobs_without_heartbeat_fail():
+    """Jobs of a stopped worker fail; jobs a live worker still touches do not."""
+    runner = JobRunner(workers=1, queue_limit=1, stale_after=60)
+    release = threading.Event()
+    orphaned = str(uuid.uuid4())
+    create_job(orphaned, "restart-session", "running")
+    make_stale(orphaned)
+    
+    def blocked_turn(*args, **kwargs):
+        release.wait()
+        return SimpleNamespace(final_response="done")
+    
+    with patch("app.jobs.run_turn", side_effect=blocked_turn):
+        live = runner.submit(f"job-{uuid.uuid4()}", "hi")
+        make_stale(live)
+        assert runner.beat() >= 1
+        release.set()
+        runner.shutdown()
+    
+    assert get_job(orphaned)["status"] == "failed"
+    assert "worker running it stopped" in get_job(orphaned)["error"]
+    assert get_job(live)["status"] == "succeeded"
+
+def test_fresh_unfinished_jobs_are_kept():
+    job_id = str(uuid.uuid4())
+    create_job(job_id, "other-worker-session", "running")
+    
+    fail_unfinished_jobs("Interrupted", stale_after=60)
+    assert get_job(job_id)["status"] == "running"
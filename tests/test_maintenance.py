@@ -0,0 +1,65 @@
+"""Tests for session expiry, archival and compaction."""
+import gzip
+import json
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import database
+from app.maintenance import expire_sessions, incremental_vacuum, run_maintenance
+
+def make_idle(session_id, days):
+    with database.transaction(session_id) as conn:
+        conn.execute(
+            "UPDATE conversations SET updated_at = datetime('now', ?) WHERE session_id = ?",
+            (f"-{days} days", session_id)
+        )
+
+def test_idle_sessions_are_archived_and_deleted(sharded_database, tmp_path):
+    """Sessions idle past the TTL move to the archive; active ones stay."""
+    for session_id in ("idle-1", "idle-2", "idle-3", "active"):
+        database.save_conversation(session_id, [{"role": "user", "content": f"hello from {session_id}"}])
+        database.save_session_channels(session_id, {"draft_package": {"destination": "Paris"}})
+    for session_id in ("idle-1", "idle-2", "idle-3"):
+        make_idle(session_id, 40)
+
+    report = expire_sessions(ttl_days=30, archive_dir=tmp_path / "archive", batch_size=2, pause=0)
+
+    assert report.sessions_expired == 3 and report.messages_deleted == 3
+    with gzip.open(report.archive, "rt", encoding="utf-8") as archive:
+        records = [json.loads(line) for line in archive]
+    assert sorted(record["session_id"] for record in records) == ["idle-1", "idle-2", "idle-3"]
+    assert records[0]["messages"][0]["content"].startswith("hello from idle")
+    assert records[0]["channels"] == {"draft_package": {"destination": "Paris"}}
+
+    assert database.get_conversation_record("idle-1") == ([], 0)
+    assert database.get_session_channels("idle-1") == {}
+    assert len(database.get_conversation("active")) == 1
+
+def test_nothing_to_expire_writes_no_archive(sharded_database, tmp_path):
+    database.save_conversation("active", [{"role": "user", "content": "hi"}])
+    report = expire_sessions(ttl_days=30, archive_dir=tmp_path / "archive", pause=0)
+    assert report.sessions_expired == 0 and report.archive is None
+
+def test_incremental_vacuum_reclaims_freed_pages(sharded_database, tmp_path):
+    """Pages freed by expiry are returned in steps and reported."""
+    for i in range(20):
+        database.save_conversation(f"s{i}", [{"role": "assistant", "content": "x" * 2000}] * 5)
+        make_idle(f"s{i}", 40)
+    expire_sessions(ttl_days=30, archive_dir=tmp_path / "archive", pause=0)
+
+    report = incremental_vacuum(step_pages=8, pause=0)
+    assert report.pages_vacuumed > 8
+    assert report.bytes_reclaimed >= report.pages_vacuumed * 1024
+    for shard in database.pool.shards:
+        conn = shard.connection()
+        try:
+            assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        finally:
+            conn.close()
+
+def test_run_maintenance_reports_file_size(sharded_database):
+    report = run_maintenance(ttl_days=30)
+    assert report.file_bytes_before > 0 and report.file_bytes_after > 0
@@ -0,0 +1,74 @@
+"""Tests for the Prometheus metrics endpoint."""
+import sys
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.language_model import generate_response
+from app.main import app
+from app.metrics import MODEL_SECONDS, Counter, Histogram, Registry
+from tests.helpers import CLASSIFICATION
+
+def sample(text, line_prefix):
+    """Value of the first sample line starting with `line_prefix`."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"No sample {line_prefix}")
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(Histogram("latency_seconds", "Latency.", ("op",), buckets=(0.1, 1.0)))
+    counter = registry.register(Counter("events_total", "Events.", ("kind",)))
+    for value in (0.05, 0.5, 5.0):
+        histogram.labels(op="read").observe(value)
+    counter.labels(kind='say "hi"').inc(2)
+    
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{op="read",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{op="read",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{op="read",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{op="read"} 3' in text
+    assert 'latency_seconds_sum{op="read"} 5.55' in text
+    assert 'events_total{kind="say \\"hi\\""} 2' in text
+
+def test_metrics_endpoint_covers_api_nodes_models_and_database():
+    client = TestClient(app)
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", return_value="Hello"):
+        assert client.post("/chat", json={"message": "hi", "session_id": f"metrics-{uuid.uuid4()}"}).status_code == 200
+    assert client.get(f"/chat/jobs/{uuid.uuid4()}").status_code == 404
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    
+    assert sample(text, 'http_request_duration_seconds_count{method="POST",route="/chat",status="200"}') >= 1
+    # Path parameters are not label values
+    assert sample(text, 'http_request_duration_seconds_count{method="GET",route="/chat/jobs/{job_id}",status="404"}') >= 1
+    assert sample(text, 'chat_turn_duration_seconds_count{outcome="success"}') >= 1
+    assert sample(text, 'workflow_node_duration_seconds_count{node="response_generator"}') >= 1
+    assert sample(text, 'db_operation_duration_seconds_count{operation="get_conversation",kind="read"}') >= 1
+    assert sample(text, 'db_operation_duration_seconds_count{operation="save_conversation",kind="write"}') >= 1
+    assert sample(text, 'http_requests_in_flight{route="/chat"}') == 0
+    for name in ("chat_admission_queue_depth", "chat_admission_rejected_total", "cache_hit_ratio", "llm_stage_in_flight"):
+        assert f"# TYPE {name} " in text
+
+class FakeProvider:
+    def invoke(self, messages):
+        return SimpleNamespace(content="Hello")
+
+def test_model_latency_per_provider():
+    with patch("app.language_model.get_language_model", return_value=FakeProvider()):
+        assert generate_response({"conversation_history": [{"role": "user", "content": "hi"}]}) == "Hello"
+    
+    assert MODEL_SECONDS.labels(provider="FakeProvider", stage="generate").count == 1
@@ -0,0 +1,72 @@
+"""Tests for structured search-result payloads."""
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.main import app
+
+CLASSIFICATION = {
+    "intent": "search_flights",
+    "intents": ["search_flights", "search_hotels"],
+    "parameters": {
+        "destination": "Paris",
+        "departure_date": "2025-06-15",
+        "return_date": "2025-06-22",
+        "check_in": "2025-06-15",
+        "check_out": "2025-06-22"
+    }
+}
+
+def post_chat(client, body, contexts=None):
+    def reply(context):
+        if contexts is not None:
+            contexts.append(context)
+        return "Here are some options."
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=reply):
+        return client.post("/chat", json={"session_id": f"payloads-{uuid.uuid4()}", **body})
+
+def test_structured_results_are_projected():
+    client = TestClient(app)
+    contexts = []
+    response = post_chat(client, {
+        "message": "Find flights and a hotel in Paris for June 15-22",
+        "structured": {
+            "include": ["flights", "hotels", "draft"],
+            "fields": {"flights": ["airline", "price"], "hotels": ["name", "price_per_night"]}
+        }
+    }, contexts)
+    
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results["flights"] and all(set(flight) == {"airline", "price"} for flight in results["flights"])
+    assert all(isinstance(flight["price"], float) for flight in results["flights"])
+    assert results["hotels"] and all(set(hotel) == {"name", "price_per_night"} for hotel in results["hotels"])
+    # Without a projection every field of the draft is returned
+    assert "destination" in results["draft"] and "last_modified" in results["draft"]
+    # The reply is told the results are shown separately
+    assert contexts[0]["results_rendered"] is True
+
+def test_plain_requests_have_no_results():
+    client = TestClient(app)
+    contexts = []
+    response = post_chat(client, {"message": "Find flights to Paris"}, contexts)
+    
+    assert response.status_code == 200
+    assert set(response.json()) == {"response", "session_id"}
+    assert contexts[0]["results_rendered"] is False
+
+def test_unknown_payloads_and_fields_are_rejected():
+    client = TestClient(app)
+    
+    response = post_chat(client, {"message": "hi", "structured": {"include": ["cars"]}})
+    assert response.status_code == 422
+    response = post_chat(client, {"message": "hi", "structured": {"include": ["flights"], "fields": {"flights": ["colour"]}}})
+    assert response.status_code == 422
@@ -0,0 +1,168 @@
+"""Tests for write-behind persistence of session checkpoints."""
+import asyncio
+import copy
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import database, persistence
+from app.state import AgentState
+from app.database import ConversationConflictError, get_conversation, get_conversation_version
+from app.persistence import CheckpointWriter
+from app.session_locks import session_locks
+from tests.helpers import CLASSIFICATION, post_concurrently
+
+def make_writer(**kwargs):
+    # A long interval keeps the background thread from flushing during a test
+    return CheckpointWriter("write_behind", flush_interval=60, **kwargs)
+
+def run_turn(writer, session_id, message):
+    previous = writer.load(session_id)
+    state = AgentState(**copy.deepcopy(previous))
+    state.add_to_history("user", message)
+    state.add_to_history("assistant", f"reply to {message}")
+    state.update_draft({"destination": message})
+    return writer.save(session_id, state, previous)
+
+def test_turns_are_coalesced_until_flushed():
+    """Queued turns are served from memory and written once, with their latest state."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+
+    assert run_turn(writer, session_id, "Paris") == ["conversation_history", "draft_package"]
+    run_turn(writer, session_id, "Rome")
+    assert get_conversation(session_id) == []
+    assert writer.coalesced == 1
+
+    checkpoint = writer.load(session_id)
+    assert checkpoint.version == 2
+    assert checkpoint["draft_package"]["destination"] == "Rome"
+
+    assert writer.flush() == 0
+    assert [m["content"] for m in get_conversation(session_id)] == ["Paris", "reply to Paris", "Rome", "reply to Rome"]
+    assert get_conversation_version(session_id) == 2
+    assert writer.load(session_id)["draft_package"]["destination"] == "Rome"
+    assert writer.queue_depth == 0
+
+def test_coalesced_turns_beyond_the_window_are_all_written():
+    """Messages spilled out of the window while queued still reach the database."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    run_turn(writer, session_id, "first")
+    writer.flush()
+
+    for turn in range(40):
+        run_turn(writer, session_id, f"turn {turn}")
+    assert writer.load(session_id)["conversation_history"].offset > 0
+    writer.flush()
+
+    history = get_conversation(session_id)
+    assert len(history) == 82
+    assert history[-1]["content"] == "reply to turn 39"
+
+def test_racing_turn_conflicts_with_queued_turn():
+    """A turn loaded before another turn was queued cannot overwrite it."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    first = writer.load(session_id)
+    second = writer.load(session_id)
+
+    writer.save(session_id, AgentState(conversation_history=[{"role": "user", "content": "first"}]), first)
+    with pytest.raises(ConversationConflictError):
+        writer.save(session_id, AgentState(conversation_history=[{"role": "user", "content": "second"}]), second)
+
+def test_flush_writes_in_batches():
+    """Queued sessions are written `batch_size` at a time, one transaction each."""
+    writer = make_writer(batch_size=2)
+    sessions = [f"persist-{uuid.uuid4()}" for _ in range(5)]
+    # Without the background thread, which a full batch would wake up
+    with patch.object(writer, "_start"):
+        for session_id in sessions:
+            run_turn(writer, session_id, "hello")
+
+    with patch.object(persistence, "transaction", wraps=persistence.transaction) as transaction:
+        writer.flush()
+
+    assert transaction.call_count == 3
+    assert all(len(get_conversation(session_id)) == 2 for session_id in sessions)
+
+def test_failed_batch_is_retried():
+    """Writes that fail stay queued and are merged with later turns of the session."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    run_turn(writer, session_id, "Paris")
+
+    with patch.object(persistence, "transaction", side_effect=RuntimeError("database is locked")):
+        assert writer.flush() == 1
+    run_turn(writer, session_id, "Rome")
+
+    assert writer.flush() == 0
+    assert len(get_conversation(session_id)) == 4
+
+def test_turns_saved_elsewhere_are_kept_on_flush():
+    """Queued messages are appended after a turn another process saved first."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    run_turn(writer, session_id, "Paris")
+    # Another worker answers a turn of the same session before the flush
+    database.append_conversation(session_id, [{"role": "user", "content": "elsewhere"}], expected_version=0)
+
+    assert writer.flush() == 0
+    assert [m["content"] for m in get_conversation(session_id)] == ["elsewhere", "Paris", "reply to Paris"]
+    assert writer.rebased == 1 and writer.dropped == 0
+    run_turn(writer, session_id, "Rome")
+    writer.flush()
+    assert len(get_conversation(session_id)) == 5
+
+def test_replaced_history_is_written_before_returning():
+    """A client-supplied history is stored at once, so no other worker's turn can make it drop."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    run_turn(writer, session_id, "Paris")
+
+    previous = writer.load(session_id)
+    writer.save(session_id, AgentState(conversation_history=[{"role": "user", "content": "mine"}]), previous)
+    assert writer.queue_depth == 0
+    assert [m["content"] for m in get_conversation(session_id)] == ["mine"]
+
+    # Based on an outdated version it fails, so the turn is re-run rather than lost
+    with pytest.raises(ConversationConflictError):
+        writer.save(session_id, AgentState(conversation_history=[{"role": "user", "content": "late"}]), previous)
+
+def test_close_drains_queue_and_saves_later_turns_synchronously():
+    """Shutdown writes every queued turn; turns after it are written at once."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    run_turn(writer, session_id, "Paris")
+
+    writer.close()
+    assert len(get_conversation(session_id)) == 2
+
+    run_turn(writer, session_id, "Rome")
+    assert len(get_conversation(session_id)) == 4
+
+def test_concurrent_turns_are_all_kept_with_write_behind():
+    """Turns of one session queued behind each other are all written."""
+    writer = make_writer()
+    session_id = f"persist-{uuid.uuid4()}"
+    messages = [f"message {i}" for i in range(10)]
+
+    with patch("app.chat_service.checkpoint_writer", writer), \
+         patch.object(session_locks, "max_waiting", len(messages)), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=lambda context: f"reply to {context['user_input']}"):
+        responses = asyncio.run(post_concurrently(
+            [{"session_id": session_id, "message": message} for message in messages]
+        ))
+
+    assert all(response.status_code == 200 for response in responses)
+    writer.flush()
+    history = get_conversation(session_id)
+    assert len(history) == 2 * len(messages)
+    assert sorted(m["content"] for m in history if m["role"] == "user") == sorted(messages)
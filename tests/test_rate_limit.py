@@ -0,0 +1,97 @@
+"""Tests for per-client and per-session rate limiting."""
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.rate_limit import RateLimitMiddleware, RateLimits, TokenBucketLimiter, client_identity
+
+def test_token_bucket_refills_over_time():
+    limiter = TokenBucketLimiter(rate=2, capacity=4)
+    
+    for _ in range(4):
+        assert limiter.wait_time("a", 1, now=0) == 0
+        limiter.consume("a", 1, now=0)
+    assert limiter.wait_time("a", 1, now=0) == 0.5
+    # Other keys have their own bucket
+    assert limiter.wait_time("b", 1, now=0) == 0
+    assert limiter.wait_time("a", 1, now=0.5) == 0
+
+def test_idle_buckets_are_evicted():
+    limiter = TokenBucketLimiter(rate=1, capacity=2, max_keys=100)
+    for i in range(50):
+        limiter.consume(f"session-{i}", 1, now=i * 0.1)
+    
+    # Buckets that refilled completely are dropped on the next charge
+    limiter.consume("late", 1, now=100)
+    assert len(limiter) == 1
+    
+    bounded = TokenBucketLimiter(rate=1, capacity=2, max_keys=10)
+    for i in range(50):
+        bounded.consume(f"session-{i}", 1, now=0)
+    assert len(bounded) == 10
+
+def make_app(limits):
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limits=limits)
+    
+    @app.post("/chat")
+    async def chat(body: dict):
+        return {"echo": body["message"]}
+    
+    @app.post("/other")
+    async def other():
+        return {}
+    
+    return app
+
+def test_middleware_limits_sessions_and_clients():
+    with patch("app.rate_limit.RATE_LIMIT_CLIENT_RPS", 1), \
+         patch("app.rate_limit.RATE_LIMIT_CLIENT_BURST", 3), \
+         patch("app.rate_limit.RATE_LIMIT_SESSION_RPS", 1), \
+         patch("app.rate_limit.RATE_LIMIT_SESSION_BURST", 2), \
+         patch("app.rate_limit.RATE_LIMIT_API_KEYS", {"other"}):
+        limits = RateLimits()
+        client = TestClient(make_app(limits))
+    
+        for _ in range(2):
+            response = client.post("/chat", json={"message": "hi", "session_id": "s1"})
+            assert response.status_code == 200 and response.json() == {"echo": "hi"}
+    
+        limited = client.post("/chat", json={"message": "hi", "session_id": "s1"})
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+    
+        # Another session of the same client still has room until the client's burst is spent
+        assert client.post("/chat", json={"message": "hi", "session_id": "s2"}).status_code == 200
+        assert client.post("/chat", json={"message": "hi", "session_id": "s3"}).status_code == 429
+        # A configured API key is a different client; made-up keys are not
+        assert client.post("/chat", json={"message": "hi"}, headers={"X-API-Key": "made-up"}).status_code == 429
+        assert client.post("/chat", json={"message": "hi"}, headers={"X-API-Key": "other"}).status_code == 200
+        # Other paths are not limited
+        assert client.post("/other").status_code == 200
+        assert limits.rejected == 3
+
+def test_only_configured_api_keys_identify_clients():
+    scope = {"client": ("10.0.0.1", 5000), "headers": [(b"x-api-key", b"secret")]}
+    assert client_identity(scope, api_keys={"secret"}) == "key:secret"
+    assert client_identity(scope, api_keys={"other"}) == "addr:10.0.0.1"
+    assert client_identity({"client": ("10.0.0.1", 5000), "headers": []}, api_keys={"secret"}) == "addr:10.0.0.1"
+
+def test_middleware_limits_estimated_tokens():
+    with patch("app.rate_limit.RATE_LIMIT_TOKENS_PER_MINUTE", 6000), \
+         patch("app.rate_limit.ESTIMATED_TOKENS_PER_TURN", 1000):
+        limits = RateLimits()
+        client = TestClient(make_app(limits))
+        
+        assert client.post("/chat", json={"message": "x" * 8000}).status_code == 200
+        # 3000 of 6000 tokens used; a second long message does not fit
+        response = client.post("/chat", json={"message": "x" * 16000})
+    
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == 20
@@ -0,0 +1,84 @@
+"""Tests for JSON serialization and response compression."""
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import serialization
+from app.history import Message
+from app.serialization import CompressionMiddleware, FastJSONResponse, choose_encoding, dumps, loads
+
+HISTORY = [{"role": "user", "content": "Vols pour Paris ✈", "timestamp": 1700000000}] * 3
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_round_trip_matches_stdlib(fast):
+    with patch.object(serialization, "FAST_JSON", fast and serialization.orjson is not None):
+        data = dumps({"history": HISTORY, "message": Message("assistant", "Bonjour", 1700000001)})
+        assert json.loads(data) == {
+            "history": HISTORY,
+            "message": {"role": "assistant", "content": "Bonjour", "timestamp": 1700000001},
+        }
+        assert loads(data) == loads(data.decode("utf-8")) == json.loads(data)
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+    expected = "br" if serialization.brotli is not None else "gzip"
+    assert choose_encoding("gzip, br") == expected
+
+def make_app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    
+    @app.get("/large")
+    async def large():
+        return {"history": HISTORY * 100}
+    
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+    
+    @app.get("/events")
+    async def events():
+        async def stream():
+            for i in range(3):
+                yield f"data: {'x' * 400}{i}\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+    
+    return app
+
+def test_large_responses_are_compressed():
+    client = TestClient(make_app())
+    
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(dumps({"history": HISTORY * 100}))
+    # The test client decodes transparently
+    assert response.json() == {"history": HISTORY * 100}
+    
+    raw = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert client.get("/small", headers={"Accept-Encoding": "gzip"}).headers.get("content-encoding") is None
+
+def test_brotli_when_available():
+    if serialization.brotli is None:
+        pytest.skip("brotli is not installed")
+    client = TestClient(make_app())
+    response = client.get("/large", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == {"history": HISTORY * 100}
+
+def test_streaming_responses_pass_through():
+    client = TestClient(make_app())
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text.count("data: ") == 3
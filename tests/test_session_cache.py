@@ -0,0 +1,81 @@
+"""Tests for the cache of recently active sessions."""
+import copy
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.checkpointer import Checkpoint, load_checkpoint, save_checkpoint
+from app.database import save_conversation
+from app.history import ConversationHistory
+from app.metrics import render_metrics
+from app.session_cache import SessionCache, checkpoint_size, session_cache
+from app.state import AgentState
+
+def checkpoint(content, version=1):
+    return Checkpoint({"conversation_history": ConversationHistory([{"role": "user", "content": content}])}, version)
+
+def test_evicts_least_recently_used_by_bytes():
+    """The cache stays within its byte limit, evicting the least recently used sessions."""
+    size = checkpoint_size(checkpoint("x" * 1000))
+    cache = SessionCache(max_bytes=int(size * 2.5))
+    for session_id in ("a", "b"):
+        cache.put(session_id, checkpoint("x" * 1000))
+    assert cache.get("a", lambda _: 1) is not None
+
+    cache.put("c", checkpoint("x" * 1000))
+    assert cache.get("b", lambda _: 1) is None
+    assert cache.get("a", lambda _: 1) is not None
+    assert cache.bytes <= cache.max_bytes and cache.evictions == 1
+
+    cache.put("huge", checkpoint("x" * 10 * size))
+    assert cache.get("huge", lambda _: 1) is None
+
+def test_stale_version_is_not_served():
+    """An entry is dropped once the stored version moved on."""
+    cache = SessionCache(max_bytes=1 << 20)
+    cache.put("a", checkpoint("hello", version=3))
+    cache.put("a", checkpoint("older", version=2))
+
+    assert cache.get("a", lambda _: 3)["conversation_history"][0].content == "hello"
+    assert cache.get("a", lambda _: 4) is None
+    assert cache.stale == 1 and len(cache) == 0 and cache.bytes == 0
+
+def test_saved_checkpoint_is_served_from_cache():
+    """A checkpoint written by this worker is loaded without reading the history."""
+    session_id = f"test_cache_{uuid.uuid4()}"
+    previous = load_checkpoint(session_id)
+    state = AgentState(**copy.deepcopy(previous))
+    state.add_to_history("user", "Plan a trip to Lisbon")
+    state.update_draft({"destination": "Lisbon"})
+    save_checkpoint(session_id, state, previous)
+
+    hits = session_cache.hits
+    with patch("app.checkpointer.get_recent_messages") as read_history:
+        restored = load_checkpoint(session_id)
+    read_history.assert_not_called()
+    assert session_cache.hits == hits + 1
+    assert restored.version == 1
+    assert restored["draft_package"]["destination"] == "Lisbon"
+
+    # Turns build on a copy; the cached checkpoint stays as it was
+    restored["conversation_history"].append({"role": "user", "content": "changed"})
+    assert load_checkpoint(session_id)["conversation_history"].total == 1
+
+def test_write_by_another_worker_invalidates():
+    """A write that bypasses this worker's cache is seen through the version column."""
+    session_id = f"test_cache_{uuid.uuid4()}"
+    save_conversation(session_id, [{"role": "user", "content": "first"}])
+    assert load_checkpoint(session_id)["conversation_history"][0].content == "first"
+
+    save_conversation(session_id, [{"role": "user", "content": "second"}])
+    assert load_checkpoint(session_id)["conversation_history"][0].content == "second"
+
+def test_cache_metrics():
+    """Hit ratio and memory use are exported."""
+    output = render_metrics()
+    assert 'cache_hit_ratio{cache="session"}' in output
+    assert "session_cache_bytes " in output
@@ -0,0 +1,97 @@
+"""Tests for per-session ordering of concurrent chat turns."""
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.state import AgentState
+from app.checkpointer import load_checkpoint, save_checkpoint
+from app.database import ConversationConflictError, get_conversation
+from app.admission import AdmissionController
+from app.session_locks import session_locks
+from tests.helpers import CLASSIFICATION, post_concurrently, slow_reply
+
+def test_concurrent_turns_for_one_session_are_all_kept():
+    """Simultaneous turns of one session are queued; none is overwritten."""
+    session_id = f"locks-{uuid.uuid4()}"
+    messages = [f"message {i}" for i in range(20)]
+    
+    with patch.object(session_locks, "max_waiting", len(messages)), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=slow_reply):
+        responses = asyncio.run(post_concurrently(
+            [{"message": message, "session_id": session_id} for message in messages]
+        ))
+    
+    assert all(response.status_code == 200 for response in responses)
+    history = get_conversation(session_id)
+    assert len(history) == 2 * len(messages)
+    # Every turn is a user message directly followed by its own reply
+    users, replies = history[::2], history[1::2]
+    assert sorted(m["content"] for m in users) == sorted(messages)
+    assert [m["content"] for m in replies] == [f"reply to {m['content']}" for m in users]
+    assert len(session_locks) == 0
+
+def test_burst_on_one_session_is_rejected():
+    """Turns beyond the session's wait queue get 429 instead of queueing."""
+    session_id = f"locks-{uuid.uuid4()}"
+    messages = [f"message {i}" for i in range(5)]
+    
+    with patch.object(session_locks, "max_waiting", 2), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=slow_reply):
+        responses = asyncio.run(post_concurrently(
+            [{"message": message, "session_id": session_id} for message in messages]
+        ))
+    
+    # One turn runs, two wait and the rest are turned away
+    assert sorted(response.status_code for response in responses) == [200, 200, 200, 429, 429]
+    assert all(response.headers["Retry-After"] for response in responses if response.status_code == 429)
+    assert len(get_conversation(session_id)) == 6
+
+def test_session_waiters_count_against_the_admission_queue():
+    controller = AdmissionController(max_concurrent=4, max_queue=1)
+    session_id = f"locks-{uuid.uuid4()}"
+    
+    with patch("app.main.chat_admission", controller), \
+         patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=slow_reply):
+        responses = asyncio.run(post_concurrently([{"message": "hi", "session_id": session_id}] * 3))
+    
+    assert sorted(response.status_code for response in responses) == [200, 200, 429]
+    assert controller.snapshot()["queue_depth"] == 0
+
+def test_different_sessions_run_in_parallel():
+    def slower_reply(context):
+        time.sleep(0.3)
+        return "ok"
+    
+    with patch("app.nodes.classify_intent", return_value=CLASSIFICATION), \
+         patch("app.nodes.generate_response", side_effect=slower_reply):
+        start = time.perf_counter()
+        responses = asyncio.run(post_concurrently(
+            [{"message": "hi", "session_id": f"locks-{uuid.uuid4()}"} for _ in range(5)]
+        ))
+        elapsed = time.perf_counter() - start
+    
+    assert all(response.status_code == 200 for response in responses)
+    assert elapsed < 1.0
+
+def test_stale_checkpoint_is_rejected():
+    """A save based on an outdated version fails instead of dropping a turn."""
+    session_id = f"locks-{uuid.uuid4()}"
+    first = load_checkpoint(session_id)
+    second = load_checkpoint(session_id)
+    
+    save_checkpoint(session_id, AgentState(conversation_history=[{"role": "user", "content": "first"}]), first)
+    with pytest.raises(ConversationConflictError):
+        save_checkpoint(session_id, AgentState(conversation_history=[{"role": "user", "content": "second"}]), second)
+    
+    assert [m["content"] for m in get_conversation(session_id)] == ["first"]
@@ -0,0 +1,73 @@
+"""Tests for speculative tool execution."""
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.state import AgentState
+from app.speculation import predict_searches, speculation_stats
+from app.workflow import compiled_workflow
+
+DRAFT = {
+    "destination": "Paris",
+    "dates": {"start": "2025-06-15", "end": "2025-06-22"},
+    "travelers": 2
+}
+
+def test_predict_searches_modes():
+    """Conservative mode needs a keyword; aggressive mode only needs a draft."""
+    state = AgentState(user_input="Can you find me a flight?", draft_package=dict(DRAFT))
+    assert list(predict_searches(state, "conservative")) == ["search_flights"]
+    assert predict_searches(state, "conservative")["search_flights"]["date"] == "2025-06-15"
+    assert list(predict_searches(state, "aggressive")) == ["search_flights", "search_hotels"]
+    assert predict_searches(state, "off") == {}
+    
+    # Without specific dates there is nothing to speculate on
+    state.draft_package = {"destination": "Paris", "dates": "June"}
+    assert predict_searches(state, "aggressive") == {}
+
+def test_speculation_hit_reuses_results():
+    """A matching classification reuses the speculative search instead of searching again."""
+    classification = {
+        "intent": "search_flights",
+        "intents": ["search_flights"],
+        "parameters": {
+            "destination": "Paris",
+            "departure_date": "2025-06-15",
+            "return_date": "2025-06-22",
+            "travelers": 2
+        }
+    }
+    calls = []
+    
+    def counting_search(**kwargs):
+        calls.append(kwargs)
+        return [{"flight_number": "AF1234"}]
+    
+    speculation_stats.reset()
+    with patch("app.nodes.classify_intent", return_value=classification), \
+         patch.dict("app.nodes.SEARCH_FUNCTIONS", {"search_flights": counting_search}), \
+         patch("app.nodes.search_mock_flights", side_effect=counting_search), \
+         patch("app.speculation.SPECULATION_MODE", "conservative"), \
+         patch("app.nodes.generate_response", return_value="Here are your flights."):
+        compiled_workflow.invoke(AgentState(user_input="Find me a flight", draft_package=dict(DRAFT)))
+    
+    stats = speculation_stats.snapshot()
+    assert len(calls) == 1
+    assert stats["hits"] == 1 and stats["misses"] == 0
+
+def test_speculation_miss_counts_wasted_work():
+    """A different final intent discards the speculative search."""
+    classification = {"intent": "get_info", "intents": ["get_info"], "parameters": {}}
+    
+    speculation_stats.reset()
+    with patch("app.nodes.classify_intent", return_value=classification), \
+         patch("app.speculation.SPECULATION_MODE", "conservative"), \
+         patch("app.nodes.generate_response", return_value="Paris is lovely in June."):
+        compiled_workflow.invoke(AgentState(user_input="Is it worth flying there?", draft_package=dict(DRAFT)))
+    
+    stats = speculation_stats.snapshot()
+    assert stats["launched"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.0
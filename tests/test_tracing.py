@@ -0,0 +1,65 @@
+"""Tests for tracing spans."""
+import json
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.state import AgentState
+from app.tracing import NOOP_SPAN, FileExporter, InMemoryExporter, set_session, span, tracer
+from app.workflow import compiled_workflow
+
+def test_unsampled_span_is_noop():
+    """With sampling off, spans are a shared no-op and cost next to nothing."""
+    with patch.object(tracer, "sample_rate", 0.0):
+        assert span("chat") is NOOP_SPAN
+        
+        start = time.perf_counter()
+        for _ in range(100000):
+            with span("node.test"):
+                pass
+        per_span = (time.perf_counter() - start) / 100000
+    assert per_span < 5e-6
+
+def test_workflow_spans_have_parents_and_attributes():
+    """Node and model spans are children of the request span and carry the session."""
+    exporter = InMemoryExporter()
+    with patch.object(tracer, "sample_rate", 1.0), patch.object(tracer, "exporter", exporter), \
+         patch("app.nodes.classify_intent", return_value={"intent": "greeting", "parameters": {}}):
+        set_session("trace-session")
+        with span("chat") as root:
+            compiled_workflow.invoke(AgentState(user_input="Hello there"))
+        set_session(None)
+    
+    spans = {s.name: s for s in exporter.spans}
+    assert spans["chat"].parent_id is None
+    for name in ("node.user_input_processor", "node.intent_classifier", "node.response_generator"):
+        assert spans[name].parent_id == root.span_id
+        assert spans[name].trace_id == root.trace_id
+        assert spans[name].attributes["session_id"] == "trace-session"
+    assert spans["node.intent_classifier"].attributes["intent"] == "greeting"
+    assert spans["llm.generate_response"].parent_id == spans["node.response_generator"].span_id
+
+def test_file_exporter_writes_otlp_json(tmp_path):
+    """Spans are exported one OTLP/JSON object per line."""
+    path = tmp_path / "traces.jsonl"
+    with patch.object(tracer, "sample_rate", 1.0), patch.object(tracer, "exporter", FileExporter(path)):
+        with span("db.get_conversation", rows=1):
+            pass
+    
+    exported = json.loads(path.read_text().strip())
+    assert exported["name"] == "db.get_conversation"
+    assert len(exported["traceId"]) == 32 and len(exported["spanId"]) == 16
+    assert exported["attributes"] == [{"key": "rows", "value": {"intValue": "1"}}]
+
+def test_memory_exporter_keeps_only_recent_spans():
+    """The in-memory exporter is bounded, so a sampled production server cannot leak spans."""
+    exporter = InMemoryExporter(max_spans=3)
+    with patch.object(tracer, "sample_rate", 1.0), patch.object(tracer, "exporter", exporter):
+        for i in range(5):
+            with span(f"span-{i}"):
+                pass
+    assert [s.name for s in exporter.spans] == ["span-2", "span-3", "span-4"]
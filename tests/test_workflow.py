@@ -1,13 +1,20 @@
 """Test the LangGraph workflow."""
 import sys
 import os
+import time
 from pathlib import Path
+from unittest.mock import patch
+
+from langchain_core.messages import SystemMessage
+from langchain_core.utils.json import parse_and_check_json_markdown
 
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.state import AgentState
 from app.workflow import compiled_workflow
+from app.nodes import get_next_node, user_input_processor, draft_manager
+from app.language_model import MockLanguageModel, classify_intent
 
 def test_workflow_basic():
     """Test the workflow with a basic greeting."""
@@ -37,6 +44,85 @@ def test_workflow_basic():
         print(f"Error testing workflow: {e}")
         return False
 
+def test_nodes_return_partial_updates():
+    """Nodes return only the channels they change; reducers merge them."""
+    history = [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello! Where would you like to go?"}
+    ]
+    state = AgentState(user_input="Paris, please", conversation_history=list(history))
+    
+    update = user_input_processor(state)
+    # The previous turn's search results are cleared when a turn starts
+    assert update["mock_flight_results"] == update["mock_hotel_results"] == []
+    assert [m["content"] for m in update["conversation_history"]] == ["Paris, please"]
+    assert len(state.apply(update).conversation_history) == 3
+    
+    state = AgentState(intent="start_draft", parameters={"destination": "Paris"})
+    update = draft_manager(state)
+    assert set(update["draft_package"]) == {"destination", "created_at", "last_modified"}
+    assert state.apply(update).draft_package["activities"] == []
+    
+    with patch("app.nodes.generate_response", return_value="Paris it is!"):
+        result = compiled_workflow.invoke(AgentState(user_input="Paris, please", conversation_history=list(history)))
+    assert [m["content"] for m in result["conversation_history"]][2:] == ["Paris, please", "Paris it is!"]
+
+def test_get_next_node_multi_intent():
+    """Every detected intent routes to its tool node."""
+    state = AgentState(intent="search_flights", intents=["search_flights", "search_hotels"])
+    assert get_next_node(state) == ["mock_flight_search_tool", "mock_hotel_search_tool"]
+    
+    assert get_next_node(AgentState(intent="greeting")) == ["response_generator"]
+
+def test_workflow_parallel_fan_out():
+    """Multi-intent messages run their tool nodes concurrently and join once."""
+    classification = {
+        "intent": "search_flights",
+        "intents": ["search_flights", "search_hotels"],
+        "parameters": {
+            "destination": "Paris",
+            "departure_date": "2025-06-15",
+            "check_in": "2025-06-15",
+            "check_out": "2025-06-22"
+        }
+    }
+    contexts = []
+    
+    # (start, end) of each search
+    runs = []
+    
+    def slow_search(**kwargs):
+        start = time.perf_counter()
+        time.sleep(0.3)
+        runs.append((start, time.perf_counter()))
+        return [kwargs]
+    
+    def capture_response(context):
+        contexts.append({key: bool(context[key]) for key in ("flight_results", "hotel_results")})
+        return "Here are your flights and hotels."
+    
+    with patch("app.nodes.classify_intent", return_value=classification), \
+         patch("app.nodes.search_mock_flights", side_effect=slow_search), \
+         patch("app.nodes.search_mock_hotels", side_effect=slow_search), \
+         patch("app.nodes.generate_response", side_effect=capture_response):
+        compiled_workflow.invoke(AgentState(user_input="Find flights and a hotel in Paris for June 15-22"))
+    
+    assert len(contexts) == 1
+    assert contexts[0]["flight_results"] and contexts[0]["hotel_results"]
+    # Each search started before the other finished
+    (first_start, first_end), (second_start, second_end) = runs
+    assert first_start < second_end and second_start < first_end
+
+def test_mock_classification_is_parsed():
+    """The mock model's classification has every key the structured parser requires."""
+    content = MockLanguageModel().invoke([SystemMessage(content="Classify the intent")]).content
+    parse_and_check_json_markdown(content, ["intent", "parameters", "intents"])
+
+    # Parsed, not the keyword fallback (which has no real destination)
+    classification = classify_intent("Plan a trip to Paris", [])
+    assert classification["intents"] == ["start_draft"]
+    assert classification["parameters"]["destination"] == "Paris"
+
 if __name__ == "__main__":
     # Check if GOOGLE_API_KEY is set
     if not os.environ.get("GOOGLE_API_KEY"):